@@ -0,0 +1,70 @@
+"""
+Authentication backend that keeps recently seen users in process memory.
+
+``AuthenticationMiddleware`` resolves ``request.user`` through the backend's
+``get_user`` on every request, which costs one query per page. Users are kept
+here for ``USER_CACHE_SECONDS``. Saving or deleting a user drops the local
+copy and stamps the shared cache, so other processes reload it on their next
+request. That only reaches other processes when the cache is Redis, so
+settings only enables this backend when ``REDIS_URL`` is set.
+"""
+import copy
+import time
+from collections import OrderedDict
+from threading import Lock
+
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+
+MAX_CACHED_USERS = 1024
+
+_users = OrderedDict()
+_lock = Lock()
+
+
+def _stamp_key(user_id):
+    return f"auth-user-stamp:{user_id}"
+
+
+def invalidate_user(user_id):
+    """Forget ``user_id`` in this process and tell the others to reload it"""
+    with _lock:
+        _users.pop(user_id, None)
+    cache.set(_stamp_key(user_id), time.time(), settings.USER_CACHE_SECONDS or None)
+
+
+def clear_user_cache():
+    with _lock:
+        _users.clear()
+
+
+class CachedModelBackend(ModelBackend):
+    def get_user(self, user_id):
+        ttl = settings.USER_CACHE_SECONDS
+        if not ttl:
+            return super().get_user(user_id)
+
+        now = time.time()
+        with _lock:
+            entry = _users.get(user_id)
+            if entry is not None:
+                _users.move_to_end(user_id)
+
+        if entry is not None:
+            user, loaded_at = entry
+            stamp = cache.get(_stamp_key(user_id))
+            if now - loaded_at < ttl and (stamp is None or stamp < loaded_at):
+                # Each request gets its own copy, so per-request attributes never leak
+                return copy.copy(user)
+
+        user = super().get_user(user_id)
+        if user is not None:
+            with _lock:
+                _users[user_id] = (user, now)
+                _users.move_to_end(user_id)
+                while len(_users) > MAX_CACHED_USERS:
+                    _users.popitem(last=False)
+            return copy.copy(user)
+        return user
+
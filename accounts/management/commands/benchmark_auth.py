@@ -0,0 +1,79 @@
+import time
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.test.utils import override_settings
+
+from accounts.backends import clear_user_cache
+from accounts.models import User
+
+CONFIGURATIONS = (
+    ("db sessions + ModelBackend", "django.contrib.sessions.backends.db", "django.contrib.auth.backends.ModelBackend"),
+    ("cached_db sessions + CachedModelBackend", "django.contrib.sessions.backends.cached_db", "accounts.backends.CachedModelBackend"),
+    ("signed_cookies + CachedModelBackend", "django.contrib.sessions.backends.signed_cookies", "accounts.backends.CachedModelBackend"),
+)
+
+
+class Command(BaseCommand):
+    help = "Measure queries and time spent loading the session and request.user per authenticated request"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=1000, help="Authenticated requests per configuration")
+
+    def handle(self, *args, **options):
+        count = options["requests"]
+        self.stdout.write(f"{'configuration':<42}{'queries/req':>12}{'µs/req':>10}")
+
+        # The benchmark user is rolled back afterwards
+        with transaction.atomic():
+            user = User.objects.create_user(username="__benchmark_auth__", password=None)
+            for label, engine, backend in CONFIGURATIONS:
+                with override_settings(SESSION_ENGINE=engine, AUTHENTICATION_BACKENDS=[backend]):
+                    queries, seconds = self._run(user, engine, backend, count)
+                self.stdout.write(f"{label:<42}{queries / count:>12.2f}{seconds / count * 1e6:>10.0f}")
+            transaction.set_rollback(True)
+
+    def _run(self, user, engine, backend, count):
+        cache.clear()
+        clear_user_cache()
+
+        session = import_module(engine).SessionStore()
+        session[SESSION_KEY] = user._meta.pk.value_to_string(user)
+        session[BACKEND_SESSION_KEY] = backend
+        session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        session.save()
+
+        factory = RequestFactory()
+        session_middleware = SessionMiddleware(lambda request: None)
+        auth_middleware = AuthenticationMiddleware(lambda request: None)
+
+        def authenticated_request():
+            request = factory.get("/")
+            request.COOKIES[settings.SESSION_COOKIE_NAME] = session.session_key
+            session_middleware.process_request(request)
+            auth_middleware.process_request(request)
+            assert request.user.pk == user.pk
+
+        # Warm up: the first request of a process always pays for the cache misses
+        authenticated_request()
+
+        queries = 0
+
+        def count_queries(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(count_queries):
+            start = time.perf_counter()
+            for _ in range(count):
+                authenticated_request()
+            seconds = time.perf_counter() - start
+        return queries, seconds
@@ -1,3 +1,5 @@
+import secrets
+
 from django.db import models
 
 # Create your models here.
@@ -9,3 +11,44 @@ class User(AbstractUser):
     """
     pass
 
+
+def new_invite_code():
+    return secrets.token_urlsafe(12)
+
+
+class Household(models.Model):
+    """
+    A family or flat whose members' ledgers are viewed together.
+
+    Every member keeps their own transactions and wallets; the household
+    pages add them up across members.
+    """
+    # Most members a household can have
+    MAX_MEMBERS = 12
+
+    name = models.CharField(max_length=100)
+    # Anyone with the code can join; owners replace it to stop further joins
+    invite_code = models.CharField(max_length=32, unique=True, default=new_invite_code)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.name
+
+
+class HouseholdMember(models.Model):
+    """
+    A user's place in a household; each user belongs to at most one
+    """
+    ROLE = (
+        ("OWNER", "Owner"),
+        ("MEMBER", "Member"),
+    )
+
+    household = models.ForeignKey(Household, on_delete=models.CASCADE, related_name="members")
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name="household_membership")
+    # Owners rename the household, replace its invite code and manage members
+    role = models.CharField(max_length=10, choices=ROLE, default="MEMBER")
+    joined_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.user.username} in {self.household} ({self.get_role_display()})"
@@ -1,3 +1,45 @@
-from django.test import TestCase
+from django.core.cache import cache
+from django.test import TestCase, override_settings
 
-# Create your tests here.
+from .backends import CachedModelBackend, clear_user_cache
+from .models import User
+
+
+@override_settings(
+    SESSION_ENGINE="django.contrib.sessions.backends.cached_db",
+    AUTHENTICATION_BACKENDS=["accounts.backends.CachedModelBackend"],
+    USER_CACHE_SECONDS=60,
+)
+class CachedAuthTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        clear_user_cache()
+        self.user = User.objects.create_user(username="alice", password="secret-pass-123")
+
+    def test_repeat_request_skips_session_and_user_queries(self):
+        self.client.force_login(self.user)
+        self.client.get("/heatmap/data/")
+
+        # Only the heatmap's own queries are left: the archive cutoff and the grouped totals
+        with self.assertNumQueries(2):
+            response = self.client.get("/heatmap/data/")
+        self.assertEqual(response.status_code, 200)
+
+    def test_user_change_invalidates_cached_copy(self):
+        backend = CachedModelBackend()
+        self.assertEqual(backend.get_user(self.user.pk).first_name, "")
+
+        self.user.first_name = "Alice"
+        self.user.save()
+
+        self.assertEqual(backend.get_user(self.user.pk).first_name, "Alice")
+
+    def test_password_change_logs_out_other_sessions(self):
+        self.client.force_login(self.user)
+        self.client.get("/heatmap/data/")
+
+        self.user.set_password("another-pass-456")
+        self.user.save()
+
+        response = self.client.get("/heatmap/data/")
+        self.assertEqual(response.status_code, 302)
@@ -4,4 +4,5 @@ from . import views
 urlpatterns = [
     path('signup/', views.signup, name='signup'),
     path('logout/', views.logout_view, name='logout'),
+    path('household/', views.household_settings, name='household_settings'),
 ]
\ No newline at end of file
@@ -1,14 +1,36 @@
-from django.shortcuts import render, redirect
+from django import forms
+from django.shortcuts import get_object_or_404, render, redirect
 from django.contrib.auth import login, logout
+from django.contrib.auth.decorators import login_required
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib import messages
-from .models import User
+from django.db import transaction as db_transaction
+from .models import Household, HouseholdMember, User, new_invite_code
 
 class CustomUserCreationForm(UserCreationForm):
     class Meta:
         model = User
         fields = ('username',)
 
+class HouseholdForm(forms.ModelForm):
+    class Meta:
+        model = Household
+        fields = ['name']
+        widgets = {
+            'name': forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'e.g. The Sharmas'}),
+        }
+
+class JoinHouseholdForm(forms.Form):
+    invite_code = forms.CharField(max_length=32, widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Invite code'}))
+
+    def clean_invite_code(self):
+        household = Household.objects.filter(invite_code=self.cleaned_data['invite_code'].strip()).first()
+        if household is None:
+            raise forms.ValidationError('No household has this invite code.')
+        if household.members.count() >= Household.MAX_MEMBERS:
+            raise forms.ValidationError(f'This household already has {Household.MAX_MEMBERS} members.')
+        return household
+
 def signup(request):
     if request.method == 'POST':
         form = CustomUserCreationForm(request.POST)
@@ -23,4 +45,81 @@ def signup(request):
 
 def logout_view(request):
     logout(request)
-    return redirect('login')
\ No newline at end of file
+    return redirect('login')
+
+def _leave_household(membership):
+    household = membership.household
+    membership.delete()
+    remaining = household.members.order_by('joined_at', 'pk')
+    if not remaining.exists():
+        household.delete()
+    elif not remaining.filter(role='OWNER').exists():
+        # A household always keeps an owner: the longest-standing member takes over
+        first = remaining.first()
+        first.role = 'OWNER'
+        first.save(update_fields=['role'])
+
+@login_required
+def household_settings(request):
+    membership = HouseholdMember.objects.select_related('household').filter(user=request.user).first()
+    form = HouseholdForm(instance=membership.household if membership else None)
+    join_form = JoinHouseholdForm()
+
+    if request.method == 'POST':
+        action = request.POST.get('action')
+        if membership is None and action == 'create':
+            form = HouseholdForm(request.POST)
+            if form.is_valid():
+                with db_transaction.atomic():
+                    household = form.save()
+                    HouseholdMember.objects.create(household=household, user=request.user, role='OWNER')
+                messages.success(request, f"Household '{household.name}' created. Share its invite code with your family.")
+                return redirect('household_settings')
+        elif membership is None and action == 'join':
+            join_form = JoinHouseholdForm(request.POST)
+            if join_form.is_valid():
+                household = join_form.cleaned_data['invite_code']
+                # A double-submitted form finds the membership the first one made
+                HouseholdMember.objects.get_or_create(user=request.user, defaults={'household': household})
+                messages.success(request, f"You joined '{household.name}'.")
+                return redirect('household')
+        elif membership is not None and action == 'leave':
+            with db_transaction.atomic():
+                _leave_household(membership)
+            messages.success(request, f"You left '{membership.household.name}'.")
+            return redirect('household_settings')
+        elif membership is not None and membership.role == 'OWNER':
+            household = membership.household
+            if action == 'rename':
+                form = HouseholdForm(request.POST, instance=household)
+                if form.is_valid():
+                    form.save()
+                    messages.success(request, 'Household renamed.')
+                    return redirect('household_settings')
+            elif action == 'new_code':
+                household.invite_code = new_invite_code()
+                household.save(update_fields=['invite_code'])
+                messages.success(request, 'New invite code created; the old one no longer works.')
+                return redirect('household_settings')
+            elif action in ('remove', 'make_owner', 'make_member'):
+                member = get_object_or_404(HouseholdMember, household=household, pk=request.POST.get('member'))
+                if member.pk == membership.pk:
+                    messages.error(request, 'Use “Leave household” to remove yourself.')
+                elif action == 'remove':
+                    member.delete()
+                    messages.success(request, f'{member.user.username} was removed from the household.')
+                else:
+                    member.role = 'OWNER' if action == 'make_owner' else 'MEMBER'
+                    member.save(update_fields=['role'])
+                    messages.success(request, f'{member.user.username} is now {member.get_role_display().lower()}.')
+                return redirect('household_settings')
+
+    members = []
+    if membership is not None:
+        members = HouseholdMember.objects.filter(household=membership.household).select_related('user').order_by('-role', 'joined_at', 'pk')
+    return render(request, 'accounts/household.html', {
+        'membership': membership,
+        'members': members,
+        'form': form,
+        'join_form': join_form,
+    })
@@ -0,0 +1,196 @@
+import json
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock, skipUnless
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+
+from accounts.models import User
+from ledger import batch
+from ledger.models import Category, Transaction
+from ledger.suggestions import clear_suggestions
+from ledger.versions import bump_version
+
+
+class BatchApiTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        clear_suggestions()
+        self.user = User.objects.create_user(username="alice", password="secret-pass-123")
+        self.cash, self.upi = self.user.wallets.order_by("id")
+        self.client.force_login(self.user)
+
+    def entry(self, transaction_type, amount, days_ago=0, **fields):
+        return {
+            "transaction_type": transaction_type,
+            "wallet": self.cash.pk,
+            "amount": amount,
+            "category": "Salary" if transaction_type == "INCOME" else "Food",
+            "date": (date.today() - timedelta(days=days_ago)).isoformat(),
+            **fields,
+        }
+
+    def post_batch(self, *entries):
+        return self.client.post(
+            "/api/transactions/batch/", json.dumps({"transactions": list(entries)}), content_type="application/json",
+        )
+
+    def test_one_invalid_entry_rolls_back_the_batch(self):
+        response = self.post_batch(self.entry("INCOME", "100"), self.entry("EXPENSE", "500"))
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(list(response.json()["errors"]), ["1"])
+        self.assertFalse(Transaction.objects.filter(user=self.user).exists())
+
+        response = self.post_batch(self.entry("INCOME", "100"), self.entry("EXPENSE", "10", category="Nope"))
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Transaction.objects.filter(user=self.user).exists())
+
+    def test_income_funds_a_later_expense_in_the_same_batch(self):
+        # Listed first but dated later, so it is checked after the income
+        response = self.post_batch(self.entry("EXPENSE", "60"), self.entry("INCOME", "100", days_ago=1))
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()["balances"][str(self.cash.pk)], "40.00")
+        self.assertEqual(
+            [row["transaction_type"] for row in response.json()["transactions"]], ["EXPENSE", "INCOME"],
+        )
+
+    def test_repeated_idempotency_keys(self):
+        response = self.post_batch(
+            self.entry("INCOME", "100", idempotency_key="k-1"), self.entry("INCOME", "5", idempotency_key="k-1"),
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("batch", response.json()["errors"])
+
+        first = self.post_batch(self.entry("INCOME", "100", idempotency_key="k-1"))
+        replay = self.post_batch(self.entry("INCOME", "100", idempotency_key="k-1"), self.entry("INCOME", "5"))
+        self.assertEqual(replay.status_code, 201)
+        self.assertEqual(replay.json()["transactions"][0]["id"], first.json()["transactions"][0]["id"])
+        self.assertEqual([row["replayed"] for row in replay.json()["transactions"]], [True, False])
+        self.assertEqual(Transaction.objects.filter(user=self.user).count(), 2)
+
+    def test_key_saved_by_a_concurrent_request_gets_409(self):
+        def bump_after_other_request(user_id):
+            # The other request commits the same key after this one looked for it
+            Transaction.objects.create(
+                user=self.user, transaction_type="INCOME", wallet=self.upi, amount=Decimal("1"),
+                category=Category.objects.get(user__isnull=True, name="Salary"), date=date.today(),
+                idempotency_key="k-1",
+            )
+            return bump_version(user_id)
+
+        with mock.patch.object(batch, "bump_version", side_effect=bump_after_other_request):
+            response = self.post_batch(self.entry("INCOME", "100", idempotency_key="k-1"))
+
+        self.assertEqual(response.status_code, 409)
+        # The stand-in for the other request shared this one's transaction, so it was rolled back too
+        self.assertFalse(Transaction.objects.filter(user=self.user).exists())
+
+
+class ChangesFeedTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        clear_suggestions()
+        self.user = User.objects.create_user(username="alice", password="secret-pass-123")
+        self.cash = self.user.wallets.order_by("id").first()
+        self.client.force_login(self.user)
+
+    def sync(self, cursor="", limit=2):
+        """Every change after ``cursor``, fetched ``limit`` at a time, and the final cursor"""
+        changes = []
+        while True:
+            body = self.client.get("/api/changes/", {"cursor": cursor, "limit": limit}).json()
+            changes += body["changes"]
+            cursor = body["cursor"]
+            if not body["has_more"]:
+                return changes, cursor
+
+    def test_pages_through_rows_that_share_a_seq(self):
+        entries = [
+            {"transaction_type": "INCOME", "wallet": self.cash.pk, "amount": str(amount), "category": "Salary", "date": date.today().isoformat()}
+            for amount in range(1, 6)
+        ]
+        created = self.client.post(
+            "/api/transactions/batch/", json.dumps({"transactions": entries}), content_type="application/json",
+        ).json()["transactions"]
+        self.assertEqual(len({row["seq"] for row in created}), 1)
+
+        changes, _ = self.sync()
+
+        self.assertEqual([change["transaction"]["id"] for change in changes], sorted(row["id"] for row in created))
+
+    def test_deletes_and_edits_after_the_cursor(self):
+        salary = Category.objects.get(user__isnull=True, name="Salary")
+        kept, dropped = (
+            Transaction.objects.create(
+                user=self.user, transaction_type="INCOME", wallet=self.cash, amount=Decimal("10"),
+                category=salary, date=date.today(),
+            )
+            for _ in range(2)
+        )
+        _, cursor = self.sync()
+
+        self.assertEqual(self.client.delete(f"/api/transactions/{dropped.pk}/").status_code, 204)
+        kept.description = "Bonus"
+        kept.save()
+        changes, cursor = self.sync(cursor)
+
+        self.assertEqual(changes, [
+            {"op": "delete", "id": dropped.pk},
+            {"op": "upsert", "transaction": mock.ANY},
+        ])
+        self.assertEqual(changes[1]["transaction"]["description"], "Bonus")
+        self.assertEqual(self.sync(cursor)[0], [])
+
+
+class TransactionDetailTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        clear_suggestions()
+        self.user = User.objects.create_user(username="alice", password="secret-pass-123")
+        self.cash, self.upi = self.user.wallets.order_by("id")
+        self.client.force_login(self.user)
+
+    def test_patching_a_switch_keeps_it_a_transfer(self):
+        Transaction.objects.create(
+            user=self.user, transaction_type="INCOME", wallet=self.cash, amount=Decimal("100"),
+            category=Category.objects.get(user__isnull=True, name="Salary"), date=date.today(),
+        )
+        switch = Transaction.objects.create(
+            user=self.user, transaction_type="SWITCH", wallet=self.cash, to_wallet=self.upi, amount=Decimal("30"),
+            category=Category.objects.get(user__isnull=True, name="Money Transfer"), date=date.today(),
+        )
+
+        response = self.client.patch(
+            f"/api/transactions/{switch.pk}/", json.dumps({"amount": "40", "description": "Top up"}),
+            content_type="application/json",
+        )
+
+        self.assertEqual(response.status_code, 200)
+        switch.refresh_from_db()
+        self.assertEqual((switch.amount, switch.description, switch.to_wallet), (Decimal("40"), "Top up", self.upi))
+        self.assertEqual(switch.category.name, "Money Transfer")
+
+
+class HealthTests(TestCase):
+    def test_only_staff_see_database_details(self):
+        self.assertEqual(self.client.get("/api/health/").json(), {"status": "ok"})
+        self.client.force_login(User.objects.create_user(username="alice", password="secret-pass-123"))
+        self.assertEqual(self.client.get("/api/health/").json(), {"status": "ok"})
+
+        self.client.force_login(User.objects.create_user(username="admin", password="secret-pass-123", is_staff=True))
+        database = self.client.get("/api/health/").json()["database"]
+        self.assertEqual(database["vendor"], connection.vendor)
+        if not connection.settings_dict["OPTIONS"].get("pool"):
+            self.assertIsNone(database["pool"])
+
+    @skipUnless(connection.settings_dict["OPTIONS"].get("pool"), "Only pooled PostgreSQL connections have pool stats")
+    def test_staff_see_pool_stats(self):
+        self.client.force_login(User.objects.create_user(username="admin", password="secret-pass-123", is_staff=True))
+        pool = self.client.get("/api/health/").json()["database"]["pool"]
+
+        self.assertGreaterEqual(pool["pool_size"], 1)
+        self.assertIn("requests_waiting", pool)
@@ -0,0 +1,15 @@
+from django.urls import path
+
+from .views import transactions, transaction_detail, transactions_batch, transactions_bulk, changes, balances, survival_summary, analytics_summary, health
+
+urlpatterns = [
+    path("transactions/", transactions, name="api_transactions"),
+    path("transactions/<int:pk>/", transaction_detail, name="api_transaction_detail"),
+    path("transactions/batch/", transactions_batch, name="api_transactions_batch"),
+    path("transactions/bulk/", transactions_bulk, name="api_transactions_bulk"),
+    path("changes/", changes, name="api_changes"),
+    path("balances/", balances, name="api_balances"),
+    path("summaries/survival/", survival_summary, name="api_survival_summary"),
+    path("summaries/analytics/", analytics_summary, name="api_analytics_summary"),
+    path("health/", health, name="api_health"),
+]
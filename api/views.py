@@ -0,0 +1,326 @@
+"""
+JSON API for mobile and offline clients.
+
+Requests are authenticated with the normal login session; send the
+``csrftoken`` cookie back in an ``X-CSRFToken`` header on POSTs. Amounts are
+returned as decimal strings.
+"""
+import copy
+import json
+from datetime import date
+from decimal import Decimal
+from functools import wraps
+
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connection
+from django.db.models import Q
+from django.http import HttpResponse, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.http import require_GET, require_http_methods, require_POST
+
+from dashboard.jobs import enqueue_summary_refresh, load_summary
+from dashboard.summaries import compute_analytics, compute_survival
+from ledger.archive import archived_before
+from ledger.balances import ZERO, wallets_with_balances
+from ledger.batch import BatchError, record_transactions
+from ledger.categories import spending_categories, transfer_category
+from ledger.edits import LedgerError, delete_transactions, recategorize, update_transaction
+from ledger.feed import DELETE, MAX_PAGE_SIZE, changes_since
+from ledger.forms import BulkActionForm, TransactionItemForm
+from ledger.models import Transaction, Wallet
+from ledger.search import search_transactions
+
+PAGE_SIZE = 50
+CENTS = Decimal("0.01")
+
+
+def api_login_required(view):
+    """Like ``login_required``, but answers 401 instead of redirecting to the login page"""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return JsonResponse({"error": "Authentication required."}, status=401)
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+def _json_body(request):
+    try:
+        return json.loads(request.body or b"null")
+    except ValueError:
+        return None
+
+
+def serialize_transaction(transaction):
+    return {
+        "id": transaction.id,
+        "transaction_type": transaction.transaction_type,
+        "wallet": transaction.wallet_id,
+        "to_wallet": transaction.to_wallet_id,
+        "amount": transaction.amount,
+        "category": transaction.category.name,
+        "description": transaction.description,
+        "date": transaction.date,
+        "idempotency_key": transaction.idempotency_key,
+        "seq": transaction.seq,
+        "created_at": transaction.created_at,
+    }
+
+
+def _record(request, items):
+    results, warnings, balances = record_transactions(request.user, items)
+    if any(created for _, created in results):
+        enqueue_summary_refresh(request.user)
+    return results, warnings, balances
+
+
+@api_login_required
+@require_http_methods(["GET", "POST"])
+def transactions(request):
+    if request.method == "POST":
+        return _create_transaction(request)
+
+    queryset = Transaction.objects.filter(user=request.user).select_related("category").order_by("-date", "-id")
+    try:
+        if request.GET.get("start_date"):
+            queryset = queryset.filter(date__gte=date.fromisoformat(request.GET["start_date"]))
+        if request.GET.get("end_date"):
+            queryset = queryset.filter(date__lte=date.fromisoformat(request.GET["end_date"]))
+    except ValueError:
+        return JsonResponse({"error": "Dates must be YYYY-MM-DD."}, status=400)
+    if request.GET.get("transaction_type"):
+        queryset = queryset.filter(transaction_type=request.GET["transaction_type"])
+    if request.GET.get("wallet", "").isdigit():
+        queryset = queryset.filter(Q(wallet_id=request.GET["wallet"]) | Q(to_wallet_id=request.GET["wallet"]))
+    if request.GET.get("q"):
+        queryset = search_transactions(queryset, request.GET["q"], request.user)
+
+    page = Paginator(queryset, PAGE_SIZE).get_page(request.GET.get("page"))
+    return JsonResponse({
+        "results": [serialize_transaction(transaction) for transaction in page],
+        "page": page.number,
+        "num_pages": page.paginator.num_pages,
+        "count": page.paginator.count,
+    })
+
+
+def _create_transaction(request):
+    data = _json_body(request)
+    if not isinstance(data, dict):
+        return JsonResponse({"error": "Send a JSON object."}, status=400)
+    if request.headers.get("Idempotency-Key"):
+        data["idempotency_key"] = request.headers["Idempotency-Key"]
+
+    try:
+        results, warnings, _ = _record(request, [data])
+    except BatchError as error:
+        # Unwrap the single entry's field errors
+        return JsonResponse({"errors": error.errors.get(0, error.errors)}, status=error.status)
+
+    (transaction, created), = results
+    return JsonResponse(
+        {
+            "transaction": serialize_transaction(transaction),
+            "warnings": [message for _, message in warnings],
+        },
+        status=201 if created else 200,
+    )
+
+
+@api_login_required
+@require_POST
+def transactions_batch(request):
+    data = _json_body(request)
+    items = data.get("transactions") if isinstance(data, dict) else None
+
+    try:
+        results, warnings, wallet_totals = _record(request, items)
+    except BatchError as error:
+        return JsonResponse({"errors": error.errors}, status=error.status)
+
+    return JsonResponse(
+        {
+            "transactions": [
+                {**serialize_transaction(transaction), "replayed": not created}
+                for transaction, created in results
+            ],
+            "warnings": [{"index": index, "message": message} for index, message in warnings],
+            "balances": {str(wallet_id): balance.quantize(CENTS) for wallet_id, balance in wallet_totals.items()},
+        },
+        status=201,
+    )
+
+
+@api_login_required
+@require_http_methods(["GET", "PATCH", "DELETE"])
+def transaction_detail(request, pk):
+    transaction = get_object_or_404(Transaction.objects.select_related("category"), pk=pk, user=request.user)
+    if request.method == "GET":
+        return JsonResponse({"transaction": serialize_transaction(transaction)})
+
+    if request.method == "DELETE":
+        try:
+            delete_transactions(request.user, [transaction])
+        except LedgerError as error:
+            return JsonResponse({"error": str(error)}, status=409)
+        enqueue_summary_refresh(request.user)
+        return HttpResponse(status=204)
+
+    data = _json_body(request)
+    if not isinstance(data, dict):
+        return JsonResponse({"error": "Send a JSON object."}, status=400)
+
+    # PATCH: fields left out keep their stored values
+    fields = ("transaction_type", "wallet", "to_wallet", "amount", "category", "description", "date")
+    stored = serialize_transaction(transaction)
+    merged = {field: data.get(field, stored[field]) for field in fields}
+    if transaction.transaction_type == "SWITCH" and "category" not in data:
+        # A switch's stored category is the transfer one, which isn't offered for spending
+        merged["category"] = ""
+    wallets = {wallet.id: wallet for wallet in Wallet.objects.filter(user=request.user)}
+    form = TransactionItemForm(
+        merged, wallets=wallets, categories=spending_categories(request.user),
+        archived_before=archived_before(request.user),
+    )
+    if not form.is_valid():
+        return JsonResponse({"errors": {field: list(messages) for field, messages in form.errors.items()}}, status=400)
+
+    original = copy.copy(transaction)
+    cleaned = form.cleaned_data
+    transaction.transaction_type = cleaned["transaction_type"]
+    transaction.wallet = wallets[cleaned["wallet"]]
+    transaction.amount = cleaned["amount"]
+    transaction.description = cleaned["description"]
+    transaction.date = cleaned["date"]
+    if transaction.transaction_type == "SWITCH":
+        transaction.to_wallet = wallets[cleaned["to_wallet"]]
+        transaction.category = transfer_category(request.user)
+    else:
+        transaction.to_wallet = None
+        transaction.category = cleaned["category"]
+
+    try:
+        warnings = update_transaction(original, transaction)
+    except LedgerError as error:
+        return JsonResponse({"error": str(error)}, status=409)
+    enqueue_summary_refresh(request.user)
+    return JsonResponse({"transaction": serialize_transaction(transaction), "warnings": warnings})
+
+
+@api_login_required
+@require_POST
+def transactions_bulk(request):
+    data = _json_body(request)
+    form = BulkActionForm(data if isinstance(data, dict) else {}, user=request.user)
+    if not form.is_valid():
+        return JsonResponse({"errors": {field: list(messages) for field, messages in form.errors.items()}}, status=400)
+
+    ids = form.cleaned_data["ids"]
+    warnings = []
+    try:
+        if form.cleaned_data["action"] == "delete":
+            count = delete_transactions(request.user, Transaction.objects.filter(user=request.user, pk__in=ids))
+        else:
+            count, warnings = recategorize(request.user, ids, form.cleaned_data["category"])
+    except LedgerError as error:
+        return JsonResponse({"error": str(error)}, status=409)
+
+    if count:
+        enqueue_summary_refresh(request.user)
+    return JsonResponse({"count": count, "warnings": warnings})
+
+
+@api_login_required
+@require_GET
+def changes(request):
+    limit = request.GET.get("limit", "")
+    try:
+        page, cursor, has_more = changes_since(
+            request.user,
+            request.GET.get("cursor", ""),
+            int(limit) if limit.isdigit() else MAX_PAGE_SIZE,
+        )
+    except ValueError:
+        return JsonResponse({"error": "Invalid cursor."}, status=400)
+
+    return JsonResponse({
+        "changes": [
+            {"op": "delete", "id": row.transaction_id}
+            if kind == DELETE
+            else {"op": "upsert", "transaction": serialize_transaction(row)}
+            for kind, row in page
+        ],
+        "cursor": cursor,
+        "has_more": has_more,
+    })
+
+
+@api_login_required
+@require_GET
+def balances(request):
+    wallets = wallets_with_balances(request.user)
+    return JsonResponse({
+        "wallets": [
+            {"id": wallet.id, "name": wallet.name, "kind": wallet.kind, "balance": wallet.balance.quantize(CENTS)}
+            for wallet in wallets
+        ],
+        "total": sum((wallet.balance for wallet in wallets), ZERO).quantize(CENTS),
+    })
+
+
+@api_login_required
+@require_GET
+def survival_summary(request):
+    today = date.today()
+    summary, computed_at, refresh_pending = load_summary(
+        request.user, "SURVIVAL", today,
+        lambda: compute_survival(request.user, today),
+    )
+    return JsonResponse({"summary": summary, "computed_at": computed_at, "refresh_pending": refresh_pending})
+
+
+@api_login_required
+@require_GET
+def analytics_summary(request):
+    today = date.today()
+    try:
+        year = int(request.GET.get("year", today.year))
+        month = int(request.GET.get("month", today.month))
+        date(year, month, 1)
+    except ValueError:
+        return JsonResponse({"error": "month and year must form a valid date."}, status=400)
+
+    if (year, month) == (today.year, today.month):
+        summary, computed_at, refresh_pending = load_summary(
+            request.user, "ANALYTICS", today,
+            lambda: compute_analytics(request.user, year, month, today),
+        )
+    else:
+        summary, computed_at, refresh_pending = compute_analytics(request.user, year, month, today), None, False
+    return JsonResponse({"summary": summary, "computed_at": computed_at, "refresh_pending": refresh_pending})
+
+
+def _pool_stats():
+    """The connection pool's counters for this process, or None when connections aren't pooled"""
+    pool = getattr(connection, "pool", None)
+    return pool.get_stats() if pool is not None else None
+
+
+@require_GET
+def health(request):
+    """
+    Health check for load balancers; answers 503 if the database can't be reached.
+
+    Staff users also get this process's connection pool metrics (size,
+    idle connections, waiting requests and time spent waiting).
+    """
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1")
+    except DatabaseError:
+        return JsonResponse({"status": "unavailable"}, status=503)
+
+    data = {"status": "ok"}
+    if request.user.is_staff:
+        data["database"] = {"vendor": connection.vendor, "pool": _pool_stats()}
+    return JsonResponse(data)
@@ -1,2 +1,16 @@
 from django.contrib import admin
+from .models import MonthlyStatement, SummaryJob
 
+@admin.register(SummaryJob)
+class SummaryJobAdmin(admin.ModelAdmin):
+    list_display = ['user', 'status', 'requested_at', 'started_at', 'finished_at', 'attempts']
+    list_filter = ['status']
+    list_select_related = ['user']
+
+
+@admin.register(MonthlyStatement)
+class MonthlyStatementAdmin(admin.ModelAdmin):
+    list_display = ['user', 'month', 'stale', 'generated_at']
+    list_filter = ['stale', 'month']
+    list_select_related = ['user']
+    exclude = ['payload']
@@ -0,0 +1,108 @@
+"""
+Conditional GET and per-user page caching for the read-only dashboard pages.
+
+A page's ETag is built from the user's ledger version, today's date, the
+query string and the browser's CSRF cookie, so it can be checked with a
+single primary-key read before the view does any work. Rendered pages are
+kept in the cache under that ETag; a write bumps the ledger version, so stale
+entries are simply never read again. Concurrent misses for the same page
+render it once (see ``singleflight``). A browser without a CSRF cookie yet
+always gets a fresh render, which sets one.
+"""
+from datetime import date
+from functools import wraps
+from hashlib import md5
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.contrib import messages
+from django.http import HttpResponse
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.http import condition
+
+from ledger.versions import get_version
+
+from .models import SummaryJob
+from .singleflight import single_flight
+
+
+def ledger_version(request):
+    """The user's ledger version, read at most once per request"""
+    if not hasattr(request, "_ledger_version"):
+        request._ledger_version = get_version(request.user)
+    return request._ledger_version
+
+
+def _page_etag(request, summaries):
+    # Flash messages are shown once, so those responses are never reused
+    if request.method != "GET" or len(messages.get_messages(request)):
+        return None
+    # Without a CSRF cookie, a form on the page needs a render that sets one;
+    # a cached copy would come back without the Set-Cookie header
+    if settings.CSRF_COOKIE_NAME not in request.COOKIES:
+        return None
+
+    parts = [
+        request.path,
+        str(request.user.pk),
+        str(ledger_version(request).version),
+        date.today().isoformat(),
+        urlencode(sorted(request.GET.lists()), doseq=True),
+        request.headers.get("x-requested-with", ""),
+        # Forms on the page carry a CSRF token tied to this browser's cookie
+        request.COOKIES[settings.CSRF_COOKIE_NAME],
+    ]
+    if summaries and settings.PRECOMPUTE_SUMMARIES:
+        # A finished refresh changes the page without a ledger write
+        job = SummaryJob.objects.filter(user=request.user).values_list("status", "finished_at").first()
+        parts.append(str(job))
+    return md5("|".join(parts).encode()).hexdigest()
+
+
+def private_page_cache(summaries=False):
+    """
+    Answer conditional GETs with 304 and serve repeat visits from the cache.
+
+    Pass ``summaries=True`` for pages built from precomputed summaries, so
+    that a finished background refresh also produces a new ETag.
+    """
+    def decorator(view):
+        def etag_func(request, *args, **kwargs):
+            if not hasattr(request, "_page_etag"):
+                request._page_etag = _page_etag(request, summaries)
+            return request._page_etag
+
+        @wraps(view)
+        def cached_view(request, *args, **kwargs):
+            etag = etag_func(request)
+            if etag is None:
+                return view(request, *args, **kwargs)
+
+            response = None
+
+            def render():
+                nonlocal response
+                response = view(request, *args, **kwargs)
+                if response.status_code == 200 and not response.streaming:
+                    return response.content, response["Content-Type"]
+                return None
+
+            # Identical requests arriving together wait for one render
+            page = single_flight(f"page:{request.user.pk}:{etag}", render, settings.PAGE_CACHE_SECONDS)
+            if response is not None:
+                return response
+            content, content_type = page
+            return HttpResponse(content, content_type=content_type)
+
+        conditional_view = condition(etag_func=etag_func)(cached_view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            patch_cache_control(response, private=True, no_cache=True)
+            patch_vary_headers(response, ("X-Requested-With",))
+            return response
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,159 @@
+"""
+Household summaries: balances and monthly analytics added up across members.
+
+Each figure is one grouped query over every member's rows at once, keyed
+by member, so the per-member breakdown comes back in the same pass as the
+household total. A household of six costs the same handful of queries as
+a single user. A month's rows come from the live table UNION ALL the
+monthly summaries. A member's month is in exactly one of the two, so this
+works whatever each member has archived.
+"""
+import calendar
+from datetime import date
+
+from django.db.models import Count, Q, Sum
+
+from accounts.models import HouseholdMember
+from ledger.balances import ZERO, wallet_totals
+from ledger.models import ArchivedTransaction, LedgerVersion, MonthlySummary, OpeningBalance, Transaction, Wallet
+
+
+def household_members(user):
+    """``user``'s household membership rows, owners first, with users loaded (one query; empty if none)"""
+    return list(
+        HouseholdMember.objects.filter(household__members__user=user)
+        .select_related("user", "household")
+        .order_by("-role", "joined_at", "pk")
+    )
+
+
+def household_version(members):
+    """A cache key part that changes whenever any member writes or the membership changes (one query)"""
+    versions = dict(LedgerVersion.objects.filter(user_id__in=[m.user_id for m in members]).values_list("user_id", "version"))
+    return "-".join(f"{m.user_id}.{m.role}.{versions.get(m.user_id, 0)}" for m in sorted(members, key=lambda m: m.user_id))
+
+
+def _member_rows(members):
+    return [
+        {"user_id": m.user_id, "name": m.user.get_full_name() or m.user.username, "role": m.role}
+        for m in members
+    ]
+
+
+def compute_household_balances(members):
+    """
+    Every member's wallets with balances, each member's total and the household's.
+
+    Two queries: one grouped over all members' rows and opening balances,
+    and one for the wallets themselves.
+    """
+    user_ids = [m.user_id for m in members]
+    balances = wallet_totals(
+        Transaction.objects.filter(user_id__in=user_ids), OpeningBalance.objects.filter(user_id__in=user_ids),
+    )
+    rows = _member_rows(members)
+    by_user = {row["user_id"]: row for row in rows}
+    for row in rows:
+        row["wallets"] = []
+        row["balance"] = 0.0
+    for wallet in Wallet.objects.filter(user_id__in=user_ids).order_by("id"):
+        balance = float(balances.get(wallet.id, ZERO))
+        by_user[wallet.user_id]["wallets"].append({"name": wallet.name, "kind": wallet.kind, "balance": balance})
+        by_user[wallet.user_id]["balance"] += balance
+    return {"members": rows, "balance": sum(row["balance"] for row in rows)}
+
+
+def compute_household_month(members, year, month):
+    """
+    Income, expenses and category totals for one month, per member and for the household.
+
+    One query: ``GROUP BY member, type, category`` over the month's live
+    rows UNION ALL its monthly summaries. Category totals carry a
+    per-member split in ``by_member``, in the same order as ``members``.
+    """
+    user_ids = [m.user_id for m in members]
+    first = date(year, month, 1)
+    live = (
+        Transaction.objects.filter(user_id__in=user_ids, date__year=year, date__month=month)
+        .exclude(transaction_type="SWITCH")
+        .order_by()
+        .values_list("user_id", "transaction_type", "category__name")
+        .annotate(total=Sum("amount"), count=Count("id"))
+    )
+    archived = (
+        MonthlySummary.objects.filter(user_id__in=user_ids, month=first)
+        .exclude(transaction_type="SWITCH")
+        .order_by()
+        .values_list("user_id", "transaction_type", "category__name")
+        .annotate(total=Sum("amount"), count=Sum("count"))
+    )
+
+    rows = _member_rows(members)
+    index = {row["user_id"]: position for position, row in enumerate(rows)}
+    for row in rows:
+        row.update(income=0.0, expense=0.0, count=0)
+    categories = {"INCOME": {}, "EXPENSE": {}}
+    for user_id, transaction_type, category, total, count in live.union(archived, all=True):
+        row = rows[index[user_id]]
+        row["income" if transaction_type == "INCOME" else "expense"] += float(total)
+        row["count"] += count
+        entry = categories[transaction_type].setdefault(category, {"category": category, "total": 0.0, "by_member": [0.0] * len(rows)})
+        entry["total"] += float(total)
+        entry["by_member"][index[user_id]] += float(total)
+
+    for row in rows:
+        row["net"] = row["income"] - row["expense"]
+    income = sum(row["income"] for row in rows)
+    expense = sum(row["expense"] for row in rows)
+    return {
+        "members": rows,
+        "income": income,
+        "expense": expense,
+        "net": income - expense,
+        "count": sum(row["count"] for row in rows),
+        "expense_categories": sorted(categories["EXPENSE"].values(), key=lambda entry: -entry["total"]),
+        "income_categories": sorted(categories["INCOME"].values(), key=lambda entry: -entry["total"]),
+    }
+
+
+def compute_household_daily(members, year, month):
+    """
+    Daily expenses of one month, one series per member, for the household chart.
+
+    One query: ``GROUP BY day, member`` over the live rows UNION ALL the
+    archived ones.
+    """
+    user_ids = [m.user_id for m in members]
+    days = calendar.monthrange(year, month)[1]
+    expenses = Q(transaction_type="EXPENSE")
+    live = (
+        Transaction.objects.filter(expenses, user_id__in=user_ids, date__year=year, date__month=month)
+        .order_by()
+        .values_list("date", "user_id")
+        .annotate(total=Sum("amount"))
+    )
+    archived = (
+        ArchivedTransaction.objects.filter(expenses, user_id__in=user_ids, date__year=year, date__month=month)
+        .order_by()
+        .values_list("date", "user_id")
+        .annotate(total=Sum("amount"))
+    )
+
+    series = {m.user_id: [0.0] * days for m in members}
+    for day, user_id, total in live.union(archived, all=True):
+        series[user_id][day.day - 1] += float(total)
+    return {
+        "labels": [str(day) for day in range(1, days + 1)],
+        "members": [{"name": row["name"], "expense": series[row["user_id"]]} for row in _member_rows(members)],
+    }
+
+
+def compute_household(members, year, month):
+    """Balances and one month's analytics for the household page, merged per member"""
+    balances = compute_household_balances(members)
+    summary = compute_household_month(members, year, month)
+    for row, balance_row in zip(summary["members"], balances["members"]):
+        row["balance"] = balance_row["balance"]
+        row["wallets"] = balance_row["wallets"]
+    summary["balance"] = balances["balance"]
+    return summary
@@ -0,0 +1,136 @@
+"""
+Local, database-backed job queue for precomputing per-user summaries.
+
+Ledger writes call ``enqueue_summary_refresh``; the ``run_summary_worker``
+management command claims pending jobs and recomputes snapshots in a process
+pool, and ``sweep_summaries`` re-enqueues every active user nightly.
+No external broker is needed: the queue is the ``SummaryJob`` table.
+"""
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from ledger.versions import get_version
+
+from .models import SummaryJob, SummarySnapshot
+from .singleflight import single_flight
+from .summaries import compute_analytics, compute_survival
+
+
+def enqueue_summary_refresh(user):
+    """Ask the worker to recompute ``user``'s snapshots (no-op when precomputation is off)."""
+    if not settings.PRECOMPUTE_SUMMARIES:
+        return
+    now = timezone.now()
+    updated = SummaryJob.objects.filter(user=user).update(status="PENDING", requested_at=now)
+    if not updated:
+        SummaryJob.objects.get_or_create(user=user, defaults={"requested_at": now})
+
+
+def enqueue_users(user_ids):
+    """Enqueue a chunk of users with two queries instead of one per user."""
+    now = timezone.now()
+    user_ids = list(user_ids)
+    SummaryJob.objects.filter(user_id__in=user_ids).update(status="PENDING", requested_at=now)
+    existing = set(SummaryJob.objects.filter(user_id__in=user_ids).values_list("user_id", flat=True))
+    SummaryJob.objects.bulk_create(
+        [SummaryJob(user_id=user_id, requested_at=now) for user_id in user_ids if user_id not in existing],
+        ignore_conflicts=True,
+    )
+
+
+def requeue_stale_jobs(timeout):
+    """Put jobs left RUNNING by a crashed worker back in the queue."""
+    cutoff = timezone.now() - timedelta(seconds=timeout)
+    return SummaryJob.objects.filter(status="RUNNING", started_at__lt=cutoff).update(status="PENDING")
+
+
+def claim_jobs(limit):
+    """
+    Claim up to ``limit`` pending jobs for this worker and return them.
+
+    Each claim is a conditional UPDATE on the PENDING status, so several
+    workers can poll the same table without picking the same job twice.
+    """
+    candidates = SummaryJob.objects.filter(status="PENDING").order_by("requested_at").values_list("id", flat=True)[:limit]
+    claimed = []
+    for job_id in list(candidates):
+        now = timezone.now()
+        if SummaryJob.objects.filter(pk=job_id, status="PENDING").update(status="RUNNING", started_at=now, attempts=F("attempts") + 1):
+            claimed.append(SummaryJob.objects.get(pk=job_id))
+    return claimed
+
+
+def finish_job(job, error=""):
+    """
+    Mark a claimed job as done or failed.
+
+    If the user was enqueued again while the job was running the row is
+    already back to PENDING and is left alone, so the newer write gets
+    its own recomputation.
+    """
+    SummaryJob.objects.filter(pk=job.pk, status="RUNNING").update(
+        status="FAILED" if error else "DONE",
+        finished_at=timezone.now(),
+        last_error=error,
+    )
+
+
+def save_snapshot(user_id, kind, as_of, payload):
+    SummarySnapshot.objects.update_or_create(
+        user_id=user_id,
+        kind=kind,
+        defaults={"as_of": as_of, "payload": payload, "computed_at": timezone.now()},
+    )
+
+
+def refresh_user_summaries(user_id, today=None):
+    """Recompute and store every snapshot for one user. Runs inside worker processes."""
+    from accounts.models import User
+
+    today = today or date.today()
+    user = User.objects.get(pk=user_id)
+    save_snapshot(user_id, "SURVIVAL", today, compute_survival(user, today))
+    save_snapshot(user_id, "ANALYTICS", today, compute_analytics(user, today.year, today.month, today))
+
+
+def get_snapshot(user, kind, today=None):
+    """Return today's snapshot of ``kind`` for ``user``, or None if there is none yet."""
+    today = today or date.today()
+    return SummarySnapshot.objects.filter(user=user, kind=kind, as_of=today).first()
+
+
+def refresh_pending(user):
+    return SummaryJob.objects.filter(user=user, status__in=["PENDING", "RUNNING"]).exists()
+
+
+def load_summary(user, kind, today, compute, version=None):
+    """
+    Return ``(summary, computed_at, refresh_pending)`` for one of the precomputed summaries.
+
+    With PRECOMPUTE_SUMMARIES on, today's snapshot is served as-is even if a
+    refresh is queued; the very first visit of the day computes it inline.
+    Otherwise the summary is computed inside the request. Either way,
+    concurrent requests for the same ``version`` of the user's ledger share
+    a single computation; pass the version if the caller already read it.
+    """
+    if version is None:
+        version = get_version(user).version
+    key = f"summary:{user.pk}:{kind}:{version}:{today.isoformat()}"
+
+    if not settings.PRECOMPUTE_SUMMARIES:
+        return single_flight(key, compute, settings.PAGE_CACHE_SECONDS), None, False
+
+    snapshot = get_snapshot(user, kind, today)
+    if snapshot is not None:
+        return snapshot.payload, snapshot.computed_at, refresh_pending(user)
+
+    def compute_and_save():
+        summary = compute()
+        save_snapshot(user.pk, kind, today, summary)
+        return summary
+
+    summary = single_flight(key, compute_and_save, settings.PAGE_CACHE_SECONDS)
+    return summary, timezone.now(), False
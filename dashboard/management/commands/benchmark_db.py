@@ -0,0 +1,105 @@
+import statistics
+import threading
+import time
+
+import dj_database_url
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.utils import ConnectionHandler
+
+# One wallet-balance aggregate, the query behind every dashboard page
+QUERY = """
+    SELECT wallet_id, SUM(amount) FROM ledger_transaction
+    WHERE user_id = (SELECT MIN(id) FROM accounts_user)
+    GROUP BY wallet_id
+"""
+
+MODES = ("new connection per request", "persistent (CONN_MAX_AGE)", "pool")
+
+
+class Command(BaseCommand):
+    help = "Measure request latency under concurrency with and without the Postgres connection pool"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--database-url", help="Postgres URL to benchmark (default: the configured database)")
+        parser.add_argument("--threads", type=int, default=16, help="Concurrent simulated requests")
+        parser.add_argument("--requests", type=int, default=200, help="Requests per thread and mode")
+
+    def handle(self, *args, **options):
+        if options["database_url"]:
+            database = dj_database_url.parse(options["database_url"])
+        else:
+            database = dict(settings.DATABASES["default"])
+        if database["ENGINE"] != "django.db.backends.postgresql":
+            raise CommandError("benchmark_db needs PostgreSQL; pass --database-url postgres://...")
+
+        threads, count = options["threads"], options["requests"]
+        self.stdout.write(f"{threads} threads x {count} requests, pool options {settings.DB_POOL_OPTIONS}")
+        self.stdout.write(f"{'mode':<30}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+        for mode in MODES:
+            latencies, seconds, stats = self._run(database, mode, threads, count)
+            latencies.sort()
+            percentile = lambda p: latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+            self.stdout.write(
+                f"{mode:<30}{len(latencies) / seconds:>9.0f}{statistics.median(latencies) * 1000:>9.2f}"
+                f"{percentile(0.95):>9.2f}{percentile(0.99):>9.2f}{latencies[-1] * 1000:>9.2f}"
+            )
+            if stats:
+                self.stdout.write(f"{'':<30}pool: {stats}")
+
+    def _run(self, database, mode, threads, count):
+        options = {key: value for key, value in database.get("OPTIONS", {}).items() if key != "pool"}
+        database = {
+            **database,
+            "OPTIONS": options,
+            "CONN_MAX_AGE": 600 if mode.startswith("persistent") else 0,
+            "CONN_HEALTH_CHECKS": True,
+        }
+        if mode == "pool":
+            options["pool"] = dict(settings.DB_POOL_OPTIONS)
+        # Pools are kept per alias, so every mode gets its own
+        alias = f"benchmark_{MODES.index(mode)}"
+        # A handler must define "default", which is never connected here
+        connections = ConnectionHandler({"default": database, alias: database})
+
+        barrier = threading.Barrier(threads + 1)
+        latencies, errors = [], []
+        lock = threading.Lock()
+
+        def worker():
+            barrier.wait()
+            connection = connections[alias]
+            timings = []
+            try:
+                for _ in range(count):
+                    start = time.perf_counter()
+                    # What Django does on request_started and request_finished
+                    connection.close_if_unusable_or_obsolete()
+                    with connection.cursor() as cursor:
+                        cursor.execute(QUERY)
+                        cursor.fetchall()
+                    connection.close_if_unusable_or_obsolete()
+                    timings.append(time.perf_counter() - start)
+                connection.close()
+            except Exception as error:
+                errors.append(error)
+            with lock:
+                latencies.extend(timings)
+
+        workers = [threading.Thread(target=worker) for _ in range(threads)]
+        for thread in workers:
+            thread.start()
+        barrier.wait()
+        start = time.perf_counter()
+        for thread in workers:
+            thread.join()
+        seconds = time.perf_counter() - start
+
+        stats = None
+        wrapper = connections[alias]
+        if mode == "pool":
+            stats = wrapper.pool.get_stats()
+            wrapper.close_pool()
+        if errors:
+            raise CommandError(f"{mode}: {errors[0]}")
+        return latencies, seconds, stats
@@ -0,0 +1,48 @@
+import multiprocessing
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from dashboard.statements import is_closed, pending_statements
+from dashboard.worker import generate_statement, init_worker
+from ledger.archive import archive_cutoff
+
+
+class Command(BaseCommand):
+    help = "Generate last month's statements, and regenerate stale ones, in a local process pool (run after month end, e.g. from cron)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--month", help="Month to generate, YYYY-MM (default last month)")
+        parser.add_argument("--processes", type=int, default=multiprocessing.cpu_count(), help="Number of worker processes")
+
+    def handle(self, *args, **options):
+        if options["month"]:
+            try:
+                month = date.fromisoformat(f"{options['month']}-01")
+            except ValueError:
+                raise CommandError("--month must be YYYY-MM")
+            if not is_closed(month):
+                raise CommandError("A statement can only be generated once its month is over")
+        else:
+            month = archive_cutoff(date.today(), 1)
+        if options["processes"] < 1:
+            raise CommandError("--processes must be at least 1")
+
+        pending = pending_statements(month)
+        failed = 0
+        # "spawn" keeps forked children from sharing the parent's open database connections
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=options["processes"], mp_context=context, initializer=init_worker) as pool:
+            futures = {key: pool.submit(generate_statement, *key) for key in pending}
+            for (user_id, statement_month), future in futures.items():
+                try:
+                    future.result()
+                except Exception:
+                    failed += 1
+                    self.stderr.write(f"Statement {statement_month:%Y-%m} failed for user {user_id}:\n{traceback.format_exc()}")
+
+        self.stdout.write(self.style.SUCCESS(f"Generated {len(pending) - failed} statement(s)"))
+        if failed:
+            self.stdout.write(self.style.WARNING(f"{failed} statement(s) failed"))
@@ -0,0 +1,44 @@
+import multiprocessing
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from dashboard.jobs import claim_jobs, finish_job, requeue_stale_jobs
+from dashboard.worker import init_worker, refresh_summaries
+
+
+class Command(BaseCommand):
+    help = "Process queued summary refresh jobs in a local process pool"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--processes", type=int, default=multiprocessing.cpu_count(), help="Number of worker processes")
+        parser.add_argument("--batch-size", type=int, default=50, help="Jobs claimed per polling round")
+        parser.add_argument("--poll-interval", type=float, default=5.0, help="Seconds to sleep when the queue is empty")
+        parser.add_argument("--stale-after", type=int, default=600, help="Seconds after which a RUNNING job is considered abandoned")
+        parser.add_argument("--once", action="store_true", help="Drain the queue once and exit")
+
+    def handle(self, *args, **options):
+        # "spawn" keeps forked children from sharing the parent's open database connections
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=options["processes"], mp_context=context, initializer=init_worker) as pool:
+            while True:
+                requeue_stale_jobs(options["stale_after"])
+                jobs = claim_jobs(options["batch_size"])
+                if not jobs:
+                    if options["once"]:
+                        break
+                    time.sleep(options["poll_interval"])
+                    continue
+
+                futures = {job: pool.submit(refresh_summaries, job.user_id) for job in jobs}
+                for job, future in futures.items():
+                    try:
+                        future.result()
+                    except Exception:
+                        finish_job(job, error=traceback.format_exc())
+                        self.stderr.write(f"Summary refresh failed for user {job.user_id}")
+                    else:
+                        finish_job(job)
+                self.stdout.write(f"Refreshed summaries for {len(jobs)} user(s)")
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from accounts.models import User
+from dashboard.jobs import enqueue_users
+
+
+class Command(BaseCommand):
+    help = "Enqueue a summary refresh for every active user (run nightly, e.g. from cron)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=500, help="Users enqueued per batch")
+
+    def handle(self, *args, **options):
+        chunk_size = options["chunk_size"]
+        user_ids = User.objects.filter(is_active=True).order_by("pk").values_list("pk", flat=True)
+
+        total = 0
+        chunk = []
+        for user_id in user_ids.iterator(chunk_size=chunk_size):
+            chunk.append(user_id)
+            if len(chunk) == chunk_size:
+                enqueue_users(chunk)
+                total += len(chunk)
+                chunk = []
+        if chunk:
+            enqueue_users(chunk)
+            total += len(chunk)
+
+        self.stdout.write(self.style.SUCCESS(f"Enqueued summary refresh for {total} user(s)"))
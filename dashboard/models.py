@@ -0,0 +1,118 @@
+from datetime import date
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+
+
+class SummarySnapshot(models.Model):
+    """
+    Last precomputed survival/analytics summary for a user, as of a given day
+    """
+    KIND = (
+        ("SURVIVAL", "Survival"),
+        ("ANALYTICS", "Analytics"),
+    )
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="summary_snapshots"
+    )
+    kind = models.CharField(max_length=20, choices=KIND)
+    as_of = models.DateField()
+    payload = models.JSONField(encoder=DjangoJSONEncoder)
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "kind"], name="unique_summary_snapshot_per_kind"),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.kind} ({self.as_of})"
+
+
+class SummaryJob(models.Model):
+    """
+    Database-backed queue entry asking the summary worker to refresh a user's snapshots.
+
+    There is at most one row per user: enqueueing again while a job is pending
+    or running just moves it back to PENDING, so bursts of ledger writes
+    collapse into a single recomputation.
+    """
+    STATUS = (
+        ("PENDING", "Pending"),
+        ("RUNNING", "Running"),
+        ("DONE", "Done"),
+        ("FAILED", "Failed"),
+    )
+
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="summary_job"
+    )
+    status = models.CharField(max_length=10, choices=STATUS, default="PENDING")
+    requested_at = models.DateTimeField()
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "requested_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.status}"
+
+
+class StatementQuerySet(models.QuerySet):
+    def invalidate(self, user_id, day):
+        """
+        Mark ``user_id``'s statements stale from the month of ``day`` on, after a write dated ``day``.
+
+        Later months go too, since their opening balances carry this one's
+        closing balance. A write in the current month touches no statement,
+        so it costs no query.
+        """
+        first = day.replace(day=1)
+        if first >= date.today().replace(day=1):
+            return 0
+        return self.filter(user_id=user_id, month__gte=first, stale=False).update(stale=True)
+
+
+class MonthlyStatement(models.Model):
+    """
+    A closed month's statement, generated once and kept as files.
+
+    ``csv_file`` and ``html_file`` are the downloads; ``payload`` holds the
+    month's analytics, so the page for a past month reads one row instead
+    of aggregating it again. A later write dated in the month, or in an
+    earlier one, marks the statement ``stale`` and it is generated again on
+    next use.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="statements"
+    )
+    # First day of the month
+    month = models.DateField()
+    csv_file = models.FileField(max_length=200)
+    html_file = models.FileField(max_length=200)
+    payload = models.JSONField(encoder=DjangoJSONEncoder)
+    stale = models.BooleanField(default=False)
+    generated_at = models.DateTimeField()
+
+    objects = StatementQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "month"], name="unique_statement_per_month"),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.month:%Y-%m}{' (stale)' if self.stale else ''}"
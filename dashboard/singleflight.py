@@ -0,0 +1,100 @@
+"""
+Single-flight coalescing of identical concurrent computations.
+
+When several requests need the same uncached value at once (a user
+reloading, or opening the dashboard on a few devices), one of them computes
+it and the rest wait for its result instead of running the same queries.
+Inside a process the waiters block on the leader's event; across processes
+the leader holds a lock made with ``cache.add`` and the others poll the
+cache until the value appears. Keys carry the user's ledger version, so a
+write starts a new flight instead of joining one that is already stale.
+
+The cross-process part needs a shared cache. With the default per-process
+``LocMemCache`` (no ``REDIS_URL``) each process has its own lock and its own
+cached values, so a flight is only shared by the threads of one process and
+each process computes the value once for itself. That is still correct,
+just less deduplicated; nothing here falls back to a database lock, since
+holding one for the length of a page render would cost more than it saves.
+"""
+import time
+import uuid
+from threading import Event, Lock
+
+from django.core.cache import cache
+
+# A crashed leader's lock expires after this long
+LOCK_SECONDS = 30
+# Waiters give up and compute the value themselves after this long
+WAIT_SECONDS = 10
+POLL_SECONDS = 0.05
+
+_flights = {}
+_lock = Lock()
+
+
+class _Flight:
+    __slots__ = ("finished", "value")
+
+    def __init__(self):
+        self.finished = Event()
+        self.value = None
+
+
+def _compute_once(key, compute, timeout):
+    """Compute and cache ``key`` while holding its cache lock, or wait for the process that holds it"""
+    lock_key = f"{key}:flight"
+    token = uuid.uuid4().hex
+    deadline = time.monotonic() + WAIT_SECONDS
+    while not cache.add(lock_key, token, LOCK_SECONDS):
+        if time.monotonic() > deadline:
+            return compute()
+        time.sleep(POLL_SECONDS)
+        value = cache.get(key)
+        if value is not None:
+            return value
+
+    try:
+        # The previous holder may have finished between our read and the lock
+        value = cache.get(key)
+        if value is None:
+            value = compute()
+            if value is not None:
+                cache.set(key, value, timeout)
+        return value
+    finally:
+        if cache.get(lock_key) == token:
+            cache.delete(lock_key)
+
+
+def single_flight(key, compute, timeout):
+    """
+    Return the value cached under ``key``, calling ``compute`` for it at most once at a time.
+
+    The result is cached for ``timeout`` seconds and handed to every caller
+    that was waiting for it. ``compute`` may return None for a result that
+    must not be shared; each waiter then computes its own. If the leader
+    fails, or takes longer than ``WAIT_SECONDS``, waiters compute too rather
+    than hang.
+    """
+    value = cache.get(key)
+    if value is not None:
+        return value
+
+    with _lock:
+        flight = _flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = _flights[key] = _Flight()
+
+    if not leader:
+        if flight.finished.wait(WAIT_SECONDS) and flight.value is not None:
+            return flight.value
+        return compute()
+
+    try:
+        flight.value = _compute_once(key, compute, timeout)
+        return flight.value
+    finally:
+        with _lock:
+            del _flights[key]
+        flight.finished.set()
@@ -0,0 +1,217 @@
+"""
+Monthly statements: a closed month's figures, generated once and kept as files.
+
+Once a month is over its numbers only change when a write is dated inside
+it, which is rare, so each month is aggregated once: ``generate_statement``
+writes a CSV and a printable HTML statement into the media storage and
+keeps the month's analytics in ``MonthlyStatement.payload``. The analytics
+page and the downloads for a past month then read that row and those
+files. ``manage.py generate_statements`` produces every user's statements
+after month end in a process pool; a month nobody has generated yet, or
+one marked stale by a back-dated write, is generated on first use.
+"""
+import csv
+import secrets
+from collections import defaultdict
+from datetime import date
+from io import StringIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction as db_transaction
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from ledger.archive import archived_before
+from ledger.balances import ZERO, wallet_balances
+from ledger.models import ArchivedTransaction, LedgerVersion, Transaction, Wallet
+
+from .models import MonthlyStatement
+from .summaries import compute_month_chart, compute_month_summary
+
+CSV_HEADER = ["date", "type", "wallet", "to_wallet", "category", "description", "amount", "balance", "wallet_balance"]
+
+
+def is_closed(month, today=None):
+    """Whether ``month`` (its first day) is over, so it can have a statement"""
+    return month < (today or date.today()).replace(day=1)
+
+
+def _next_month(month):
+    return date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def statement_rows(user, month):
+    """
+    ``(wallets, rows)``: each wallet with its opening and closing balance, and the month's rows with running balances.
+
+    Rows are in (date, id) order, each with ``balance`` (all wallets
+    together) and ``wallet_balance`` (its own wallet) after it. They come
+    from the archive if the month is archived.
+    """
+    before = archived_before(user)
+    table = ArchivedTransaction if before is not None and month < before else Transaction
+    opening = wallet_balances(user, before=month)
+    closing = defaultdict(lambda: ZERO, opening)
+    balance = sum(opening.values(), ZERO)
+
+    rows = []
+    transactions = (
+        table.objects.filter(user=user, date__gte=month, date__lt=_next_month(month))
+        .select_related("wallet", "to_wallet", "category")
+        .order_by("date", "id")
+    )
+    for t in transactions:
+        if t.transaction_type == "INCOME":
+            closing[t.wallet_id] += t.amount
+            balance += t.amount
+        else:
+            closing[t.wallet_id] -= t.amount
+            if t.transaction_type == "SWITCH":
+                closing[t.to_wallet_id] += t.amount
+            else:
+                balance -= t.amount
+        rows.append({
+            "date": t.date,
+            "type": t.transaction_type,
+            "wallet": t.wallet.name,
+            "to_wallet": t.to_wallet.name if t.to_wallet_id else "",
+            "category": t.category.name,
+            "description": t.description,
+            "amount": t.amount,
+            "balance": balance,
+            "wallet_balance": closing[t.wallet_id],
+        })
+
+    wallets = [
+        {"name": wallet.name, "kind": wallet.kind, "opening": opening.get(wallet.id, ZERO), "closing": closing[wallet.id]}
+        for wallet in Wallet.objects.filter(user=user).order_by("id")
+    ]
+    return wallets, rows
+
+
+def build_statement(user, month):
+    """``(payload, rows)`` of ``user``'s statement for ``month``"""
+    wallets, rows = statement_rows(user, month)
+    payload = {
+        "month": month,
+        "summary": compute_month_summary(user, month.year, month.month),
+        "chart": compute_month_chart(user, month.year, month.month),
+        "wallets": [
+            {**wallet, "opening": float(wallet["opening"]), "closing": float(wallet["closing"])}
+            for wallet in wallets
+        ],
+        "opening_balance": float(sum((wallet["opening"] for wallet in wallets), ZERO)),
+        "closing_balance": float(sum((wallet["closing"] for wallet in wallets), ZERO)),
+    }
+    return payload, rows
+
+
+def _csv(payload, rows):
+    output = StringIO()
+    writer = csv.writer(output)
+    writer.writerow(CSV_HEADER)
+    writer.writerow([payload["month"].isoformat(), "OPENING", "", "", "", "Opening balance", "", f"{payload['opening_balance']:.2f}", ""])
+    for row in rows:
+        writer.writerow([row["date"].isoformat(), *(row[field] for field in CSV_HEADER[1:])])
+    return output.getvalue()
+
+
+def _html(user, payload, rows):
+    return render_to_string("dashboard/statement.html", {"statement_user": user, **payload, "rows": rows})
+
+
+def generate_statement(user, month):
+    """
+    Write ``user``'s statement for the closed ``month`` and return its ``MonthlyStatement``.
+
+    Every ledger write bumps the user's ``LedgerVersion`` row first and holds
+    its lock until commit, so locking that row here keeps the month still
+    while it is read: a write that lands meanwhile commits after the new
+    statement and marks it stale again. A statement that is already fresh
+    once the lock is held, made by a concurrent request, is returned as is.
+    """
+    with db_transaction.atomic():
+        list(LedgerVersion.objects.select_for_update().filter(user=user).values_list("pk", flat=True))
+        statement = MonthlyStatement.objects.filter(user=user, month=month).first()
+        if statement is not None and not statement.stale:
+            return statement
+
+        payload, rows = build_statement(user, month)
+        # Media may be served publicly, so the names can't be guessed
+        name = f"statements/{user.pk}/{month:%Y-%m}-{secrets.token_hex(8)}"
+        csv_name = default_storage.save(f"{name}.csv", ContentFile(_csv(payload, rows).encode()))
+        html_name = default_storage.save(f"{name}.html", ContentFile(_html(user, payload, rows).encode()))
+        try:
+            fields = {"csv_file": csv_name, "html_file": html_name, "payload": payload, "stale": False, "generated_at": timezone.now()}
+            if statement is None:
+                statement = MonthlyStatement.objects.create(user=user, month=month, **fields)
+                old = []
+            else:
+                old = [statement.csv_file.name, statement.html_file.name]
+                for field, value in fields.items():
+                    setattr(statement, field, value)
+                statement.save()
+        except Exception:
+            default_storage.delete(csv_name)
+            default_storage.delete(html_name)
+            raise
+        # Only once committed, so a rollback leaves the old statement's files in place
+        db_transaction.on_commit(lambda: [default_storage.delete(name) for name in old])
+    return statement
+
+
+def has_activity(user, month):
+    """Whether ``user`` has any transaction up to the end of ``month``, live or archived"""
+    end = _next_month(month)
+    return (
+        Transaction.objects.filter(user=user, date__lt=end).exists()
+        or ArchivedTransaction.objects.filter(user=user, date__lt=end).exists()
+    )
+
+
+def load_statement(user, month):
+    """
+    ``user``'s fresh statement for the closed ``month``, generating it first if needed.
+
+    As with ``pending_statements``, only a month with activity up to its end
+    gets one kept; for an earlier month this returns None and writes nothing.
+    """
+    statement = MonthlyStatement.objects.filter(user=user, month=month, stale=False).first()
+    if statement is None and has_activity(user, month):
+        statement = generate_statement(user, month)
+    return statement
+
+
+def statement_payload(user, month):
+    """The closed ``month``'s statement payload, built on the fly if the month has none"""
+    statement = load_statement(user, month)
+    return statement.payload if statement is not None else build_statement(user, month)[0]
+
+
+def render_statement(user, month, kind):
+    """The closed ``month``'s statement as CSV or HTML text, without keeping it"""
+    payload, rows = build_statement(user, month)
+    return _csv(payload, rows) if kind == "csv" else _html(user, payload, rows)
+
+
+def pending_statements(month):
+    """
+    ``(user_id, month)`` of every statement to generate: ``month``'s missing ones and all stale ones.
+
+    A user needs a statement for ``month`` once they have any transaction up
+    to its end, live or archived (``has_activity`` for one user).
+    """
+    end = _next_month(month)
+    active = set(Transaction.objects.filter(date__lt=end).values_list("user_id", flat=True).distinct())
+    active |= set(ArchivedTransaction.objects.filter(date__lt=end).values_list("user_id", flat=True).distinct())
+    active -= set(MonthlyStatement.objects.filter(month=month).values_list("user_id", flat=True))
+    stale = MonthlyStatement.objects.filter(stale=True).values_list("user_id", "month")
+    return sorted({*((user_id, month) for user_id in active), *stale})
+
+
+def generate_user_statement(user_id, month):
+    """Generate one user's statement for ``month``. Runs inside worker processes."""
+    from accounts.models import User
+
+    generate_statement(User.objects.get(pk=user_id), month)
@@ -0,0 +1,427 @@
+"""
+Per-user summary computations shared by the dashboard views and the
+background summary worker.
+
+Every function here returns plain JSON-friendly values (floats, lists and
+dicts) so the result can be rendered directly or stored as a snapshot.
+Archived months are read from their ``MonthlySummary`` rows, which share
+the fields these aggregates use; only day-by-day series read archived
+transactions.
+"""
+from datetime import date, timedelta
+from calendar import month_name
+import calendar
+import math
+
+from django.db.models import Q, Sum
+from django.db.models.functions import TruncMonth
+
+from ledger.archive import archived_before
+from ledger.balances import wallets_with_balances
+from ledger.budgets import budgets_for_month
+from ledger.recurring import scheduled_totals
+from ledger.models import ArchivedTransaction, MonthlySummary, Transaction
+
+
+def _total(qs):
+    return float(qs.aggregate(total=Sum("amount"))["total"] or 0)
+
+
+def _category_totals(qs, transaction_type):
+    return [
+        {"category": item["category__name"], "total": float(item["total"])}
+        for item in qs.filter(transaction_type=transaction_type)
+        .values("category__name").annotate(total=Sum("amount")).order_by("-total")
+    ]
+
+
+def _count(qs):
+    if qs.model is MonthlySummary:
+        return qs.aggregate(count=Sum("count"))["count"] or 0
+    return qs.count()
+
+
+def _month_rows(user, year, month, before):
+    """One month's rows to total: its summaries if it is archived, otherwise its transactions"""
+    if before is not None and date(year, month, 1) < before:
+        return MonthlySummary.objects.filter(user=user, month=date(year, month, 1))
+    return Transaction.objects.filter(user=user, date__year=year, date__month=month)
+
+
+def _wallet_summary(user):
+    return [
+        {"name": wallet.name, "kind": wallet.kind, "balance": float(wallet.balance)}
+        for wallet in wallets_with_balances(user)
+    ]
+
+
+def spending_warning(today_expense, avg_daily_spend, survive, days_until_broke, broke_date, health_score=None):
+    """Pick the single warning banner shown on top of the dashboard pages."""
+    if today_expense > avg_daily_spend * 1.5 and avg_daily_spend > 0:
+        return f"⚠️ Warning: You spent ₹{today_expense:.0f} today, which is {((today_expense/avg_daily_spend - 1) * 100):.0f}% more than your daily average of ₹{avg_daily_spend:.0f}"
+    if not survive:
+        if broke_date:
+            return f"🚨 At current spending rate, your money may run out in {days_until_broke} days (by {broke_date.strftime('%d %b, %Y')})"
+        if days_until_broke:
+            return f"⚠️ Warning: Money will run out in {days_until_broke} days at current spending rate"
+        return "🚨 Critical: Insufficient funds for the month"
+    if health_score is not None:
+        if health_score < 50:
+            return "🚨 Financial health is at risk - review your spending immediately"
+        if health_score < 70:
+            return "⚠️ Caution: Your spending patterns need attention"
+    return ""
+
+
+def compute_survival(user, today=None):
+    today = today or date.today()
+    days_in_month = calendar.monthrange(today.year, today.month)[1]
+    days_passed = max(1, today.day)
+    days_left = days_in_month - today.day
+
+    # Get current month transactions
+    qs = Transaction.objects.filter(user=user, date__year=today.year, date__month=today.month)
+
+    # Monthly totals
+    income_mtd = _total(qs.filter(transaction_type="INCOME"))
+    expense_mtd = _total(qs.filter(transaction_type="EXPENSE", date__lte=today))
+    net_mtd = income_mtd - expense_mtd
+
+    # Current balances (cumulative from ALL transactions - carries forward from previous months)
+    all_transactions = Transaction.objects.filter(user=user)
+    wallets = _wallet_summary(user)
+
+    # Bills and salary still to come this month, counted per rule rather than per date
+    scheduled_income, scheduled_expense, scheduled = scheduled_totals(user, today.replace(day=days_in_month))
+    scheduled_income, scheduled_expense = float(scheduled_income), float(scheduled_expense)
+
+    # Survival calculations; saved scheduled expenses are not extrapolated day by day
+    avg_daily_spend = expense_mtd / days_passed if days_passed > 0 else 0
+    routine_expense_mtd = expense_mtd - _total(qs.filter(transaction_type="EXPENSE", date__lte=today, recurring_rule__isnull=False))
+    routine_daily_spend = routine_expense_mtd / days_passed if days_passed > 0 else 0
+    projected_remaining_spend = routine_daily_spend * days_left + scheduled_expense
+    available_funds = sum(wallet["balance"] for wallet in wallets)
+    projected_end_balance = available_funds + scheduled_income - projected_remaining_spend
+    survive = projected_end_balance >= 0
+
+    # Today's spending
+    today_expense = _total(qs.filter(transaction_type="EXPENSE", date=today))
+
+    # Weekly spending analysis
+    week_start = today - timedelta(days=today.weekday())
+    week_expenses = []
+    for i in range(7):
+        day = week_start + timedelta(days=i)
+        if day.month == today.month:
+            week_expenses.append({
+                'day': day.strftime('%a'),
+                'date': day.isoformat(),
+                'amount': _total(qs.filter(transaction_type="EXPENSE", date=day)),
+                'is_today': day == today
+            })
+
+    week_total = sum(d['amount'] for d in week_expenses)
+
+    # Health score calculation
+    health_score = 100
+    if expense_mtd > income_mtd:
+        health_score -= 20
+    if projected_end_balance < 0:
+        health_score -= 30
+    if avg_daily_spend > 0 and today_expense > avg_daily_spend * 1.5:
+        health_score -= 15
+
+    # Health status
+    if health_score >= 80:
+        health_status = "Healthy ✅"
+        health_color = "#2ecc71"
+    elif health_score >= 50:
+        health_status = "Caution ⚠️"
+        health_color = "#f39c12"
+    else:
+        health_status = "Risk 🚨"
+        health_color = "#e74c3c"
+
+    # Days until out of money with production-grade calculation
+    days_until_broke = None
+    broke_date = None
+    funds_after_scheduled = available_funds + scheduled_income - scheduled_expense
+    if not survive and routine_daily_spend > 0 and funds_after_scheduled > 0:
+        days_until_broke = math.ceil(funds_after_scheduled / routine_daily_spend)
+        if days_until_broke < 365:
+            broke_date = today + timedelta(days=days_until_broke)
+
+    warning_message = spending_warning(today_expense, avg_daily_spend, survive, days_until_broke, broke_date, health_score)
+
+    # AI Insights generation
+    insights = []
+
+    # Compare with last month
+    last_month = today.replace(day=1) - timedelta(days=1)
+    last_month_transactions = all_transactions.filter(date__year=last_month.year, date__month=last_month.month)
+    last_month_expense = _total(last_month_transactions.filter(transaction_type="EXPENSE"))
+
+    if last_month_expense > 0:
+        expense_change = ((expense_mtd - last_month_expense) / last_month_expense) * 100
+        if expense_change > 25:
+            insights.append(f"📈 You're spending {expense_change:.0f}% more than last month")
+        elif expense_change < -15:
+            insights.append(f"📉 Great! You've reduced spending by {abs(expense_change):.0f}% from last month")
+
+    # Category insights
+    current_categories = qs.filter(transaction_type="EXPENSE").values("category__name").annotate(total=Sum("amount")).order_by("-total")
+    last_month_categories = last_month_transactions.filter(transaction_type="EXPENSE").values("category__name").annotate(total=Sum("amount"))
+
+    # Convert to dict for easy lookup
+    last_month_dict = {item['category__name']: float(item['total']) for item in last_month_categories}
+
+    for category in current_categories[:3]:  # Top 3 categories
+        current_amount = float(category['total'])
+        last_amount = last_month_dict.get(category['category__name'], 0)
+
+        if last_amount > 0:
+            change = ((current_amount - last_amount) / last_amount) * 100
+            if change > 30:
+                insights.append(f"🔥 {category['category__name']} expense spike detected (+{change:.0f}%)")
+
+    # Savings insight
+    last_month_income = _total(last_month_transactions.filter(transaction_type="INCOME"))
+    current_savings = income_mtd - expense_mtd
+    last_month_savings = last_month_income - last_month_expense
+
+    if current_savings > last_month_savings + 1000:
+        savings_diff = current_savings - last_month_savings
+        insights.append(f"💰 This month you saved ₹{savings_diff:.0f} more than last month")
+
+    # High spending day insight
+    daily_expenses = qs.filter(transaction_type="EXPENSE", date__lte=today).values("date").annotate(total=Sum("amount")).order_by("-total")
+    if daily_expenses:
+        highest_day = daily_expenses[0]
+        if float(highest_day['total']) > avg_daily_spend * 2:
+            insights.append(f"📅 Your highest spending day was {highest_day['date'].strftime('%b %d')} (₹{highest_day['total']:.0f})")
+
+    # Cashflow forecast
+    if survive:
+        insights.append(f"✅ At current pace, you'll end the month with ₹{projected_end_balance:.0f}")
+
+    # Limit to 3 most relevant insights
+    insights = insights[:3]
+
+    return {
+        "income_mtd": income_mtd,
+        "expense_mtd": expense_mtd,
+        "net_mtd": net_mtd,
+        "wallets": wallets,
+        "available_funds": available_funds,
+        "avg_daily_spend": avg_daily_spend,
+        "routine_daily_spend": routine_daily_spend,
+        "projected_remaining_spend": projected_remaining_spend,
+        "scheduled_income": scheduled_income,
+        "scheduled_expense": scheduled_expense,
+        "scheduled": scheduled,
+        "projected_end_balance": projected_end_balance,
+        "survive": survive,
+        "days_left": days_left,
+        "days_until_broke": days_until_broke,
+        "broke_date": broke_date.isoformat() if broke_date else None,
+        "health_score": health_score,
+        "health_status": health_status,
+        "health_color": health_color,
+        "days_passed": days_passed,
+        "days_in_month": days_in_month,
+        "warning_message": warning_message,
+        "insights": insights,
+        "today_expense": today_expense,
+        "week_expenses": week_expenses,
+        "week_total": week_total,
+    }
+
+
+def compute_month_summary(user, year, month):
+    """
+    One month's totals, category breakdown and budgets: the part of the
+    analytics page that depends on the selected month, and all that a
+    closed month's statement keeps.
+    """
+    month_transactions = _month_rows(user, year, month, archived_before(user))
+
+    month_income = _total(month_transactions.filter(transaction_type="INCOME"))
+    month_expense = _total(month_transactions.filter(transaction_type="EXPENSE"))
+
+    # Budget vs actual, read from the running per-category totals
+    budgets = [
+        {"category": budget.category.name, "amount": float(budget.amount), "spent": float(budget.spent)}
+        for budget in budgets_for_month(user, date(year, month, 1))
+    ]
+    return {
+        "month_income": month_income,
+        "month_expense": month_expense,
+        "month_balance": month_income - month_expense,
+        "month_transaction_count": _count(month_transactions),
+        "category_expense": _category_totals(month_transactions, "EXPENSE"),
+        "category_income": _category_totals(month_transactions, "INCOME"),
+        "budgets": budgets,
+    }
+
+
+def compute_overview(user, today=None):
+    """The all-time totals and this month's warning shown above any month's analytics"""
+    today = today or date.today()
+    transactions = Transaction.objects.filter(user=user)
+    archived = MonthlySummary.objects.filter(user=user)
+
+    # Overall totals, live and archived
+    total_income = _total(transactions.filter(transaction_type="INCOME")) + _total(archived.filter(transaction_type="INCOME"))
+    total_expense = _total(transactions.filter(transaction_type="EXPENSE")) + _total(archived.filter(transaction_type="EXPENSE"))
+    balance = total_income - total_expense
+    total_transactions = transactions.count() + _count(archived)
+
+    # Survival warning for analytics
+    days_in_current_month = calendar.monthrange(today.year, today.month)[1]
+    days_passed = max(1, today.day)
+    days_left = days_in_current_month - today.day
+
+    available_funds = sum(wallet["balance"] for wallet in _wallet_summary(user))
+
+    current_month_expense = _total(transactions.filter(date__year=today.year, date__month=today.month, transaction_type="EXPENSE", date__lte=today))
+    avg_daily_spend = current_month_expense / days_passed if days_passed > 0 else 0
+    projected_end_balance = available_funds - (avg_daily_spend * days_left)
+    survive = projected_end_balance >= 0
+
+    # Today's spending
+    today_expense = _total(transactions.filter(transaction_type="EXPENSE", date=today))
+
+    days_until_broke = None
+    broke_date = None
+    if not survive and avg_daily_spend > 0:
+        days_until_broke = math.ceil(available_funds / avg_daily_spend)
+        if days_until_broke < 365:
+            broke_date = today + timedelta(days=days_until_broke)
+
+    return {
+        "total_income": total_income,
+        "total_expense": total_expense,
+        "balance": balance,
+        "total_transactions": total_transactions,
+        "warning_message": spending_warning(today_expense, avg_daily_spend, survive, days_until_broke, broke_date),
+    }
+
+
+def compute_analytics(user, year, month, today=None):
+    return {**compute_overview(user, today), **compute_month_summary(user, year, month)}
+
+
+# Switches have always been drawn on the expense side of the trend charts
+NOT_INCOME = ~Q(transaction_type="INCOME")
+
+
+def compute_month_chart(user, year, month):
+    """
+    The analytics chart series of one month: its daily trend and category
+    breakdowns. An archived month's daily series reads its archived transactions.
+    """
+    month_transactions = _month_rows(user, year, month, archived_before(user))
+
+    days_in_month = calendar.monthrange(year, month)[1]
+    daily_income = [0] * days_in_month
+    daily_expense = [0] * days_in_month
+    table = Transaction if month_transactions.model is Transaction else ArchivedTransaction
+    daily = table.objects.filter(user=user, date__year=year, date__month=month).values("date").annotate(
+        income=Sum("amount", filter=Q(transaction_type="INCOME")),
+        expense=Sum("amount", filter=NOT_INCOME),
+    ).order_by()
+    for item in daily:
+        daily_income[item["date"].day - 1] = float(item["income"] or 0)
+        daily_expense[item["date"].day - 1] = float(item["expense"] or 0)
+
+    return {
+        "daily_labels": [str(i) for i in range(1, days_in_month + 1)],
+        "daily_income": daily_income,
+        "daily_expense": daily_expense,
+        "category_expense": _category_totals(month_transactions, "EXPENSE"),
+        "category_income": _category_totals(month_transactions, "INCOME"),
+    }
+
+
+def compute_yearly_trend(user, year):
+    """The monthly trend chart of ``year``, live and archived months alike"""
+    before = archived_before(user)
+    transactions = Transaction.objects.filter(user=user)
+
+    yearly_income = [0] * 12
+    yearly_expense = [0] * 12
+    yearly = transactions.filter(date__year=year)\
+        .annotate(month=TruncMonth("date"))\
+        .values("month")\
+        .annotate(
+            income=Sum("amount", filter=Q(transaction_type="INCOME")),
+            expense=Sum("amount", filter=NOT_INCOME),
+        )\
+        .order_by()
+    archived_months = MonthlySummary.objects.filter(user=user, month__year=year)\
+        .values("month")\
+        .annotate(
+            income=Sum("amount", filter=Q(transaction_type="INCOME")),
+            expense=Sum("amount", filter=NOT_INCOME),
+        )\
+        .order_by()
+    for item in [*yearly, *(archived_months if before is not None and before.year >= year else [])]:
+        yearly_income[item["month"].month - 1] += float(item["income"] or 0)
+        yearly_expense[item["month"].month - 1] += float(item["expense"] or 0)
+
+    return {
+        "month_labels": [month_name[i] for i in range(1, 13)],
+        "yearly_income": yearly_income,
+        "yearly_expense": yearly_expense,
+    }
+
+
+def compute_chart_data(user, year, month):
+    """
+    Series for the analytics charts of one month: daily and monthly trends
+    plus the category breakdowns, each from a single grouped query.
+    """
+    return {**compute_month_chart(user, year, month), **compute_yearly_trend(user, year)}
+
+
+HEATMAP_DAYS = 365
+
+
+def compute_heatmap(user, end, days=HEATMAP_DAYS):
+    """
+    Per-day expense and income for the ``days`` days ending on ``end``.
+
+    Served from one grouped query over the (user, date) index; the result is
+    two parallel arrays indexed by day offset from ``start``, with zero for
+    days that have no transactions. Days in the archived period, if any,
+    come from a second query over the archive.
+    """
+    start = end - timedelta(days=days - 1)
+    expense = [0] * days
+    income = [0] * days
+
+    tables = [Transaction.objects.filter(user=user)]
+    before = archived_before(user)
+    if before is not None and start < before:
+        tables.append(ArchivedTransaction.objects.filter(user=user))
+
+    for table in tables:
+        rows = table.filter(date__range=(start, end))\
+            .values("date")\
+            .annotate(
+                expense=Sum("amount", filter=Q(transaction_type="EXPENSE")),
+                income=Sum("amount", filter=Q(transaction_type="INCOME")),
+            )\
+            .order_by()
+
+        for row in rows:
+            index = (row["date"] - start).days
+            expense[index] += float(row["expense"] or 0)
+            income[index] += float(row["income"] or 0)
+
+    return {
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "expense": expense,
+        "income": income,
+    }
@@ -1,3 +1,489 @@
-from django.test import TestCase
+import csv
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import Future
+from datetime import date, timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from accounts.models import Household, User
+from ledger.archive import archive_cutoff, archive_user
+from ledger.models import Budget, Category, RecurringRule, Transaction
+from ledger.recurring import first_occurrence
+from ledger.tests import THREADS, run_together
+
+from . import jobs, statements, views
+from .management.commands import run_summary_worker
+from .models import MonthlyStatement, SummaryJob, SummarySnapshot
+from .singleflight import single_flight
+from .summaries import HEATMAP_DAYS, compute_analytics, compute_survival
+
+
+def slow_counter(value, seconds=0.3):
+    """A compute function that takes ``seconds`` and counts how often it ran"""
+    calls = []
+
+    def compute():
+        calls.append(threading.get_ident())
+        time.sleep(seconds)
+        return value
+    return compute, calls
+
+
+class SingleFlightTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_concurrent_callers_share_one_computation(self):
+        compute, calls = slow_counter({"total": 1})
+        results = run_together(*[lambda: single_flight("flight-test", compute, 60)] * THREADS)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{"total": 1}] * THREADS)
+
+    def test_waits_for_a_computation_held_by_another_process(self):
+        # Another process took the cache lock and publishes its result later
+        cache.add("flight-test:flight", "other-process", 30)
+        threading.Timer(0.2, lambda: cache.set("flight-test", "theirs", 60)).start()
+        compute, calls = slow_counter("ours")
+
+        self.assertEqual(single_flight("flight-test", compute, 60), "theirs")
+        self.assertEqual(calls, [])
+
+    def test_uncacheable_results_are_computed_by_each_caller(self):
+        compute, calls = slow_counter(None, seconds=0.05)
+        run_together(*[lambda: single_flight("flight-test", compute, 60)] * 3)
+
+        self.assertEqual(len(calls), 3)
+        self.assertIsNone(cache.get("flight-test"))
+
+
+class CoalescedSummaryTests(TransactionTestCase):
+    # Keep the default categories that a migration created
+    serialized_rollback = True
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="alice", password="secret-pass-123")
+
+    def test_concurrent_requests_compute_the_summary_once(self):
+        real_compute = views.compute_survival
+        calls = []
+
+        def compute_survival(user, today):
+            calls.append(user.pk)
+            time.sleep(0.3)
+            return real_compute(user, today)
+
+        # Each client is a separate device, with its own CSRF cookie and so its own page cache entry
+        clients = []
+        for index in range(THREADS):
+            client = Client()
+            client.force_login(self.user)
+            client.cookies["csrftoken"] = f"device-{index}".ljust(32, "x")
+            clients.append(client)
+
+        with mock.patch.object(views, "compute_survival", compute_survival):
+            results = run_together(*(lambda client=client: client.get("/survival/") for client in clients))
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual([response.status_code for response in results], [200] * THREADS)
+
+
+class InlinePool:
+    """Stands in for the worker's process pool and runs each job in this process"""
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def submit(self, function, *args):
+        future = Future()
+        try:
+            future.set_result(function(*args))
+        except Exception as error:
+            future.set_exception(error)
+        return future
+
+
+@override_settings(PRECOMPUTE_SUMMARIES=True)
+class SummaryQueueTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice = User.objects.create_user(username="alice", password="secret-pass-123")
+        self.bob = User.objects.create_user(username="bob", password="secret-pass-123")
+
+    def run_worker(self):
+        with mock.patch.object(run_summary_worker, "ProcessPoolExecutor", InlinePool):
+            call_command("run_summary_worker", "--once", stdout=StringIO(), stderr=StringIO())
+
+    def test_jobs_are_claimed_once_and_finished(self):
+        jobs.enqueue_summary_refresh(self.alice)
+        jobs.enqueue_summary_refresh(self.bob)
+
+        first = jobs.claim_jobs(1)
+        self.assertEqual([(job.user, job.status, job.attempts) for job in first], [(self.alice, "RUNNING", 1)])
+        self.assertEqual([job.user for job in jobs.claim_jobs(5)], [self.bob])
+        self.assertEqual(jobs.claim_jobs(5), [])
+
+        # A write while the job runs puts it back in the queue, and finishing leaves it there
+        jobs.enqueue_summary_refresh(self.alice)
+        jobs.finish_job(first[0])
+        jobs.finish_job(SummaryJob.objects.get(user=self.bob), error="Traceback")
+        self.assertEqual(
+            dict(SummaryJob.objects.values_list("user__username", "status")), {"alice": "PENDING", "bob": "FAILED"},
+        )
+        self.assertEqual(SummaryJob.objects.get(user=self.bob).last_error, "Traceback")
+
+    def test_jobs_left_running_too_long_are_requeued(self):
+        jobs.enqueue_users([self.alice.pk, self.bob.pk])
+        jobs.claim_jobs(5)
+        SummaryJob.objects.filter(user=self.alice).update(started_at=timezone.now() - timedelta(minutes=20))
+
+        self.assertEqual(jobs.requeue_stale_jobs(600), 1)
+        self.assertEqual(
+            dict(SummaryJob.objects.values_list("user__username", "status")), {"alice": "PENDING", "bob": "RUNNING"},
+        )
+        self.assertEqual([job.attempts for job in jobs.claim_jobs(5)], [2])
+
+    def test_worker_saves_snapshots_and_records_failures(self):
+        jobs.enqueue_summary_refresh(self.alice)
+        self.run_worker()
+
+        self.assertEqual(SummaryJob.objects.get(user=self.alice).status, "DONE")
+        self.assertEqual(
+            set(SummarySnapshot.objects.filter(user=self.alice).values_list("kind", "as_of")),
+            {("SURVIVAL", date.today()), ("ANALYTICS", date.today())},
+        )
+
+        jobs.enqueue_summary_refresh(self.bob)
+        with mock.patch.object(run_summary_worker, "refresh_summaries", side_effect=RuntimeError("boom")):
+            self.run_worker()
+        job = SummaryJob.objects.get(user=self.bob)
+        self.assertEqual(job.status, "FAILED")
+        self.assertIn("boom", job.last_error)
+
+    def test_sweep_enqueues_every_active_user(self):
+        jobs.enqueue_summary_refresh(self.alice)
+        jobs.finish_job(jobs.claim_jobs(1)[0])
+        User.objects.create_user(username="carol", password="secret-pass-123", is_active=False)
+
+        call_command("sweep_summaries", "--chunk-size", "1", stdout=StringIO())
+
+        self.assertEqual(
+            dict(SummaryJob.objects.values_list("user__username", "status")), {"alice": "PENDING", "bob": "PENDING"},
+        )
+
+    def test_load_summary_serves_the_precomputed_snapshot(self):
+        today = date.today()
+        jobs.save_snapshot(self.alice.pk, "SURVIVAL", today, {"balance": 1.0})
+        jobs.enqueue_summary_refresh(self.alice)
+
+        summary, computed_at, refresh_pending = jobs.load_summary(
+            self.alice, "SURVIVAL", today, mock.Mock(side_effect=AssertionError),
+        )
+
+        self.assertEqual(summary, {"balance": 1.0})
+        self.assertEqual(computed_at, SummarySnapshot.objects.get(user=self.alice).computed_at)
+        self.assertTrue(refresh_pending)
+
+    def test_load_summary_computes_a_missing_snapshot_inline(self):
+        today = date.today()
+        # Yesterday's snapshot isn't served
+        jobs.save_snapshot(self.alice.pk, "SURVIVAL", today - timedelta(days=1), {"balance": 1.0})
+        compute = mock.Mock(return_value={"balance": 2.0})
+
+        summary, _, refresh_pending = jobs.load_summary(self.alice, "SURVIVAL", today, compute)
+
+        self.assertEqual((summary, refresh_pending), ({"balance": 2.0}, False))
+        compute.assert_called_once_with()
+        self.assertEqual(jobs.get_snapshot(self.alice, "SURVIVAL", today).payload, {"balance": 2.0})
+
+
+class ScheduledSurvivalTests(TestCase):
+    def test_projection_includes_the_rest_of_the_months_rules(self):
+        user = User.objects.create_user(username="alice", password="secret-pass-123")
+        cash = user.wallets.order_by("id").first()
+        categories = {category.name: category for category in Category.objects.filter(user__isnull=True)}
+        today = date(2026, 3, 10)
+        Transaction.objects.create(
+            user=user, transaction_type="INCOME", wallet=cash, amount=Decimal("5000"),
+            category=categories["Salary"], date=today.replace(day=1),
+        )
+        for transaction_type, amount, category, start, frequency in [
+            ("EXPENSE", "100", "Food", date(2026, 3, 11), "WEEKLY"),
+            ("INCOME", "700", "Salary", date(2026, 3, 25), "MONTHLY"),
+            ("EXPENSE", "9999", "Food", date(2026, 4, 1), "MONTHLY"),
+        ]:
+            rule = RecurringRule(
+                user=user, transaction_type=transaction_type, wallet=cash, amount=Decimal(amount),
+                category=categories[category], start_date=start, frequency=frequency,
+            )
+            rule.next_date = first_occurrence(rule)
+            rule.save()
+
+        summary = compute_survival(user, today)
+
+        # 11, 18 and 25 March, the salary on the 25th, and nothing from April's rule
+        self.assertEqual((summary["scheduled_income"], summary["scheduled_expense"]), (700.0, 300.0))
+        self.assertEqual(summary["projected_end_balance"], 5400.0)
+        self.assertEqual([entry["count"] for entry in summary["scheduled"]], [3, 1])
+
+    def test_analytics_warns_when_the_month_runs_out(self):
+        user = User.objects.create_user(username="bob", password="secret-pass-123")
+        cash = user.wallets.order_by("id").first()
+        categories = {category.name: category for category in Category.objects.filter(user__isnull=True)}
+        today = date(2026, 3, 10)
+        Transaction.objects.create(
+            user=user, transaction_type="INCOME", wallet=cash, amount=Decimal("1000"),
+            category=categories["Salary"], date=today.replace(day=1),
+        )
+        Transaction.objects.create(
+            user=user, transaction_type="EXPENSE", wallet=cash, amount=Decimal("900"),
+            category=categories["Food"], date=today.replace(day=2),
+        )
+
+        summary = compute_analytics(user, 2026, 3, today)
+
+        # 90 a day against 100 left: broke in two days
+        self.assertIn("run out in 2 days (by 12 Mar, 2026)", summary["warning_message"])
+
+
+class HeatmapTests(TestCase):
+    def test_days_sum_live_and_archived_rows_inside_the_window(self):
+        categories = {category.name: category for category in Category.objects.filter(user__isnull=True)}
+        user = User.objects.create_user(username="alice", password="secret-pass-123")
+        cash, upi = user.wallets.order_by("id")
+        end = archive_cutoff(date.today(), 0) - timedelta(days=1)
+        start = end - timedelta(days=HEATMAP_DAYS - 1)
+        for day, kind, amount, category in [
+            (start - timedelta(days=1), "INCOME", "5000", "Salary"),
+            (start, "EXPENSE", "10", "Food"),
+            (start + timedelta(days=40), "INCOME", "300", "Salary"),
+            (start + timedelta(days=40), "EXPENSE", "25.50", "Food"),
+            (end, "EXPENSE", "7", "Snacks"),
+            (end, "EXPENSE", "3", "Food"),
+            (end + timedelta(days=1), "EXPENSE", "99", "Food"),
+        ]:
+            Transaction.objects.create(
+                user=user, transaction_type=kind, wallet=cash, amount=Decimal(amount),
+                category=categories[category], date=day,
+            )
+        Transaction.objects.create(
+            user=user, transaction_type="SWITCH", wallet=cash, to_wallet=upi, amount=Decimal("100"),
+            category=categories[Category.TRANSFER], date=end,
+        )
+        # The first few months now come from the archive
+        archive_user(user, archive_cutoff(date.today(), 3))
+
+        client = Client()
+        client.force_login(user)
+        data = client.get("/heatmap/data/", {"end": end.isoformat()}).json()
+
+        self.assertEqual((data["start"], data["end"]), (start.isoformat(), end.isoformat()))
+        self.assertEqual(len(data["expense"]), HEATMAP_DAYS)
+        self.assertEqual({day: amount for day, amount in enumerate(data["expense"]) if amount}, {0: 10.0, 40: 25.5, HEATMAP_DAYS - 1: 10.0})
+        self.assertEqual({day: amount for day, amount in enumerate(data["income"]) if amount}, {40: 300.0})
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.food = Category.objects.get(user__isnull=True, name="Food")
+        self.user = User.objects.create_user(username="alice", password="secret-pass-123")
+        self.cash = self.user.wallets.order_by("id").first()
+        self.client.force_login(self.user)
+        self.client.cookies["csrftoken"] = "browser".ljust(32, "x")
+
+    def write(self):
+        Transaction.objects.create(
+            user=self.user, transaction_type="INCOME", wallet=self.cash, amount=Decimal("10"),
+            category=self.food, date=date.today(),
+        )
+
+    def test_chart_data_answers_304_until_a_write(self):
+        first = self.client.get("/analytics/data/")
+        etag = first["ETag"]
+
+        # The session, the user and the ledger version; none of the aggregates
+        with self.assertNumQueries(3):
+            self.assertEqual(self.client.get("/analytics/data/", HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        # Another month is another resource
+        next_year = {"month": date.today().month, "year": date.today().year + 1}
+        self.assertNotEqual(self.client.get("/analytics/data/", next_year)["ETag"], etag)
+
+        self.write()
+        after = self.client.get("/analytics/data/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(after.status_code, 200)
+        self.assertNotEqual(after["ETag"], etag)
+        self.assertEqual(sum(after.json()["daily_income"]), 10.0)
+
+    def test_pages_answer_304_and_are_served_from_the_cache_until_a_write(self):
+        first = self.client.get("/")
+        etag = first["ETag"]
+        self.assertIn("private", first["Cache-Control"])
+
+        self.assertEqual(self.client.get("/", HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        # The session, the user and the ledger version; the page comes from the cache
+        with self.assertNumQueries(3):
+            self.assertEqual(self.client.get("/").content, first.content)
+
+        self.write()
+        after = self.client.get("/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(after.status_code, 200)
+        self.assertNotEqual(after["ETag"], etag)
+        self.assertNotEqual(after.content, first.content)
+
+    def test_browsers_without_a_csrf_cookie_get_a_fresh_page_that_sets_one(self):
+        # The page has a form once there are transactions
+        self.write()
+        self.client.get("/")
+
+        for _ in range(2):
+            client = Client(enforce_csrf_checks=True)
+            client.force_login(self.user)
+            response = client.get("/")
+            self.assertIn("csrftoken", response.cookies)
+            self.assertNotIn("ETag", response)
+            # The page's form posts with the cookie it was just given
+            token = re.search(r'name="csrfmiddlewaretoken" value="(\w+)"', response.content.decode())[1]
+            self.assertEqual(client.post("/ledger/bulk/", {"csrfmiddlewaretoken": token}).status_code, 302)
+
+
+class HouseholdTests(TestCase):
+    def test_totals_add_up_members_live_and_archived_months(self):
+        categories = {category.name: category for category in Category.objects.filter(user__isnull=True)}
+        owner = User.objects.create_user(username="alice", password="secret-pass-123")
+        partner = User.objects.create_user(username="bob", password="secret-pass-123")
+        outsider = User.objects.create_user(username="carol", password="secret-pass-123")
+        for user, amount in [(owner, "300"), (partner, "200"), (outsider, "999")]:
+            cash = user.wallets.order_by("id").first()
+            Transaction.objects.create(
+                user=user, transaction_type="INCOME", wallet=cash, amount=Decimal("1000"),
+                category=categories["Salary"], date=date(2026, 1, 1),
+            )
+            Transaction.objects.create(
+                user=user, transaction_type="EXPENSE", wallet=cash, amount=Decimal(amount),
+                category=categories["Food"], date=date(2026, 1, 5),
+            )
+        archive_user(partner, date(2026, 2, 1))
+
+        client = Client()
+        client.force_login(owner)
+        client.post("/accounts/household/", {"action": "create", "name": "Home"})
+        client.force_login(partner)
+        code = Household.objects.get().invite_code
+        client.post("/accounts/household/", {"action": "join", "invite_code": code})
+
+        response = client.get("/household/", {"month": 1, "year": 2026})
+        self.assertEqual((response.context["income"], response.context["expense"]), (2000.0, 500.0))
+        self.assertEqual(response.context["balance"], 1500.0)
+        self.assertEqual([row["expense"] for row in response.context["members"]], [300.0, 200.0])
+        self.assertEqual(response.context["expense_categories"][0]["by_member"], [300.0, 200.0])
+        daily = client.get("/household/data/", {"month": 1, "year": 2026}).json()
+        self.assertEqual([member["expense"][4] for member in daily["members"]], [300.0, 200.0])
+
+        # Someone outside the household is sent to create or join one
+        client.force_login(outsider)
+        self.assertRedirects(client.get("/household/"), "/accounts/household/")
+
+
+class StatementTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        media = override_settings(MEDIA_ROOT=self.media)
+        media.enable()
+        self.addCleanup(media.disable)
+
+        self.categories = {category.name: category for category in Category.objects.filter(user__isnull=True)}
+        self.user = User.objects.create_user(username="alice", password="secret-pass-123")
+        self.cash, self.upi = self.user.wallets.order_by("id")
+        self.last_month = archive_cutoff(date.today(), 1)
+        self.earlier = archive_cutoff(date.today(), 2)
+        self.add("INCOME", "1000", "Salary", self.earlier.replace(day=3))
+        self.add("EXPENSE", "200", "Food", self.last_month.replace(day=5))
+        self.add("SWITCH", "50", "Money Transfer", self.last_month.replace(day=6), to_wallet=self.upi)
+        self.client.force_login(self.user)
+
+    def add(self, transaction_type, amount, category, day, **fields):
+        return Transaction.objects.create(
+            user=self.user, transaction_type=transaction_type, wallet=self.cash, amount=Decimal(amount),
+            category=self.categories[category], date=day, **fields,
+        )
+
+    def statement_csv(self, month):
+        response = self.client.get(f"/statements/{month.year}/{month.month}/csv/")
+        return list(csv.DictReader(b"".join(response.streaming_content).decode().splitlines()))
+
+    def test_closed_months_are_served_from_their_statements(self):
+        archive_user(self.user, self.last_month)
+        page = self.client.get("/analytics/", {"month": self.last_month.month, "year": self.last_month.year})
+        self.assertEqual((page.context["month_expense"], page.context["total_income"]), (200.0, 1000.0))
+        self.assertContains(page, f"/statements/{self.last_month.year}/{self.last_month.month}/csv/")
+
+        rows = self.statement_csv(self.last_month)
+        self.assertEqual([row["type"] for row in rows], ["OPENING", "EXPENSE", "SWITCH"])
+        self.assertEqual((rows[0]["balance"], rows[-1]["balance"], rows[-1]["wallet_balance"]), ("1000.00", "800.00", "750.00"))
+        # The archived month's statement reads the archived rows
+        self.assertEqual([row["type"] for row in self.statement_csv(self.earlier)], ["OPENING", "INCOME"])
+        html = self.client.get(f"/statements/{self.last_month.year}/{self.last_month.month}/html/")
+        self.assertIn("₹800.00", b"".join(html.streaming_content).decode())
+
+        # Later reads come from the stored statement, and this month's writes leave it alone
+        self.add("EXPENSE", "100", "Food", date.today())
+        with mock.patch.object(statements, "build_statement", side_effect=AssertionError):
+            chart = self.client.get("/analytics/data/", {"month": self.last_month.month, "year": self.last_month.year}).json()
+        self.assertEqual(chart["daily_expense"][4], 200.0)
+        self.assertFalse(MonthlyStatement.objects.filter(stale=True).exists())
+        self.assertEqual(statements.pending_statements(self.last_month), [])
+        self.assertEqual(self.client.get(f"/statements/{date.today().year}/{date.today().month}/csv/").status_code, 404)
+
+    def test_back_dated_write_regenerates_that_month_and_the_ones_after(self):
+        for month in (self.earlier, self.last_month):
+            statements.load_statement(self.user, month)
+        self.add("EXPENSE", "100", "Snacks", self.earlier.replace(day=10))
+        self.assertEqual(list(MonthlyStatement.objects.filter(stale=True).values_list("month", flat=True).order_by("month")), [self.earlier, self.last_month])
+        self.assertEqual(statements.pending_statements(self.last_month), [(self.user.pk, self.earlier), (self.user.pk, self.last_month)])
+
+        page = self.client.get("/analytics/", {"month": self.earlier.month, "year": self.earlier.year})
+        self.assertEqual(page.context["month_expense"], 100.0)
+        # The later month's own figures are unchanged but it opens lower
+        self.assertEqual(self.statement_csv(self.last_month)[0]["balance"], "900.00")
+        self.assertFalse(MonthlyStatement.objects.filter(stale=True).exists())
+
+    def test_months_before_any_activity_are_built_without_being_kept(self):
+        page = self.client.get("/analytics/", {"month": 1, "year": 1990})
+        self.assertEqual(page.context["month_expense"], 0)
+        self.assertEqual(self.client.get("/analytics/data/", {"month": 1, "year": 1990}).status_code, 200)
+        rows = self.statement_csv(date(1990, 1, 1))
+        self.assertEqual([row["type"] for row in rows], ["OPENING"])
+        self.assertEqual(self.client.get("/statements/1990/1/html/").status_code, 200)
+
+        self.assertFalse(MonthlyStatement.objects.exists())
+        self.assertFalse(os.path.exists(os.path.join(self.media, "statements")))
+
+    def test_budget_changes_make_statements_stale(self):
+        statements.load_statement(self.user, self.last_month)
+        budget = Budget.objects.create(user=self.user, category=self.categories["Food"], amount=Decimal("500"))
+        self.assertTrue(MonthlyStatement.objects.get().stale)
+
+        statements.load_statement(self.user, self.last_month)
+        budget.delete()
+        self.assertTrue(MonthlyStatement.objects.get().stale)
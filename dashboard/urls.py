@@ -1,9 +1,16 @@
 from django.urls import path
 
-from .views import dashboard, analytics, survival_dashboard
+from .views import dashboard, analytics, analytics_data, survival_dashboard, heatmap, heatmap_data, household_dashboard, household_data, statement_file
 
 urlpatterns = [
     path("", dashboard, name="dashboard"),
     path("analytics/", analytics, name="analytics"),
+    path("analytics/data/", analytics_data, name="analytics_data"),
     path("survival/", survival_dashboard, name="survival"),
+    path("heatmap/", heatmap, name="heatmap"),
+    path("heatmap/data/", heatmap_data, name="heatmap_data"),
+    path("household/", household_dashboard, name="household"),
+    path("household/data/", household_data, name="household_data"),
+    path("statements/<int:year>/<int:month>/csv/", statement_file, {"kind": "csv"}, name="statement_csv"),
+    path("statements/<int:year>/<int:month>/html/", statement_file, {"kind": "html"}, name="statement_html"),
 ]
@@ -1,30 +1,47 @@
-from django.shortcuts import render
+from django.conf import settings
+from django.shortcuts import redirect, render
 from django.contrib.auth.decorators import login_required
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
-from django.db.models import Sum
+from django.db.models import Q, Sum
 from django.db.models.functions import TruncMonth
 from datetime import datetime, date, timedelta
 import calendar
 import math
 from decimal import Decimal
-from ledger.models import Transaction
+from io import BytesIO
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_GET
+from ledger.archive import archived_before, archived_totals
+from ledger.balances import attach_running_balances, wallets_with_balances
+from ledger.categories import user_categories
+from ledger.models import Category, Transaction
+from ledger.search import search_transactions
+from .caching import ledger_version, private_page_cache
+from .household import compute_household, compute_household_daily, household_members, household_version
+from .jobs import load_summary
+from .singleflight import single_flight
+from .statements import is_closed, load_statement, render_statement, statement_payload
+from .summaries import HEATMAP_DAYS, compute_analytics, compute_chart_data, compute_heatmap, compute_overview, compute_survival, compute_yearly_trend
 
 from django.template.loader import render_to_string
-from django.http import JsonResponse
+from django.http import FileResponse, Http404, JsonResponse
 
 @login_required
+@private_page_cache()
 def dashboard(request):
     start_date = request.GET.get("start_date")
     end_date = request.GET.get("end_date")
     category = request.GET.get("category")
     transaction_type = request.GET.get("transaction_type")
-    money_type = request.GET.get("money_type")
+    wallet = request.GET.get("wallet")
+    query = request.GET.get("q", "").strip()
     page = request.GET.get("page", 1)
 
-    transactions = Transaction.objects.filter(user=request.user).order_by('-date')
+    transactions = Transaction.objects.filter(user=request.user).select_related("wallet", "to_wallet", "category").order_by('-date', '-id')
 
     # Filter dates safely
     from datetime import datetime
+    start_date_obj = end_date_obj = None
     if start_date:
         try:
             start_date_obj = datetime.strptime(start_date, "%Y-%m-%d").date()
@@ -38,42 +55,44 @@ def dashboard(request):
         except ValueError:
             pass
     
-    # Filter by category
-    if category:
-        transactions = transactions.filter(category__icontains=category)
+    # Filters that archived rows and monthly summaries answer the same way
+    archive_filter = Q()
+
+    # Filter by category id, an indexed equality lookup
+    if category and category.isdigit():
+        transactions = transactions.filter(category_id=category)
+        archive_filter &= Q(category_id=category)
+
+    # Full-text search over descriptions and categories
+    if query:
+        transactions = search_transactions(transactions, query, request.user)
     
     # Filter by transaction type
     if transaction_type:
         transactions = transactions.filter(transaction_type=transaction_type)
+        archive_filter &= Q(transaction_type=transaction_type)
     
-    # Filter by money type
-    if money_type:
-        transactions = transactions.filter(money_type=money_type)
+    # Filter by wallet (either side of a switch)
+    if wallet and wallet.isdigit():
+        transactions = transactions.filter(Q(wallet_id=wallet) | Q(to_wallet_id=wallet))
+        archive_filter &= Q(wallet_id=wallet) | Q(to_wallet_id=wallet)
 
     paginator = Paginator(transactions, 10)
     transactions_page = paginator.get_page(page)
+    transactions_page.object_list = attach_running_balances(request.user, transactions_page.object_list)
 
     # Exclude SWITCH transactions from income/expense totals
     total_income = transactions.filter(transaction_type="INCOME").aggregate(total=Sum("amount"))["total"] or 0
     total_expense = transactions.filter(transaction_type="EXPENSE").aggregate(total=Sum("amount"))["total"] or 0
+    # The list shows live rows only; the totals also count the archived ones
+    archived_income, archived_expense = archived_totals(request.user, start_date_obj, end_date_obj, archive_filter, query)
+    total_income += archived_income
+    total_expense += archived_expense
     balance = total_income - total_expense
     
-    # Calculate balance by money type - FIXED LOGIC (excluding SWITCH)
+    # Balance of every wallet, in a single grouped query (SWITCH rows move money between wallets)
     all_transactions = Transaction.objects.filter(user=request.user)
-    
-    # UPI Cash balance
-    upi_income = all_transactions.filter(transaction_type="INCOME", money_type="UPI CASH").aggregate(total=Sum("amount"))["total"] or 0
-    upi_expense = all_transactions.filter(transaction_type="EXPENSE", money_type="UPI CASH").aggregate(total=Sum("amount"))["total"] or 0
-    upi_from_switch = all_transactions.filter(transaction_type="SWITCH", switch_direction="HAND_TO_UPI").aggregate(total=Sum("amount"))["total"] or 0
-    upi_to_switch = all_transactions.filter(transaction_type="SWITCH", switch_direction="UPI_TO_HAND").aggregate(total=Sum("amount"))["total"] or 0
-    upi_balance = upi_income - upi_expense + upi_from_switch - upi_to_switch
-    
-    # Hand Cash balance
-    hand_income = all_transactions.filter(transaction_type="INCOME", money_type="HAND CASH").aggregate(total=Sum("amount"))["total"] or 0
-    hand_expense = all_transactions.filter(transaction_type="EXPENSE", money_type="HAND CASH").aggregate(total=Sum("amount"))["total"] or 0
-    hand_from_switch = all_transactions.filter(transaction_type="SWITCH", switch_direction="UPI_TO_HAND").aggregate(total=Sum("amount"))["total"] or 0
-    hand_to_switch = all_transactions.filter(transaction_type="SWITCH", switch_direction="HAND_TO_UPI").aggregate(total=Sum("amount"))["total"] or 0
-    hand_balance = hand_income - hand_expense + hand_from_switch - hand_to_switch
+    wallets = wallets_with_balances(request.user)
     
     # Survival calculations for warning
     today = date.today()
@@ -85,7 +104,7 @@ def dashboard(request):
     expense_mtd = month_transactions.filter(transaction_type="EXPENSE", date__lte=today).aggregate(Sum("amount"))["amount__sum"] or 0
     avg_daily_spend = float(expense_mtd) / days_passed if days_passed > 0 else 0
     projected_remaining_spend = avg_daily_spend * days_left
-    available_funds = float(upi_balance) + float(hand_balance)
+    available_funds = float(sum(w.balance for w in wallets))
     projected_end_balance = available_funds - projected_remaining_spend
     survive = projected_end_balance >= 0
     
@@ -127,25 +146,26 @@ def dashboard(request):
     elif health_score < 70:
         warning_message = "⚠️ Caution: Your spending patterns need attention"
     
-    # Get unique categories for filter dropdown
-    categories = Transaction.objects.filter(user=request.user).values_list('category', flat=True).distinct().order_by('category')
+    # Categories for the filter and bulk-action dropdowns, from the cached per-user list
+    categories = user_categories(request.user)
 
     context = {
         "transactions": transactions_page,
         "total_income": total_income,
         "total_expense": total_expense,
         "balance": balance,
-        "upi_balance": upi_balance,
-        "hand_balance": hand_balance,
+        "wallets": wallets,
         "start_date": start_date,
         "end_date": end_date,
         "category": category,
         "transaction_type": transaction_type,
-        "money_type": money_type,
+        "wallet": wallet,
+        "query": query,
         "categories": categories,
+        "spending_categories": [c for c in categories if c.name != Category.TRANSFER],
         "transaction_types": [("INCOME", "Income"), ("EXPENSE", "Expense"), ("SWITCH", "Switch")],
-        "money_types": [("UPI CASH", "UPI Cash"), ("HAND CASH", "Hand Cash")],
         "warning_message": warning_message,
+        "archived_before": archived_before(request.user),
     }
 
     if request.headers.get('x-requested-with') == 'XMLHttpRequest':
@@ -158,82 +178,30 @@ def dashboard(request):
 
 
 @login_required
+@private_page_cache(summaries=True)
 def analytics(request):
     from datetime import datetime, timedelta
-    from django.db.models import Q
     from calendar import month_name
     
     # Get current month/year or from request
     current_date = datetime.now()
     selected_month = int(request.GET.get('month', current_date.month))
     selected_year = int(request.GET.get('year', current_date.year))
-    
-    transactions = Transaction.objects.filter(user=request.user)
-    
-    # Filter by selected month/year
-    month_transactions = transactions.filter(
-        date__year=selected_year,
-        date__month=selected_month
-    )
-    
-    # Overall totals
-    total_income = transactions.filter(transaction_type="INCOME").aggregate(Sum("amount"))["amount__sum"] or 0
-    total_expense = transactions.filter(transaction_type="EXPENSE").aggregate(Sum("amount"))["amount__sum"] or 0
-    balance = total_income - total_expense
-    total_transactions = transactions.count()
-    
-    # Current month totals
-    month_income = month_transactions.filter(transaction_type="INCOME").aggregate(Sum("amount"))["amount__sum"] or 0
-    month_expense = month_transactions.filter(transaction_type="EXPENSE").aggregate(Sum("amount"))["amount__sum"] or 0
-    month_balance = month_income - month_expense
-    month_transaction_count = month_transactions.count()
-    
-    # Category-wise expense for current month
-    category_expense = month_transactions.filter(transaction_type="EXPENSE")\
-        .values("category")\
-        .annotate(total=Sum("amount"))\
-        .order_by("-total")
-    
-    # Category-wise income for current month
-    category_income = month_transactions.filter(transaction_type="INCOME")\
-        .values("category")\
-        .annotate(total=Sum("amount"))\
-        .order_by("-total")
-    
-    # Daily data for current month - simplified approach
-    import calendar
-    days_in_month = calendar.monthrange(selected_year, selected_month)[1]
-    daily_labels = [str(i) for i in range(1, days_in_month + 1)]
-    daily_income = [0] * days_in_month
-    daily_expense = [0] * days_in_month
-    
-    # Get daily transactions and aggregate manually
-    daily_transactions = month_transactions.values('date', 'transaction_type', 'amount')
-    for transaction in daily_transactions:
-        day_index = transaction['date'].day - 1
-        if transaction['transaction_type'] == 'INCOME':
-            daily_income[day_index] += float(transaction['amount'])
-        else:
-            daily_expense[day_index] += float(transaction['amount'])
-    
-    # Monthly trend for the year
-    yearly_monthly = transactions.filter(date__year=selected_year)\
-        .annotate(month=TruncMonth("date"))\
-        .values("month", "transaction_type")\
-        .annotate(total=Sum("amount"))\
-        .order_by("month")
-    
-    # Prepare yearly monthly chart data
-    month_labels = [month_name[i] for i in range(1, 13)]
-    yearly_income = [0] * 12
-    yearly_expense = [0] * 12
-    
-    for item in yearly_monthly:
-        month_index = item["month"].month - 1
-        if item["transaction_type"] == "INCOME":
-            yearly_income[month_index] = float(item["total"])
-        else:
-            yearly_expense[month_index] = float(item["total"])
+    today = current_date.date()
+    closed = is_closed(date(selected_year, selected_month, 1), today)
+    
+    if (selected_year, selected_month) == (today.year, today.month):
+        summary, computed_at, refresh_pending = load_summary(
+            request.user, "ANALYTICS", today,
+            lambda: compute_analytics(request.user, selected_year, selected_month, today),
+            version=ledger_version(request).version,
+        )
+    elif closed:
+        # A past month is read from its statement; only the all-time cards are live
+        payload = statement_payload(request.user, date(selected_year, selected_month, 1))
+        summary, computed_at, refresh_pending = {**compute_overview(request.user, today), **payload["summary"]}, None, False
+    else:
+        summary, computed_at, refresh_pending = compute_analytics(request.user, selected_year, selected_month, today), None, False
     
     # Navigation dates
     current_month_date = datetime(selected_year, selected_month, 1)
@@ -241,61 +209,8 @@ def analytics(request):
     next_month_date = current_month_date.replace(day=28) + timedelta(days=4)
     next_month = next_month_date - timedelta(days=next_month_date.day-1)
     
-    # Survival warning for analytics
-    today = datetime.now().date()
-    days_in_month = calendar.monthrange(today.year, today.month)[1]
-    days_passed = max(1, today.day)
-    days_left = days_in_month - today.day
-    
-    all_user_transactions = Transaction.objects.filter(user=request.user)
-    upi_income = all_user_transactions.filter(transaction_type="INCOME", money_type="UPI CASH").aggregate(total=Sum("amount"))["total"] or 0
-    upi_expense = all_user_transactions.filter(transaction_type="EXPENSE", money_type="UPI CASH").aggregate(total=Sum("amount"))["total"] or 0
-    upi_from_switch = all_user_transactions.filter(transaction_type="SWITCH", switch_direction="HAND_TO_UPI").aggregate(total=Sum("amount"))["total"] or 0
-    upi_to_switch = all_user_transactions.filter(transaction_type="SWITCH", switch_direction="UPI_TO_HAND").aggregate(total=Sum("amount"))["total"] or 0
-    hand_income = all_user_transactions.filter(transaction_type="INCOME", money_type="HAND CASH").aggregate(total=Sum("amount"))["total"] or 0
-    hand_expense = all_user_transactions.filter(transaction_type="EXPENSE", money_type="HAND CASH").aggregate(total=Sum("amount"))["total"] or 0
-    hand_from_switch = all_user_transactions.filter(transaction_type="SWITCH", switch_direction="UPI_TO_HAND").aggregate(total=Sum("amount"))["total"] or 0
-    hand_to_switch = all_user_transactions.filter(transaction_type="SWITCH", switch_direction="HAND_TO_UPI").aggregate(total=Sum("amount"))["total"] or 0
-    available_funds = float((upi_income - upi_expense + upi_from_switch - upi_to_switch) + (hand_income - hand_expense + hand_from_switch - hand_to_switch))
-    
-    current_month_expense = all_user_transactions.filter(date__year=today.year, date__month=today.month, transaction_type="EXPENSE", date__lte=today).aggregate(Sum("amount"))["amount__sum"] or 0
-    avg_daily_spend = float(current_month_expense) / days_passed if days_passed > 0 else 0
-    projected_end_balance = available_funds - (avg_daily_spend * days_left)
-    survive = projected_end_balance >= 0
-    
-    # Today's spending
-    today_expense = all_user_transactions.filter(transaction_type="EXPENSE", date=today).aggregate(Sum("amount"))["amount__sum"] or 0
-    today_expense = float(today_expense)
-    
-    days_until_broke = None
-    broke_date = None
-    if not survive and avg_daily_spend > 0:
-        days_until_broke = math.ceil(available_funds / avg_daily_spend)
-        if days_until_broke < 365:
-            broke_date = today + timedelta(days=days_until_broke)
-    
-    warning_message = ""
-    if today_expense > avg_daily_spend * 1.5 and avg_daily_spend > 0:
-        warning_message = f"⚠️ Warning: You spent ₹{today_expense:.0f} today, which is {((today_expense/avg_daily_spend - 1) * 100):.0f}% more than your daily average of ₹{avg_daily_spend:.0f}"
-    elif not survive:
-        if broke_date:
-            warning_message = f"🚨 At current spending rate, your money may run out in {days_until_broke} days (by {broke_date.strftime('%d %b, %Y')})"
-        elif days_until_broke:
-            warning_message = f"⚠️ Warning: Money will run out in {days_until_broke} days at current spending rate"
-        else:
-            warning_message = "🚨 Critical: Insufficient funds for the month"
-    
     context = {
-        "total_income": total_income,
-        "total_expense": total_expense,
-        "balance": balance,
-        "total_transactions": total_transactions,
-        "month_income": month_income,
-        "month_expense": month_expense,
-        "month_balance": month_balance,
-        "month_transaction_count": month_transaction_count,
-        "category_expense": category_expense,
-        "category_income": category_income,
+        **summary,
         "selected_month": selected_month,
         "selected_year": selected_year,
         "month_name": month_name[selected_month],
@@ -303,200 +218,150 @@ def analytics(request):
         "prev_year": prev_month.year,
         "next_month": next_month.month,
         "next_year": next_month.year,
-        "daily_labels": daily_labels,
-        "daily_income": daily_income,
-        "daily_expense": daily_expense,
-        "month_labels": month_labels,
-        "yearly_income": yearly_income,
-        "yearly_expense": yearly_expense,
-        "warning_message": warning_message,
+        "summary_computed_at": computed_at,
+        "summary_refresh_pending": refresh_pending,
+        "statement_closed": closed,
     }
     
     return render(request, "dashboard/analytics.html", context)
 
 
+def _chart_month(request):
+    """``(year, month)`` from the query string, falling back to the current month"""
+    today = date.today()
+    try:
+        year = int(request.GET.get("year", today.year))
+        month = int(request.GET.get("month", today.month))
+        date(year, month, 1)
+    except ValueError:
+        return today.year, today.month
+    return year, month
+
+
+def _chart_etag(request):
+    year, month = _chart_month(request)
+    return f"{request.user.pk}.{ledger_version(request).version}.{year}-{month}"
+
+
+def _chart_last_modified(request):
+    return ledger_version(request).changed_at
+
+
+@login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_chart_etag, last_modified_func=_chart_last_modified)
+def analytics_data(request):
+    # Validators are checked first, so a 304 never runs the aggregates below
+    year, month = _chart_month(request)
+    if is_closed(date(year, month, 1)):
+        payload = statement_payload(request.user, date(year, month, 1))
+        return JsonResponse({**payload["chart"], **compute_yearly_trend(request.user, year)})
+    return JsonResponse(compute_chart_data(request.user, year, month))
+
+
+@login_required
+@require_GET
+def statement_file(request, year, month, kind):
+    """A closed month's statement as the CSV download or the printable HTML page"""
+    try:
+        first = date(year, month, 1)
+    except ValueError:
+        raise Http404
+    if not is_closed(first):
+        raise Http404("A month's statement is made once the month is over")
+    statement = load_statement(request.user, first)
+    if statement is None:
+        # Nothing is kept for a month before the user's first transaction
+        content = BytesIO(render_statement(request.user, first, kind).encode())
+    else:
+        content = (statement.csv_file if kind == "csv" else statement.html_file).open("rb")
+    if kind == "csv":
+        return FileResponse(content, as_attachment=True, filename=f"statement-{first:%Y-%m}.csv", content_type="text/csv")
+    return FileResponse(content, content_type="text/html; charset=utf-8")
+
+
 @login_required
+@private_page_cache(summaries=True)
 def survival_dashboard(request):
     today = date.today()
-    days_in_month = calendar.monthrange(today.year, today.month)[1]
-    days_passed = max(1, today.day)
-    days_left = days_in_month - today.day
-    
-    # Get current month transactions
-    qs = Transaction.objects.filter(user=request.user, date__year=today.year, date__month=today.month)
-    
-    # Monthly totals
-    income_mtd = qs.filter(transaction_type="INCOME").aggregate(Sum("amount"))["amount__sum"] or 0
-    expense_mtd = qs.filter(transaction_type="EXPENSE", date__lte=today).aggregate(Sum("amount"))["amount__sum"] or 0
-    net_mtd = income_mtd - expense_mtd
-    
-    # Current balances (cumulative from ALL transactions - carries forward from previous months)
-    all_transactions = Transaction.objects.filter(user=request.user)
-    
-    # UPI Cash balance - cumulative from all time including switches
-    upi_income = all_transactions.filter(transaction_type="INCOME", money_type="UPI CASH").aggregate(total=Sum("amount"))["total"] or 0
-    upi_expense = all_transactions.filter(transaction_type="EXPENSE", money_type="UPI CASH").aggregate(total=Sum("amount"))["total"] or 0
-    upi_from_switch = all_transactions.filter(transaction_type="SWITCH", switch_direction="HAND_TO_UPI").aggregate(total=Sum("amount"))["total"] or 0
-    upi_to_switch = all_transactions.filter(transaction_type="SWITCH", switch_direction="UPI_TO_HAND").aggregate(total=Sum("amount"))["total"] or 0
-    upi_balance = upi_income - upi_expense + upi_from_switch - upi_to_switch
-    
-    # Hand Cash balance - cumulative from all time including switches
-    hand_income = all_transactions.filter(transaction_type="INCOME", money_type="HAND CASH").aggregate(total=Sum("amount"))["total"] or 0
-    hand_expense = all_transactions.filter(transaction_type="EXPENSE", money_type="HAND CASH").aggregate(total=Sum("amount"))["total"] or 0
-    hand_from_switch = all_transactions.filter(transaction_type="SWITCH", switch_direction="UPI_TO_HAND").aggregate(total=Sum("amount"))["total"] or 0
-    hand_to_switch = all_transactions.filter(transaction_type="SWITCH", switch_direction="HAND_TO_UPI").aggregate(total=Sum("amount"))["total"] or 0
-    hand_balance = hand_income - hand_expense + hand_from_switch - hand_to_switch
-    
-    # Survival calculations
-    avg_daily_spend = float(expense_mtd) / days_passed if days_passed > 0 else 0
-    projected_remaining_spend = avg_daily_spend * days_left
-    available_funds = float(upi_balance) + float(hand_balance)
-    projected_end_balance = available_funds - projected_remaining_spend
-    survive = projected_end_balance >= 0
-    
-    # Today's spending
-    today_expense = qs.filter(transaction_type="EXPENSE", date=today).aggregate(Sum("amount"))["amount__sum"] or 0
-    today_expense = float(today_expense)
-    
-    # Weekly spending analysis
-    from datetime import timedelta
-    week_start = today - timedelta(days=today.weekday())
-    week_expenses = []
-    for i in range(7):
-        day = week_start + timedelta(days=i)
-        if day.month == today.month:
-            day_expense = qs.filter(transaction_type="EXPENSE", date=day).aggregate(Sum("amount"))["amount__sum"] or 0
-            week_expenses.append({
-                'day': day.strftime('%a'),
-                'date': day,
-                'amount': float(day_expense),
-                'is_today': day == today
-            })
-    
-    week_total = sum(d['amount'] for d in week_expenses)
-    
-    # Health score calculation
-    health_score = 100
-    if expense_mtd > income_mtd:
-        health_score -= 20
-    if projected_end_balance < 0:
-        health_score -= 30
-    if avg_daily_spend > 0 and today_expense > avg_daily_spend * 1.5:
-        health_score -= 15
-    
-    # Health status
-    if health_score >= 80:
-        health_status = "Healthy ✅"
-        health_color = "#2ecc71"
-    elif health_score >= 50:
-        health_status = "Caution ⚠️"
-        health_color = "#f39c12"
-    else:
-        health_status = "Risk 🚨"
-        health_color = "#e74c3c"
-    
-    # Days until out of money with production-grade calculation
-    days_until_broke = None
-    broke_date = None
-    if not survive and avg_daily_spend > 0:
-        days_until_broke = math.ceil(available_funds / avg_daily_spend)
-        if days_until_broke < 365:
-            broke_date = today + timedelta(days=days_until_broke)
-    
-    # Generate warning message
-    warning_message = ""
-    if today_expense > avg_daily_spend * 1.5 and avg_daily_spend > 0:
-        warning_message = f"⚠️ Warning: You spent ₹{today_expense:.0f} today, which is {((today_expense/avg_daily_spend - 1) * 100):.0f}% more than your daily average of ₹{avg_daily_spend:.0f}"
-    elif not survive:
-        if broke_date:
-            warning_message = f"🚨 At current spending rate, your money may run out in {days_until_broke} days (by {broke_date.strftime('%d %b, %Y')})"
-        elif days_until_broke:
-            warning_message = f"⚠️ Warning: Money will run out in {days_until_broke} days at current spending rate"
-        else:
-            warning_message = "🚨 Critical: Insufficient funds for the month"
-    elif health_score < 50:
-        warning_message = "🚨 Financial health is at risk - review your spending immediately"
-    elif health_score < 70:
-        warning_message = "⚠️ Caution: Your spending patterns need attention"
-    
-    # AI Insights generation
-    insights = []
-    
-    # Compare with last month
-    last_month = today.replace(day=1) - timedelta(days=1)
-    last_month_transactions = all_transactions.filter(date__year=last_month.year, date__month=last_month.month)
-    last_month_expense = last_month_transactions.filter(transaction_type="EXPENSE").aggregate(Sum("amount"))["amount__sum"] or 0
-    
-    if last_month_expense > 0:
-        expense_change = ((float(expense_mtd) - float(last_month_expense)) / float(last_month_expense)) * 100
-        if expense_change > 25:
-            insights.append(f"📈 You're spending {expense_change:.0f}% more than last month")
-        elif expense_change < -15:
-            insights.append(f"📉 Great! You've reduced spending by {abs(expense_change):.0f}% from last month")
-    
-    # Category insights
-    current_categories = qs.filter(transaction_type="EXPENSE").values("category").annotate(total=Sum("amount")).order_by("-total")
-    last_month_categories = last_month_transactions.filter(transaction_type="EXPENSE").values("category").annotate(total=Sum("amount"))
-    
-    # Convert to dict for easy lookup
-    last_month_dict = {item['category']: float(item['total']) for item in last_month_categories}
-    
-    for category in current_categories[:3]:  # Top 3 categories
-        current_amount = float(category['total'])
-        last_amount = last_month_dict.get(category['category'], 0)
-        
-        if last_amount > 0:
-            change = ((current_amount - last_amount) / last_amount) * 100
-            if change > 30:
-                insights.append(f"🔥 {category['category']} expense spike detected (+{change:.0f}%)")
-    
-    # Savings insight
-    last_month_income = last_month_transactions.filter(transaction_type="INCOME").aggregate(Sum("amount"))["amount__sum"] or 0
-    current_savings = float(income_mtd) - float(expense_mtd)
-    last_month_savings = float(last_month_income) - float(last_month_expense)
-    
-    if current_savings > last_month_savings + 1000:
-        savings_diff = current_savings - last_month_savings
-        insights.append(f"💰 This month you saved ₹{savings_diff:.0f} more than last month")
-    
-    # High spending day insight
-    daily_expenses = qs.filter(transaction_type="EXPENSE", date__lte=today).values("date").annotate(total=Sum("amount")).order_by("-total")
-    if daily_expenses:
-        highest_day = daily_expenses[0]
-        if float(highest_day['total']) > avg_daily_spend * 2:
-            insights.append(f"📅 Your highest spending day was {highest_day['date'].strftime('%b %d')} (₹{highest_day['total']:.0f})")
-    
-    # Cashflow forecast
-    if survive:
-        insights.append(f"✅ At current pace, you'll end the month with ₹{projected_end_balance:.0f}")
-    
-    # Limit to 3 most relevant insights
-    insights = insights[:3]
+    summary, computed_at, refresh_pending = load_summary(
+        request.user, "SURVIVAL", today,
+        lambda: compute_survival(request.user, today),
+        version=ledger_version(request).version,
+    )
     
     context = {
-        "income_mtd": income_mtd,
-        "expense_mtd": expense_mtd,
-        "net_mtd": net_mtd,
-        "upi_balance": upi_balance,
-        "hand_balance": hand_balance,
-        "available_funds": available_funds,
-        "avg_daily_spend": avg_daily_spend,
-        "projected_remaining_spend": projected_remaining_spend,
-        "projected_end_balance": projected_end_balance,
-        "survive": survive,
-        "days_left": days_left,
-        "days_until_broke": days_until_broke,
-        "broke_date": broke_date,
-        "health_score": health_score,
-        "health_status": health_status,
-        "health_color": health_color,
-        "days_passed": days_passed,
-        "days_in_month": days_in_month,
-        "warning_message": warning_message,
-        "insights": insights,
-        "today_expense": today_expense,
-        "week_expenses": week_expenses,
-        "week_total": week_total,
+        **summary,
+        "broke_date": date.fromisoformat(summary["broke_date"]) if summary["broke_date"] else None,
+        "summary_computed_at": computed_at,
+        "summary_refresh_pending": refresh_pending,
     }
     
     return render(request, "dashboard/survival.html", context)
+
+
+@login_required
+def heatmap(request):
+    end = _heatmap_end(request)
+    context = {
+        "end": end,
+        "start": end - timedelta(days=HEATMAP_DAYS - 1),
+        "prev_end": end - timedelta(days=HEATMAP_DAYS),
+        "next_end": end + timedelta(days=HEATMAP_DAYS),
+        "is_latest": end >= date.today(),
+    }
+    return render(request, "dashboard/heatmap.html", context)
+
+
+@login_required
+def heatmap_data(request):
+    return JsonResponse(compute_heatmap(request.user, _heatmap_end(request)))
+
+
+def _heatmap_end(request):
+    """Last day of the requested heatmap window (``?end=YYYY-MM-DD``, default today)."""
+    try:
+        return date.fromisoformat(request.GET.get("end", ""))
+    except ValueError:
+        return date.today()
+
+
+@login_required
+def household_dashboard(request):
+    members = household_members(request.user)
+    if not members:
+        return redirect("household_settings")
+    household = members[0].household
+    year, month = _chart_month(request)
+    current = date(year, month, 1)
+    prev_month = current - timedelta(days=1)
+    next_month = (current.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+    # Keyed by every member's ledger version, so any member's write starts a new entry
+    summary = single_flight(
+        f"household:{household.pk}:{household_version(members)}:{year}-{month}",
+        lambda: compute_household(members, year, month),
+        settings.PAGE_CACHE_SECONDS,
+    )
+    context = {
+        **summary,
+        "category_tables": [("💸 Expenses by Category", summary["expense_categories"]), ("💰 Income by Category", summary["income_categories"])],
+        "household": household,
+        "selected_year": year,
+        "selected_month": month,
+        "month_name": calendar.month_name[month],
+        "prev_month": prev_month.month,
+        "prev_year": prev_month.year,
+        "next_month": next_month.month,
+        "next_year": next_month.year,
+    }
+    return render(request, "dashboard/household.html", context)
+
+
+@login_required
+def household_data(request):
+    members = household_members(request.user)
+    if not members:
+        return JsonResponse({"labels": [], "members": []})
+    year, month = _chart_month(request)
+    return JsonResponse(compute_household_daily(members, year, month))
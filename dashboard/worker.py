@@ -0,0 +1,23 @@
+"""
+Entry points run inside the summary worker's child processes.
+
+Spawned children unpickle these functions before Django is configured, so
+this module must not import models at import time.
+"""
+import django
+
+
+def init_worker():
+    django.setup()
+
+
+def refresh_summaries(user_id):
+    from .jobs import refresh_user_summaries
+
+    refresh_user_summaries(user_id)
+
+
+def generate_statement(user_id, month):
+    from .statements import generate_user_statement
+
+    generate_user_statement(user_id, month)
@@ -1,10 +1,210 @@
-from django.contrib import admin
-from .models import Transaction
+import copy
+from itertools import groupby
+from operator import attrgetter
+
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.contrib.auth import get_user_model
+from django.db.models import Q
+from django.http import HttpResponseRedirect
+
+from .edits import LedgerError, delete_transactions, update_transaction
+from .models import ArchivedTransaction, Budget, Category, LedgerArchive, Receipt, RecurringRule, Transaction, Wallet
+from .pagination import EstimatedCountPaginator
+
+@admin.register(Wallet)
+class WalletAdmin(admin.ModelAdmin):
+    list_display = ['user', 'name', 'kind', 'created_at']
+    list_select_related = ['user']
+    list_filter = ['kind']
+    search_fields = ['name', 'user__username']
+
+@admin.register(Category)
+class CategoryAdmin(admin.ModelAdmin):
+    list_display = ['name', 'user', 'created_at']
+    list_select_related = ['user']
+    search_fields = ['name']
+    autocomplete_fields = ['user']
+    ordering = ['name']
+
+class TransactionAdminForm(forms.ModelForm):
+    """Keeps the stored row, so saving can check the edit against it"""
+
+    class Meta:
+        model = Transaction
+        fields = '__all__'
+
+    def clean(self):
+        cleaned_data = super().clean()
+        self.original = copy.copy(self.instance) if self.instance.pk else None
+        return cleaned_data
+
+class UserFilter(admin.SimpleListFilter):
+    """Pick a user through the autocomplete view instead of listing every user in the sidebar"""
+    title = 'user'
+    parameter_name = 'user'
+    template = 'admin/ledger/user_filter.html'
+
+    def __init__(self, request, params, model, model_admin):
+        super().__init__(request, params, model, model_admin)
+        field = forms.ModelChoiceField(
+            queryset=get_user_model().objects.all(),
+            required=False,
+            widget=AutocompleteSelect(model._meta.get_field('user'), model_admin.admin_site),
+        )
+        self.select = field.widget.render('user', self.value())
+
+    def has_output(self):
+        return True
+
+    def lookups(self, request, model_admin):
+        return []
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(user_id=self.value())
+        return queryset
+
+class CategoryFilter(admin.SimpleListFilter):
+    """The global categories, so the sidebar doesn't list every user's custom ones"""
+    title = 'category'
+    parameter_name = 'category'
+
+    def lookups(self, request, model_admin):
+        return [(category.pk, category.name) for category in Category.objects.filter(user__isnull=True).order_by('name')]
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(category_id=self.value())
+        return queryset
 
 @admin.register(Transaction)
 class TransactionAdmin(admin.ModelAdmin):
-    list_display = ['user', 'transaction_type', 'money_type', 'switch_direction', 'amount', 'category', 'description', 'date', 'created_at']
-    list_filter = ['transaction_type', 'money_type', 'switch_direction', 'category', 'date', 'created_at']
-    search_fields = ['description', 'category']
-    date_hierarchy = 'date'
-    ordering = ['-date']
+    form = TransactionAdminForm
+    list_display = ['user', 'transaction_type', 'wallet', 'to_wallet', 'amount', 'category', 'description', 'date', 'created_at']
+    list_select_related = ['user', 'wallet', 'to_wallet', 'category']
+    list_filter = [UserFilter, 'transaction_type', CategoryFilter, 'date']
+    autocomplete_fields = ['user', 'wallet', 'to_wallet', 'category']
+    search_fields = ['description']
+    search_help_text = 'Transaction id, exact username, or the start of the description (case-sensitive)'
+    ordering = ['-date', '-id']
+    # Large tables: no exact COUNT(*) for the unfiltered total, and an estimated count for paging
+    show_full_result_count = False
+    paginator = EstimatedCountPaginator
+
+    @property
+    def media(self):
+        user_select = AutocompleteSelect(Transaction._meta.get_field('user'), self.admin_site)
+        return super().media + user_select.media + forms.Media(js=['js/admin_user_filter.js'])
+
+    def get_search_results(self, request, queryset, search_term):
+        # Only lookups an index can answer: primary key, unique username and description prefix
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        users = get_user_model().objects.filter(username=term).values('pk')
+        condition = Q(user_id__in=users) | Q(description__startswith=term)
+        if term.isdigit():
+            condition |= Q(pk=term)
+        return queryset.filter(condition), False
+
+    # Keep the budget totals in step with admin changes, checking balances under the wallet locks
+    def save_model(self, request, obj, form, change):
+        try:
+            update_transaction(form.original, obj)
+        except LedgerError as error:
+            request._ledger_error = error
+            self.message_user(request, str(error), messages.ERROR)
+
+    # A rejected edit saved nothing, so it isn't logged and goes back to the form
+    def log_addition(self, request, obj, message):
+        if not hasattr(request, '_ledger_error'):
+            return super().log_addition(request, obj, message)
+
+    def log_change(self, request, obj, message):
+        if not hasattr(request, '_ledger_error'):
+            return super().log_change(request, obj, message)
+
+    def response_add(self, request, obj, post_url_continue=None):
+        if hasattr(request, '_ledger_error'):
+            return HttpResponseRedirect(request.get_full_path())
+        return super().response_add(request, obj, post_url_continue)
+
+    def response_change(self, request, obj):
+        if hasattr(request, '_ledger_error'):
+            return HttpResponseRedirect(request.get_full_path())
+        return super().response_change(request, obj)
+
+    def delete_model(self, request, obj):
+        delete_transactions(obj.user, [obj], check=False)
+
+    def delete_queryset(self, request, queryset):
+        for _, transactions in groupby(queryset.select_related('user').order_by('user_id'), key=attrgetter('user_id')):
+            transactions = list(transactions)
+            delete_transactions(transactions[0].user, transactions, check=False)
+
+@admin.register(ArchivedTransaction)
+class ArchivedTransactionAdmin(admin.ModelAdmin):
+    list_display = ['id', 'user', 'transaction_type', 'wallet', 'amount', 'category', 'description', 'date']
+    list_select_related = ['user', 'wallet', 'category']
+    list_filter = ['transaction_type']
+    search_fields = ['=id', '=user__username']
+    ordering = ['-date', '-id']
+    show_full_result_count = False
+    paginator = EstimatedCountPaginator
+
+    # Archived history is only changed by the archive command, which keeps the summaries in step
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+@admin.register(LedgerArchive)
+class LedgerArchiveAdmin(admin.ModelAdmin):
+    list_display = ['user', 'archived_before', 'archived_at']
+    list_select_related = ['user']
+    search_fields = ['user__username']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+@admin.register(Budget)
+class BudgetAdmin(admin.ModelAdmin):
+    list_display = ['user', 'category', 'amount', 'hard_limit', 'created_at']
+    list_select_related = ['user', 'category']
+    list_filter = ['hard_limit']
+    search_fields = ['category__name', 'user__username']
+
+@admin.register(RecurringRule)
+class RecurringRuleAdmin(admin.ModelAdmin):
+    list_display = ['user', 'transaction_type', 'amount', 'category', 'frequency', 'interval', 'next_date', 'active']
+    list_select_related = ['user', 'category']
+    list_filter = ['transaction_type', 'frequency', 'active']
+    search_fields = ['description', 'user__username']
+    # next_date is derived from the schedule, so the schedule itself is read-only here
+    readonly_fields = ['user', 'transaction_type', 'wallet', 'category', 'frequency', 'interval', 'start_date', 'next_date']
+
+    def has_add_permission(self, request):
+        return False
+
+@admin.register(Receipt)
+class ReceiptAdmin(admin.ModelAdmin):
+    list_display = ['sha256', 'content_type', 'size', 'thumbnail_status', 'created_at']
+    list_filter = ['content_type', 'thumbnail_status']
+    search_fields = ['sha256']
+    # Files are named by their hash and shared between transactions, so they aren't edited here
+    readonly_fields = ['sha256', 'file', 'content_type', 'size', 'thumbnail', 'claimed_at', 'created_at']
+
+    def has_add_permission(self, request):
+        return False
@@ -0,0 +1,198 @@
+"""
+Cold storage for old transactions.
+
+``archive_user`` moves a user's transactions dated before a month boundary
+from ``Transaction`` to ``ArchivedTransaction``. It leaves behind what the
+live pages need to show the same numbers: one ``MonthlySummary`` row per
+month, type, wallets and category, and an ``OpeningBalance`` per wallet.
+Balances and totals then read those small tables plus the live rows.
+The archived period is closed: new and edited transactions must be dated
+on or after ``archived_before``. Archived rows can still be searched and
+exported; only those requests read the archive table itself. The cutoff
+is read on most pages straight from ``LedgerArchive``, a single row per
+user, so every worker sees a new archive run at once.
+"""
+from collections import defaultdict
+from datetime import date, timedelta
+
+from django.db import connections, transaction as db_transaction
+from django.db.models import Q, Sum
+
+from .balances import ZERO, lock_wallets
+from .budgets import month_start
+from .models import ArchivedTransaction, LedgerArchive, MonthlySummary, OpeningBalance, Transaction, Wallet
+from .search import search_words
+from .suggestions import forget
+from .versions import bump_version
+
+# Fields copied from a transaction to its archived row
+FIELDS = (
+    "id", "user_id", "transaction_type", "wallet_id", "to_wallet_id", "amount",
+    "category_id", "description", "date", "idempotency_key", "seq", "receipt_id", "created_at",
+)
+
+
+def archived_before(user):
+    """The first day still in ``user``'s live table, or None if nothing was archived"""
+    return LedgerArchive.objects.filter(user=user).values_list("archived_before", flat=True).first()
+
+
+def archive_cutoff(today, months):
+    """First day of the month ``months`` months before ``today``'s"""
+    index = today.year * 12 + today.month - 1 - months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def archive_user(user, before, batch_size=2000):
+    """
+    Move ``user``'s transactions dated before ``before`` to the archive and return how many moved.
+
+    ``before`` should be the first day of a month. Everything happens in one
+    database transaction with the user's wallets locked, so no balance check
+    sees a half-moved ledger. The summaries and opening balances are built
+    from exactly the rows that were copied. The rows are then deleted
+    without signals, so sync clients get no tombstones for them.
+    """
+    with db_transaction.atomic():
+        lock_wallets(Wallet.objects.filter(user=user).values_list("pk", flat=True))
+        archive = LedgerArchive.objects.filter(user=user).first()
+        if archive is not None:
+            # Also picks up rows saved into the closed period since the last run
+            before = max(before, archive.archived_before)
+
+        summaries = defaultdict(lambda: [ZERO, 0])
+        opening = defaultdict(lambda: ZERO)
+        moved = 0
+        rows = Transaction.objects.filter(user=user, date__lt=before).order_by("id").values(*FIELDS)
+        batch = []
+        for row in rows.iterator(chunk_size=batch_size):
+            key = (month_start(row["date"]), row["transaction_type"], row["wallet_id"], row["to_wallet_id"], row["category_id"])
+            summaries[key][0] += row["amount"]
+            summaries[key][1] += 1
+            opening[row["wallet_id"]] += row["amount"] if row["transaction_type"] == "INCOME" else -row["amount"]
+            if row["transaction_type"] == "SWITCH":
+                opening[row["to_wallet_id"]] += row["amount"]
+            batch.append(row)
+            if len(batch) == batch_size:
+                moved += _move(batch)
+                batch = []
+        if batch:
+            moved += _move(batch)
+
+        if moved:
+            _add_summaries(user, summaries)
+            _add_opening_balances(user, opening)
+        if moved or archive is None or archive.archived_before != before:
+            LedgerArchive.objects.update_or_create(user=user, defaults={"archived_before": before})
+            bump_version(user.pk)
+            db_transaction.on_commit(lambda: forget(user.pk))
+    return moved
+
+
+def _move(rows):
+    ArchivedTransaction.objects.bulk_create([ArchivedTransaction(**row) for row in rows])
+    # Plain SQL, since a queryset delete sends post_delete and so leaves a sync tombstone per row
+    connection = connections[Transaction.objects.db]
+    table = connection.ops.quote_name(Transaction._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {table} WHERE id IN ({', '.join(['%s'] * len(rows))})", [row["id"] for row in rows])
+    return len(rows)
+
+
+def _add_summaries(user, summaries):
+    existing = {
+        (summary.month, summary.transaction_type, summary.wallet_id, summary.to_wallet_id, summary.category_id): summary
+        for summary in MonthlySummary.objects.filter(user=user, month__in={key[0] for key in summaries})
+    }
+    new = []
+    for key, (amount, count) in summaries.items():
+        summary = existing.get(key)
+        if summary is None:
+            month, transaction_type, wallet_id, to_wallet_id, category_id = key
+            new.append(MonthlySummary(
+                user=user, month=month, transaction_type=transaction_type, wallet_id=wallet_id,
+                to_wallet_id=to_wallet_id, category_id=category_id, amount=amount, count=count,
+            ))
+        else:
+            summary.amount += amount
+            summary.count += count
+            summary.save(update_fields=["amount", "count"])
+    MonthlySummary.objects.bulk_create(new)
+
+
+def _add_opening_balances(user, opening):
+    existing = {balance.wallet_id: balance for balance in OpeningBalance.objects.filter(user=user)}
+    for wallet_id, amount in opening.items():
+        balance = existing.get(wallet_id)
+        if balance is None:
+            OpeningBalance.objects.create(user=user, wallet_id=wallet_id, balance=amount)
+        else:
+            balance.balance += amount
+            balance.save(update_fields=["balance"])
+
+
+def search_archived(queryset, query):
+    """
+    Narrow archived rows to those whose description or category contains every word of ``query``.
+
+    The archive has no search index; this scans one user's archived rows
+    and only runs when they search the archive.
+    """
+    for word in search_words(query):
+        queryset = queryset.filter(Q(description__icontains=word) | Q(category__name__icontains=word))
+    return queryset
+
+
+def _next_month(day):
+    return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def archived_totals(user, start=None, end=None, condition=Q(), query=""):
+    """
+    ``(income, expense)`` of ``user``'s archived transactions from ``start`` to ``end`` matching ``condition``.
+
+    ``condition`` may only use fields that ``ArchivedTransaction`` and
+    ``MonthlySummary`` share with ``Transaction``. Whole months are read from
+    the summaries. Archived rows are only summed for a month that ``start``
+    or ``end`` cuts through, or when there is a search ``query``.
+    """
+    before = archived_before(user)
+    if before is None or (start is not None and start >= before):
+        return ZERO, ZERO
+    last = before - timedelta(days=1)
+    end = last if end is None else min(end, last)
+    if start is not None and start > end:
+        return ZERO, ZERO
+
+    rows = ArchivedTransaction.objects.filter(condition, user=user, date__lte=end)
+    if start is not None:
+        rows = rows.filter(date__gte=start)
+    if query:
+        return _income_expense(search_archived(rows, query))
+
+    # Months wholly inside the range are [first, stop)
+    first = start if start is None or start.day == 1 else _next_month(start)
+    stop = _next_month(end) if _next_month(end) - timedelta(days=1) == end else month_start(end)
+    if first is not None and first >= stop:
+        return _income_expense(rows)
+
+    months = MonthlySummary.objects.filter(condition, user=user, month__lt=stop)
+    if first is not None:
+        months = months.filter(month__gte=first)
+    income, expense = _income_expense(months)
+
+    if (start is not None and start < first) or stop <= end:
+        edges = Q(date__gte=stop)
+        if start is not None:
+            edges |= Q(date__lt=first)
+        partial_income, partial_expense = _income_expense(rows.filter(edges))
+        income, expense = income + partial_income, expense + partial_expense
+    return income, expense
+
+
+def _income_expense(rows):
+    totals = rows.aggregate(
+        income=Sum("amount", filter=Q(transaction_type="INCOME")),
+        expense=Sum("amount", filter=Q(transaction_type="EXPENSE")),
+    )
+    return totals["income"] or ZERO, totals["expense"] or ZERO
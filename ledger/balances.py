@@ -0,0 +1,190 @@
+"""
+Wallet balance queries.
+
+A wallet's balance is its income, minus its expenses, minus switches out of
+it, plus switches into it. Switches are stored once, with ``wallet`` as the
+source and ``to_wallet`` as the destination. Writes that depend on a balance
+check hold ``lock_wallets`` from the check until they commit. Once a user's
+old transactions are archived, each wallet starts from its
+``OpeningBalance`` and only the live rows are summed.
+"""
+from decimal import Decimal
+
+from django.db.models import Case, DecimalField, F, Q, Subquery, Sum, Value, When, Window
+from django.db.models.functions import Coalesce, FirstValue
+from django.db.models.expressions import RowRange
+
+from .models import ArchivedTransaction, LedgerArchive, OpeningBalance, Transaction, Wallet
+
+ZERO = Decimal("0")
+
+
+def signed_amount():
+    """Effect of a row on its own ``wallet``: + for income, - for expenses and switches out"""
+    return Case(
+        When(transaction_type="INCOME", then=F("amount")),
+        default=-F("amount"),
+    )
+
+
+def overall_amount():
+    """Effect of a row on the user's total: switches only move money between wallets"""
+    return Case(
+        When(transaction_type="INCOME", then=F("amount")),
+        When(transaction_type="EXPENSE", then=-F("amount")),
+        default=Value(ZERO),
+        output_field=DecimalField(max_digits=12, decimal_places=2),
+    )
+
+
+def wallet_effect(wallet_id):
+    """Effect of a row on one particular wallet, including switches into it"""
+    return Case(
+        When(wallet_id=wallet_id, then=signed_amount()),
+        When(to_wallet_id=wallet_id, then=F("amount")),
+        default=Value(ZERO),
+        output_field=DecimalField(max_digits=12, decimal_places=2),
+    )
+
+
+def wallet_totals(rows, opening=None):
+    """
+    ``{wallet_id: total}`` of the effect of ``rows`` on each wallet, plus the ``opening`` balances.
+
+    ``rows`` is a queryset of transactions, live or archived. This is a
+    single statement no matter how many wallets there are: one ``GROUP BY
+    wallet`` over each row's own effect, UNION ALL one ``GROUP BY
+    to_wallet`` over incoming switches, UNION ALL the opening balances.
+    """
+    own = (
+        rows
+        .order_by()
+        .values_list("wallet_id")
+        .annotate(total=Sum(signed_amount()))
+    )
+    parts = [
+        rows.filter(transaction_type="SWITCH")
+        .order_by()
+        .values_list("to_wallet_id")
+        .annotate(total=Sum("amount"))
+    ]
+    if opening is not None:
+        parts.append(opening.order_by().values_list("wallet_id").annotate(total=Sum("balance")))
+
+    totals = {}
+    for wallet_id, total in own.union(*parts, all=True):
+        totals[wallet_id] = totals.get(wallet_id, ZERO) + (total or ZERO)
+    return totals
+
+
+def wallet_balances(user, before=None):
+    """
+    Return ``{wallet_id: balance}`` for every wallet of ``user`` that has activity.
+
+    With ``before``, only rows dated earlier than that day are counted.
+    Archived history comes from the opening balances, unless ``before``
+    falls inside the archived period.
+    """
+    rows = Transaction.objects.filter(user=user)
+    opening = OpeningBalance.objects.filter(user=user)
+    if before is None:
+        return wallet_totals(rows, opening)
+
+    rows = rows.filter(date__lt=before)
+    archive = LedgerArchive.objects.filter(user=user).first()
+    if archive is None or archive.archived_before <= before:
+        return wallet_totals(rows, opening)
+    totals = wallet_totals(rows)
+    for wallet_id, total in wallet_totals(ArchivedTransaction.objects.filter(user=user, date__lt=before)).items():
+        totals[wallet_id] = totals.get(wallet_id, ZERO) + total
+    return totals
+
+
+def wallets_with_balances(user):
+    """All of ``user``'s wallets, each with a ``balance`` attribute"""
+    balances = wallet_balances(user)
+    wallets = list(Wallet.objects.filter(user=user).order_by("id"))
+    for wallet in wallets:
+        wallet.balance = balances.get(wallet.id, ZERO)
+    return wallets
+
+
+def wallet_balance(wallet):
+    """Balance of a single wallet, as one aggregate over the rows touching it plus its opening balance"""
+    opening = OpeningBalance.objects.filter(wallet=wallet).values("balance")
+    return Transaction.objects.filter(Q(wallet=wallet) | Q(to_wallet=wallet)).aggregate(
+        total=Coalesce(
+            Sum(
+                Case(
+                    When(to_wallet=wallet, then=F("amount")),
+                    default=signed_amount(),
+                )
+            ),
+            Value(ZERO),
+        ) + Coalesce(Subquery(opening), Value(ZERO))
+    )["total"]
+
+
+def lock_wallets(wallet_ids):
+    """
+    Lock the given wallets' rows until the surrounding ``atomic()`` block ends.
+
+    Call this before checking a balance that a write depends on. Any other
+    request writing to the same wallets waits here until this one commits,
+    so its own check sees the new rows; requests for other wallets and
+    other users go ahead in parallel. Rows are locked in id order, so two
+    requests locking overlapping wallets can't deadlock. SQLite ignores
+    ``FOR UPDATE``; there the ``IMMEDIATE`` transaction mode serializes
+    writers instead.
+    """
+    ids = sorted({wallet_id for wallet_id in wallet_ids if wallet_id is not None})
+    if ids:
+        list(Wallet.objects.select_for_update().filter(pk__in=ids).order_by("pk").values_list("pk", flat=True))
+
+
+def attach_running_balances(user, transactions):
+    """
+    Set the balance after each row on a page of ``transactions``.
+
+    Each row gets ``running_balance`` (all wallets together),
+    ``wallet_balance`` (its own wallet) and, for switches,
+    ``to_wallet_balance``. The sums are ``Window(Sum(...))`` expressions
+    over the user's whole history in (date, id) order, so they stay correct
+    whatever filters or pagination picked the rows. Only history up to the
+    last row of the page is scanned and only the page's rows come back.
+    Archived history is added from the opening balances.
+    """
+    transactions = list(transactions)
+    if not transactions:
+        return transactions
+
+    last_date, last_id = max((t.date, t.id) for t in transactions)
+    wallet_ids = {t.wallet_id for t in transactions} | {t.to_wallet_id for t in transactions if t.to_wallet_id}
+    order_by = [F("date").asc(), F("id").asc()]
+
+    windows = {"running_balance": Window(Sum(overall_amount()), order_by=order_by)}
+    for wallet_id in wallet_ids:
+        windows[f"wallet_{wallet_id}"] = Window(Sum(wallet_effect(wallet_id)), order_by=order_by)
+
+    rows = (
+        Transaction.objects.filter(user=user)
+        .filter(Q(date__lt=last_date) | Q(date=last_date, id__lte=last_id))
+        .annotate(
+            **windows,
+            # A window that is just the row's own id: filtering on it is applied
+            # after the running sums are computed, unlike a plain id__in filter
+            row_id=Window(FirstValue("id"), order_by=order_by, frame=RowRange(start=0, end=0)),
+        )
+        .filter(row_id__in=[t.id for t in transactions])
+        .values("id", *windows)
+    )
+    by_id = {row["id"]: row for row in rows}
+    opening = dict(OpeningBalance.objects.filter(user=user).values_list("wallet_id", "balance"))
+    opening_total = sum(opening.values(), ZERO)
+
+    for t in transactions:
+        row = by_id[t.id]
+        t.running_balance = opening_total + row["running_balance"]
+        t.wallet_balance = opening.get(t.wallet_id, ZERO) + row[f"wallet_{t.wallet_id}"]
+        t.to_wallet_balance = opening.get(t.to_wallet_id, ZERO) + row[f"wallet_{t.to_wallet_id}"] if t.to_wallet_id else None
+    return transactions
@@ -0,0 +1,186 @@
+"""
+Validate and insert many transactions at once, for the JSON API.
+
+Wallet balances, budgets and this month's category totals are loaded up
+front, with the batch's wallets locked. Each entry is then checked in one
+pass against running totals, so a batch costs the same few queries however
+many entries it has. The accepted rows are written with a single
+``bulk_create`` in the same database transaction: either the whole batch is
+saved or none of it is.
+"""
+from collections import defaultdict
+
+from django.db import IntegrityError, transaction as db_transaction
+
+from dashboard.models import MonthlyStatement
+
+from .archive import archived_before
+from .balances import ZERO, lock_wallets, wallet_balances
+from .budgets import apply_spend, lock_spends, month_start
+from .categories import spending_categories, transfer_category
+from .forms import TransactionItemForm
+from .suggestions import add_transactions
+from .models import Budget, Transaction, Wallet
+from .versions import bump_version
+
+MAX_BATCH_SIZE = 500
+
+
+class BatchError(Exception):
+    """The batch was rejected; ``errors`` maps entry index (or "batch") to messages"""
+
+    def __init__(self, errors, status=400):
+        super().__init__(errors)
+        self.errors = errors
+        self.status = status
+
+
+def _parse(items, wallets, categories, before):
+    errors = {}
+    parsed = []
+    for index, data in enumerate(items):
+        form = TransactionItemForm(
+            data if isinstance(data, dict) else {}, wallets=wallets, categories=categories, archived_before=before,
+        )
+        if form.is_valid():
+            parsed.append((index, form.cleaned_data))
+        else:
+            errors[index] = {field: list(messages) for field, messages in form.errors.items()}
+    if errors:
+        raise BatchError(errors)
+
+    keys = [data["idempotency_key"] for _, data in parsed if data["idempotency_key"]]
+    if len(keys) != len(set(keys)):
+        raise BatchError({"batch": ["Each idempotency_key may appear only once per batch."]})
+    return parsed, keys
+
+
+def _build(user, data, wallets, transfer):
+    transaction = Transaction(
+        user=user,
+        transaction_type=data["transaction_type"],
+        wallet=wallets[data["wallet"]],
+        amount=data["amount"],
+        category=data["category"],
+        description=data["description"],
+        date=data["date"],
+        idempotency_key=data["idempotency_key"] or None,
+    )
+    if transaction.transaction_type == "SWITCH":
+        transaction.to_wallet = wallets[data["to_wallet"]]
+        transaction.category = transfer
+        if not transaction.description:
+            transaction.description = f"Switched from {transaction.wallet.name} to {transaction.to_wallet.name}"
+    return transaction
+
+
+def _check_and_save(user, items, parsed, keys, wallets, transfer):
+    # Every wallet in the batch stays locked from loading its balance until the
+    # rows are saved, so concurrent requests can't spend the same money twice
+    lock_wallets(wallet_id for _, data in parsed for wallet_id in (data["wallet"], data["to_wallet"]))
+
+    originals = {}
+    if keys:
+        originals = {
+            transaction.idempotency_key: transaction
+            for transaction in Transaction.objects.filter(user=user, idempotency_key__in=keys).select_related("category")
+        }
+
+    # Budgets and their running totals are locked like the wallets, so two
+    # batches can't both fit under the same budget
+    budgets = {budget.category_id: budget for budget in Budget.objects.select_for_update().filter(user=user).order_by("pk")}
+    spends = lock_spends(
+        (user.pk, data["category"].pk, month_start(data["date"]))
+        for _, data in parsed
+        if data["transaction_type"] == "EXPENSE" and data["category"].pk in budgets
+    )
+    spent = defaultdict(lambda: ZERO, {(category_id, month): spend.spent for (_, category_id, month), spend in spends.items()})
+
+    balances = defaultdict(lambda: ZERO, wallet_balances(user))
+    spend_deltas = defaultdict(lambda: ZERO)
+    results = [None] * len(items)
+    new = []
+    errors = {}
+    warnings = []
+
+    # Entries are applied in date order, so an income can fund a later expense in the same batch
+    for index, data in sorted(parsed, key=lambda entry: entry[1]["date"]):
+        original = originals.get(data["idempotency_key"])
+        if original is not None:
+            results[index] = (original, False)
+            continue
+
+        transaction = _build(user, data, wallets, transfer)
+        wallet = transaction.wallet
+
+        if transaction.transaction_type != "INCOME" and transaction.amount > balances[wallet.id]:
+            errors[index] = {"amount": [f"Insufficient {wallet.name} balance! Available: ₹{balances[wallet.id]:.2f}, Required: ₹{transaction.amount}"]}
+            continue
+
+        if transaction.transaction_type == "EXPENSE":
+            key = (transaction.category_id, month_start(transaction.date))
+            budget = budgets.get(transaction.category_id)
+            if budget and spent[key] + transaction.amount > budget.amount:
+                over_message = f"🎯 {transaction.category} budget exceeded! Budget: ₹{budget.amount:.2f}, Spent this month: ₹{spent[key]:.2f}, This expense: ₹{transaction.amount}"
+                if budget.hard_limit:
+                    errors[index] = {"category": [over_message]}
+                    continue
+                warnings.append((index, over_message))
+            spent[key] += transaction.amount
+            spend_deltas[key] += transaction.amount
+
+        if transaction.transaction_type == "INCOME":
+            balances[wallet.id] += transaction.amount
+        else:
+            balances[wallet.id] -= transaction.amount
+        if transaction.transaction_type == "SWITCH":
+            balances[transaction.to_wallet.id] += transaction.amount
+
+        new.append(transaction)
+        results[index] = (transaction, True)
+
+    if errors:
+        raise BatchError(errors)
+
+    if new:
+        # bulk_create skips pre_save, so the whole batch shares one sequence number
+        seq = bump_version(user.pk)
+        for transaction in new:
+            transaction.seq = seq
+        Transaction.objects.bulk_create(new)
+        for (category_id, month), delta in spend_deltas.items():
+            apply_spend(user, category_id, month, delta)
+        MonthlyStatement.objects.invalidate(user.pk, min(transaction.date for transaction in new))
+        # bulk_create sends no post_save either
+        db_transaction.on_commit(lambda: add_transactions(new))
+
+    return results, warnings, dict(balances)
+
+
+def record_transactions(user, items):
+    """
+    Validate ``items`` (dicts of transaction fields) and save them all.
+
+    Returns ``(results, warnings, balances)``. ``results`` has one
+    ``(transaction, created)`` pair per item in input order. Items whose
+    idempotency key was already used return the stored row with
+    ``created=False``. ``warnings`` lists soft-budget overruns as
+    ``(index, message)``, and ``balances`` maps wallet id to its balance
+    after the batch. Raises ``BatchError`` if any entry is invalid or would
+    overdraw a wallet or break a hard budget.
+    """
+    if not isinstance(items, list) or not items:
+        raise BatchError({"batch": ["Send a non-empty list of transactions."]})
+    if len(items) > MAX_BATCH_SIZE:
+        raise BatchError({"batch": [f"A batch may contain at most {MAX_BATCH_SIZE} transactions."]})
+
+    wallets = {wallet.id: wallet for wallet in Wallet.objects.filter(user=user)}
+    parsed, keys = _parse(items, wallets, spending_categories(user), archived_before(user))
+    transfer = transfer_category(user)
+
+    try:
+        with db_transaction.atomic():
+            return _check_and_save(user, items, parsed, keys, wallets, transfer)
+    except IntegrityError:
+        # A concurrent request used one of the idempotency keys first
+        raise BatchError({"batch": ["Some of these transactions were just saved by another request; retry to get the stored results."]}, status=409)
@@ -0,0 +1,121 @@
+"""
+Per-category monthly budgets.
+
+``CategorySpend`` keeps a running total per (user, category, month) that is
+adjusted in the same database transaction as each expense, so checking a
+budget is a single-row read instead of a SUM over the month.
+"""
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction as db_transaction
+from django.db.models import DecimalField, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from .models import Budget, CategorySpend
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def _spent_subquery(month):
+    return Coalesce(
+        Subquery(
+            CategorySpend.objects.filter(
+                user=OuterRef("user"),
+                category=OuterRef("category"),
+                month=month,
+            ).values("spent")[:1]
+        ),
+        Value(Decimal("0")),
+        output_field=DecimalField(max_digits=14, decimal_places=2),
+    )
+
+
+def budget_for(user, category, day):
+    """
+    The budget for ``category`` with the month's ``spent`` set, or None; both rows stay locked.
+
+    Call inside the ``atomic()`` block that saves the expense. The budget row
+    is locked first, which also covers a month whose running total doesn't
+    exist yet, and the total is then read under its own lock, so concurrent
+    expenses in the category are checked one after another.
+    """
+    budget = Budget.objects.select_for_update().filter(user=user, category=category).first()
+    if budget is not None:
+        key = (user.pk, budget.category_id, month_start(day))
+        spend = lock_spends([key]).get(key)
+        budget.spent = spend.spent if spend is not None else Decimal("0")
+    return budget
+
+
+def budgets_for_month(user, day):
+    """All of ``user``'s budgets with ``spent`` for the month containing ``day`` (one query)"""
+    return (
+        Budget.objects.filter(user=user)
+        .select_related("category")
+        .annotate(spent=_spent_subquery(month_start(day)))
+        .order_by("category__name")
+    )
+
+
+def apply_spend(user, category_id, day, delta):
+    """
+    Add ``delta`` to the month's running total for the category ``category_id``.
+
+    Call inside the same ``atomic()`` block that writes the expense.
+    """
+    month = month_start(day)
+    spends = CategorySpend.objects.filter(user=user, category_id=category_id, month=month)
+    if spends.update(spent=F("spent") + delta):
+        return
+    try:
+        with db_transaction.atomic():
+            CategorySpend.objects.create(user=user, category_id=category_id, month=month, spent=delta)
+    except IntegrityError:
+        # Another request created the row first
+        spends.update(spent=F("spent") + delta)
+
+
+def lock_spends(keys):
+    """
+    Lock and return the existing running totals for ``keys``, as ``{(user_id, category_id, month): CategorySpend}``.
+
+    Call inside the ``atomic()`` block that passes them on to ``add_spends``.
+    """
+    keys = set(keys)
+    if not keys:
+        return {}
+    rows = CategorySpend.objects.select_for_update().filter(
+        user_id__in={key[0] for key in keys},
+        category_id__in={key[1] for key in keys},
+        month__in={key[2] for key in keys},
+    ).order_by("pk")
+    return {(spend.user_id, spend.category_id, spend.month): spend for spend in rows if (spend.user_id, spend.category_id, spend.month) in keys}
+
+
+def add_spends(spends, deltas):
+    """
+    Bulk form of ``apply_spend`` for many users: one UPDATE and one INSERT.
+
+    ``deltas`` maps ``(user_id, category_id, month)`` to the amount to add,
+    and ``spends`` are the rows ``lock_spends`` returned for those keys.
+    """
+    changed, new = [], []
+    for (user_id, category_id, month), delta in deltas.items():
+        spend = spends.get((user_id, category_id, month))
+        if spend is None:
+            new.append(CategorySpend(user_id=user_id, category_id=category_id, month=month, spent=delta))
+        else:
+            spend.spent += delta
+            changed.append(spend)
+    CategorySpend.objects.bulk_update(changed, ["spent"], batch_size=1000)
+    try:
+        with db_transaction.atomic():
+            CategorySpend.objects.bulk_create(new, batch_size=1000)
+    except IntegrityError:
+        # Another request created some of these rows first
+        for spend in new:
+            rows = CategorySpend.objects.filter(user_id=spend.user_id, category_id=spend.category_id, month=spend.month)
+            if not rows.update(spent=F("spent") + spend.spent):
+                spend.save()
@@ -0,0 +1,59 @@
+"""
+Cached per-user category lists.
+
+Every page with a category dropdown needs the global categories plus the
+user's own. Those change rarely, so with a shared cache (``REDIS_URL``) the
+list is kept there and dropped when a category is saved or deleted.
+Changing a global category bumps a generation number instead, which retires
+every user's entry at once. A per-process cache would only forget the list
+in the process that saved the category, so without Redis it is read from
+the database each time; that is a single query either way.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Category
+
+GENERATION_KEY = "categories:generation"
+
+# Also bounds how long a list can outlive a lost invalidation
+CACHE_SECONDS = 60 * 60
+
+
+def _key(user_id):
+    return f"categories:{cache.get_or_set(GENERATION_KEY, 1, None)}:{user_id}"
+
+
+def user_categories(user):
+    """The global categories plus ``user``'s own, ordered by name (at most one query)"""
+    if not settings.REDIS_URL:
+        return list(Category.objects.for_user(user).order_by("name"))
+    key = _key(user.pk)
+    categories = cache.get(key)
+    if categories is None:
+        categories = list(Category.objects.for_user(user).order_by("name"))
+        cache.set(key, categories, CACHE_SECONDS)
+    return categories
+
+
+def spending_categories(user):
+    """``user_categories`` without the transfer category, for income and expense forms"""
+    return [category for category in user_categories(user) if category.name != Category.TRANSFER]
+
+
+def transfer_category(user):
+    """The global category that switches are filed under, from the cached list"""
+    return next(category for category in user_categories(user) if category.user_id is None and category.name == Category.TRANSFER)
+
+
+def invalidate_categories(user_id):
+    """Forget the cached list of ``user_id``, or of everyone when a global category changed"""
+    if not settings.REDIS_URL:
+        return
+    if user_id is None:
+        try:
+            cache.incr(GENERATION_KEY)
+        except ValueError:
+            cache.set(GENERATION_KEY, 2, None)
+    else:
+        cache.delete(_key(user_id))
@@ -0,0 +1,229 @@
+"""
+Editing and deleting transactions that are already saved.
+
+A change to an old row can overdraw a wallet at any later point in its
+history, so balances are replayed from the earliest affected date onwards
+instead of only checking today's balance, with the affected wallets
+locked until the change commits. Budget totals in
+``CategorySpend`` are adjusted by the difference between the old and new
+rows, never recomputed.
+"""
+import heapq
+import math
+from collections import defaultdict
+from operator import itemgetter
+
+from django.db import transaction as db_transaction
+from django.db.models import Min, Q, Sum
+from django.db.models.functions import TruncMonth
+
+from dashboard.models import MonthlyStatement
+
+from .balances import ZERO, lock_wallets, wallet_balances
+from .budgets import apply_spend, lock_spends, month_start
+from .models import Budget, Transaction, Wallet
+from .suggestions import forget
+from .versions import bump_version
+
+
+class LedgerError(Exception):
+    """The change was rejected; the message is shown to the user"""
+
+
+def _effects(transaction):
+    """``{wallet_id: amount}`` added to each wallet's balance by ``transaction``"""
+    if transaction.transaction_type == "INCOME":
+        return {transaction.wallet_id: transaction.amount}
+    effects = {transaction.wallet_id: -transaction.amount}
+    if transaction.transaction_type == "SWITCH":
+        effects[transaction.to_wallet_id] = transaction.amount
+    return effects
+
+
+def check_balances(user, before, after):
+    """
+    Raise ``LedgerError`` if replacing the rows ``before`` with ``after`` overdraws a wallet.
+
+    ``before`` holds the rows as they are stored and ``after`` their new
+    versions (or nothing, for deletes). Opening balances on the earliest
+    affected date come from one grouped query; the later rows of the
+    affected wallets are then replayed in (date, id) order, with and without
+    the change. A wallet fails where the change leaves it below zero and
+    lower than it was, so an existing overdraft doesn't block unrelated edits.
+    """
+    changed = list(before) + list(after)
+    if not changed:
+        return
+
+    start = min(transaction.date for transaction in changed)
+    wallet_ids = set()
+    for transaction in changed:
+        wallet_ids.update(_effects(transaction))
+    removed = {transaction.pk for transaction in before}
+
+    rows = (
+        Transaction.objects.filter(user=user, date__gte=start)
+        .filter(Q(wallet_id__in=wallet_ids) | Q(to_wallet_id__in=wallet_ids))
+        .order_by("date", "id")
+        .only("date", "transaction_type", "wallet_id", "to_wallet_id", "amount")
+    )
+    # On PostgreSQL this is a server-side cursor; it is closed below before a
+    # rejection unwinds the savepoint it was opened in
+    stored_rows = rows.iterator()
+    stored = (
+        ((row.date, row.pk), _effects(row), {} if row.pk in removed else _effects(row))
+        for row in stored_rows
+    )
+    added = sorted(
+        (((transaction.date, transaction.pk or math.inf), {}, _effects(transaction)) for transaction in after),
+        key=itemgetter(0),
+    )
+
+    old = defaultdict(lambda: ZERO, wallet_balances(user, before=start))
+    new = defaultdict(lambda: ZERO, old)
+    try:
+        for (day, _), old_effects, new_effects in heapq.merge(stored, added, key=itemgetter(0)):
+            for wallet_id in old_effects.keys() | new_effects.keys():
+                old[wallet_id] += old_effects.get(wallet_id, ZERO)
+                new[wallet_id] += new_effects.get(wallet_id, ZERO)
+                if new[wallet_id] < 0 and new[wallet_id] < old[wallet_id]:
+                    wallet = Wallet.objects.get(pk=wallet_id)
+                    raise LedgerError(
+                        f"⚠️ Insufficient {wallet.name} balance! This change would leave it at ₹{new[wallet_id]:.2f} on {day:%d %b %Y}"
+                    )
+    finally:
+        stored_rows.close()
+
+
+def _lock_affected_wallets(before, after):
+    lock_wallets(wallet_id for transaction in [*before, *after] for wallet_id in _effects(transaction))
+
+
+def _spend_deltas(before, after):
+    """Change in each (category, month) expense total when ``before`` is replaced by ``after``"""
+    deltas = defaultdict(lambda: ZERO)
+    for sign, transactions in ((-1, before), (1, after)):
+        for transaction in transactions:
+            if transaction.transaction_type == "EXPENSE":
+                deltas[transaction.category_id, month_start(transaction.date)] += sign * transaction.amount
+    return deltas
+
+
+def check_budgets(user, deltas):
+    """
+    Check the budgets that ``deltas`` would raise spending for.
+
+    Raises ``LedgerError`` if a hard budget would be exceeded and returns the
+    warning messages for soft ones.
+    """
+    increases = {key: delta for key, delta in deltas.items() if delta > 0}
+    if not increases:
+        return []
+
+    category_ids = {category_id for category_id, _ in increases}
+    # Locked until the edit commits, so concurrent writes are checked one after another
+    budgets = {
+        budget.category_id: budget
+        for budget in Budget.objects.select_for_update(of=("self",)).filter(user=user, category_id__in=category_ids)
+        .select_related("category").order_by("pk")
+    }
+    if not budgets:
+        return []
+    spends = lock_spends((user.pk, category_id, month) for category_id, month in increases if category_id in budgets)
+    spent = {(category_id, month): spend.spent for (_, category_id, month), spend in spends.items()}
+
+    warnings = []
+    for (category_id, month), delta in sorted(increases.items()):
+        budget = budgets.get(category_id)
+        current = spent.get((category_id, month), ZERO)
+        if budget and current + delta > budget.amount:
+            over_message = f"🎯 {budget.category} budget exceeded for {month:%B %Y}! Budget: ₹{budget.amount:.2f}, Spent: ₹{current:.2f}, This change: ₹{delta:.2f}"
+            if budget.hard_limit:
+                raise LedgerError(over_message)
+            warnings.append(over_message)
+    return warnings
+
+
+def _apply_spend_deltas(user, deltas):
+    for (category_id, month), delta in deltas.items():
+        if delta:
+            apply_spend(user, category_id, month, delta)
+
+
+def update_transaction(original, transaction, check=True):
+    """
+    Save the edited ``transaction`` over ``original``, its stored state.
+
+    ``original`` is None for a new row. Returns soft-budget warnings; with
+    ``check``, raises ``LedgerError`` if the edit would overdraw a wallet or
+    break a hard budget.
+    """
+    user = transaction.user
+    before = [original] if original is not None else []
+    deltas = _spend_deltas(before, [transaction])
+    warnings = []
+    with db_transaction.atomic():
+        _lock_affected_wallets(before, [transaction])
+        if check:
+            check_balances(user, before, [transaction])
+            warnings = check_budgets(user, deltas)
+        transaction.save()
+        _apply_spend_deltas(user, deltas)
+    return warnings
+
+
+def delete_transactions(user, transactions, check=True):
+    """
+    Delete ``transactions`` and take their expenses out of the budget totals.
+
+    With ``check``, raises ``LedgerError`` instead if removing them would
+    overdraw a wallet (deleting an income that later expenses relied on).
+    Returns the number of rows deleted.
+    """
+    transactions = list(transactions)
+    if not transactions:
+        return 0
+    with db_transaction.atomic():
+        _lock_affected_wallets(transactions, [])
+        if check:
+            check_balances(user, transactions, [])
+        _apply_spend_deltas(user, _spend_deltas(transactions, []))
+        Transaction.objects.filter(pk__in=[transaction.pk for transaction in transactions]).delete()
+    return len(transactions)
+
+
+def recategorize(user, ids, category):
+    """
+    Move the user's transactions ``ids`` to the ``Category`` ``category`` with a single UPDATE.
+
+    Switches keep their own category. Budget totals are moved with one
+    grouped query over the affected expenses. Returns ``(count, warnings)``;
+    raises ``LedgerError`` if a hard budget would be exceeded.
+    """
+    rows = (
+        Transaction.objects.filter(user=user, pk__in=ids)
+        .exclude(transaction_type="SWITCH")
+        .exclude(category=category)
+    )
+    with db_transaction.atomic():
+        moved = (
+            rows.filter(transaction_type="EXPENSE")
+            .annotate(month=TruncMonth("date"))
+            .order_by()
+            .values_list("category_id", "month")
+            .annotate(total=Sum("amount"))
+        )
+        deltas = defaultdict(lambda: ZERO)
+        for old_category_id, month, total in moved:
+            deltas[old_category_id, month] -= total
+            deltas[category.pk, month] += total
+
+        warnings = check_budgets(user, deltas)
+        first = rows.aggregate(first=Min("date"))["first"]
+        # update() skips pre_save, so the rows' sync sequence is stamped here
+        count = rows.update(category=category, seq=bump_version(user.pk))
+        if first is not None:
+            MonthlyStatement.objects.invalidate(user.pk, first)
+        _apply_spend_deltas(user, deltas)
+        db_transaction.on_commit(lambda: forget(user.pk))
+    return count, warnings
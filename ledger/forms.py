@@ -1,34 +1,67 @@
+import uuid
+from decimal import Decimal
+
 from django import forms
-from .models import Transaction
-
-CATEGORY_CHOICES = [
-    ('Food', 'Food'),
-    ('Snacks', 'Snacks'),
-    ('Salary', 'Salary'),
-    ('Family', 'Family'),
-    ('Friend', 'Friend'),
-    ('Rent', 'Rent'),
-    ('Travels', 'Travels'),
-    ('Home Things', 'Home Things'),
-    ("Loan","Loan"),
-    ("Purchasing","Purchasing"),
-    ('Others', 'Others'),
-]
-
-MONEY_TYPE_CHOICES = [
-    ('HAND CASH', 'Hand Cash'),
-    ('UPI CASH', 'UPI Cash'),
-]
-
-class TransactionForm(forms.ModelForm):
-    category = forms.ChoiceField(choices=CATEGORY_CHOICES, widget=forms.Select(attrs={"class": "form-control"}))
-    money_type = forms.ChoiceField(choices=MONEY_TYPE_CHOICES, widget=forms.Select(attrs={"class": "form-control"}))
+from .archive import archived_before
+from .categories import spending_categories
+from .models import Category, RecurringRule, Transaction, Wallet
+from .receipts import sniff
+
+class CategoryChoiceField(forms.ChoiceField):
+    """Choice from a cached list of ``Category`` rows, so rendering and validating need no query"""
+
+    def __init__(self, *args, categories=(), to_field="pk", **kwargs):
+        super().__init__(*args, **kwargs)
+        self.set_categories(categories, to_field)
+
+    def set_categories(self, categories, to_field="pk"):
+        self.categories = {str(getattr(category, to_field)): category for category in categories}
+        self.choices = [(key, category.name) for key, category in self.categories.items()]
+
+    def clean(self, value):
+        return self.categories.get(super().clean(value))
+
+
+class IdempotentFormMixin(forms.Form):
+    """Hidden per-render key so a resubmitted form saves at most one transaction"""
+    idempotency_key = forms.CharField(required=False, max_length=64, widget=forms.HiddenInput)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if not self.is_bound:
+            self.initial.setdefault("idempotency_key", uuid.uuid4().hex)
+
+
+class OpenPeriodMixin:
+    """Rejects dates in the archived period, which is closed to new and edited transactions"""
+    archived_before = None
+
+    def clean_date(self):
+        day = self.cleaned_data["date"]
+        if self.archived_before and day < self.archived_before:
+            raise forms.ValidationError(f"Transactions before {self.archived_before:%d %b %Y} are archived; pick a later date.")
+        return day
+
+
+class TransactionForm(OpenPeriodMixin, IdempotentFormMixin, forms.ModelForm):
+    category = CategoryChoiceField(widget=forms.Select(attrs={"class": "form-control"}))
+    wallet = forms.ModelChoiceField(queryset=Wallet.objects.none(), empty_label=None, widget=forms.Select(attrs={"class": "form-control"}))
     
+    def __init__(self, *args, user=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields["wallet"].queryset = Wallet.objects.filter(user=user).order_by("id")
+        self.fields["category"].set_categories(spending_categories(user))
+        # Transfers need a destination wallet, so they only go through SwitchForm
+        self.fields["transaction_type"].choices = [
+            choice for choice in self.fields["transaction_type"].choices if choice[0] != "SWITCH"
+        ]
+        self.archived_before = archived_before(user)
+
     class Meta:
         model = Transaction
         fields = [
             "transaction_type",
-            "money_type",
+            "wallet",
             "amount",
             "category",
             "description",
@@ -42,13 +75,218 @@ class TransactionForm(forms.ModelForm):
             "date": forms.DateInput(attrs={"type": "date", "class": "form-control"}),
         }
 
-class SwitchForm(forms.ModelForm):
+class SwitchForm(OpenPeriodMixin, IdempotentFormMixin, forms.ModelForm):
+    wallet = forms.ModelChoiceField(label="From", queryset=Wallet.objects.none(), empty_label=None, widget=forms.Select(attrs={"class": "form-control"}))
+    to_wallet = forms.ModelChoiceField(label="To", queryset=Wallet.objects.none(), empty_label=None, widget=forms.Select(attrs={"class": "form-control"}))
+
+    def __init__(self, *args, user=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        wallets = Wallet.objects.filter(user=user).order_by("id")
+        self.fields["wallet"].queryset = wallets
+        self.fields["to_wallet"].queryset = wallets
+        self.archived_before = archived_before(user)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if cleaned_data.get("wallet") and cleaned_data.get("wallet") == cleaned_data.get("to_wallet"):
+            raise forms.ValidationError("Choose two different wallets to switch between.")
+        return cleaned_data
+
     class Meta:
         model = Transaction
-        fields = ["amount", "switch_direction", "description", "date"]
+        fields = ["amount", "wallet", "to_wallet", "description", "date"]
         widgets = {
             "amount": forms.NumberInput(attrs={"class": "form-control", "step": "0.01", "placeholder": "Enter amount"}),
-            "switch_direction": forms.Select(attrs={"class": "form-control"}),
             "description": forms.Textarea(attrs={"class": "form-control", "rows": 2, "placeholder": "Optional note (e.g., ATM withdrawal, bank deposit)"}),
             "date": forms.DateInput(attrs={"type": "date", "class": "form-control"}),
         }
+
+
+class WalletForm(forms.ModelForm):
+    def __init__(self, *args, user=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.user = user
+
+    def clean_name(self):
+        name = self.cleaned_data["name"].strip()
+        if Wallet.objects.filter(user=self.user, name__iexact=name).exists():
+            raise forms.ValidationError("You already have a wallet with this name.")
+        return name
+
+    class Meta:
+        model = Wallet
+        fields = ["name", "kind"]
+        widgets = {
+            "name": forms.TextInput(attrs={"class": "form-control", "placeholder": "e.g. HDFC Savings"}),
+            "kind": forms.Select(attrs={"class": "form-control"}),
+        }
+
+
+class BudgetForm(forms.Form):
+    category = CategoryChoiceField(widget=forms.Select(attrs={"class": "form-control"}))
+    amount = forms.DecimalField(max_digits=12, decimal_places=2, min_value=0, widget=forms.NumberInput(attrs={"class": "form-control", "step": "0.01", "placeholder": "Monthly limit"}))
+    hard_limit = forms.BooleanField(required=False, label="Block expenses over this budget")
+
+    def __init__(self, *args, user=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields["category"].set_categories(spending_categories(user))
+
+
+class RecurringRuleForm(forms.ModelForm):
+    category = CategoryChoiceField(widget=forms.Select(attrs={"class": "form-control"}))
+    wallet = forms.ModelChoiceField(queryset=Wallet.objects.none(), empty_label=None, widget=forms.Select(attrs={"class": "form-control"}))
+
+    def __init__(self, *args, user=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields["wallet"].queryset = Wallet.objects.filter(user=user).order_by("id")
+        self.fields["category"].set_categories(spending_categories(user))
+        self.archived_before = archived_before(user)
+
+    def clean_start_date(self):
+        day = self.cleaned_data["start_date"]
+        if self.archived_before and day < self.archived_before:
+            raise forms.ValidationError(f"Transactions before {self.archived_before:%d %b %Y} are archived; pick a later date.")
+        return day
+
+    def clean(self):
+        cleaned_data = super().clean()
+        start_date, end_date = cleaned_data.get("start_date"), cleaned_data.get("end_date")
+        if start_date and end_date and end_date < start_date:
+            self.add_error("end_date", "The rule can't end before it starts.")
+        return cleaned_data
+
+    class Meta:
+        model = RecurringRule
+        fields = [
+            "transaction_type",
+            "wallet",
+            "amount",
+            "category",
+            "description",
+            "frequency",
+            "interval",
+            "start_date",
+            "end_date",
+        ]
+        labels = {"interval": "Every", "end_date": "Until (optional)"}
+        widgets = {
+            "transaction_type": forms.Select(attrs={"class": "form-control"}),
+            "amount": forms.NumberInput(attrs={"class": "form-control", "step": "0.01"}),
+            "description": forms.TextInput(attrs={"class": "form-control", "placeholder": "e.g. Rent, Netflix, Salary"}),
+            "frequency": forms.Select(attrs={"class": "form-control"}),
+            "interval": forms.NumberInput(attrs={"class": "form-control", "min": "1"}),
+            "start_date": forms.DateInput(attrs={"type": "date", "class": "form-control"}),
+            "end_date": forms.DateInput(attrs={"type": "date", "class": "form-control"}),
+        }
+
+
+class CategoryForm(forms.ModelForm):
+    def __init__(self, *args, user=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.user = user
+
+    def clean_name(self):
+        name = self.cleaned_data["name"].strip()
+        if Category.objects.for_user(self.user).filter(name__iexact=name).exists():
+            raise forms.ValidationError("This category already exists.")
+        return name
+
+    class Meta:
+        model = Category
+        fields = ["name"]
+        widgets = {
+            "name": forms.TextInput(attrs={"class": "form-control", "placeholder": "e.g. Gym"}),
+        }
+
+
+class ReceiptForm(forms.Form):
+    """A receipt image or PDF for one transaction, checked by its contents rather than its name"""
+    receipt = forms.FileField(widget=forms.FileInput(attrs={"accept": "image/jpeg,image/png,image/webp,application/pdf"}))
+
+    def clean_receipt(self):
+        upload = self.cleaned_data["receipt"]
+        upload.seek(0)
+        if sniff(upload.read(16)) is None:
+            raise forms.ValidationError("Attach a JPEG, PNG or WebP photo or a PDF.")
+        return upload
+
+
+class IdListField(forms.Field):
+    """A list of integer ids, from repeated form fields or a JSON array"""
+    widget = forms.MultipleHiddenInput
+
+    def __init__(self, *args, max_length=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.max_length = max_length
+
+    def to_python(self, value):
+        if not value:
+            return []
+        if not isinstance(value, (list, tuple)):
+            raise forms.ValidationError("Enter a list of ids.")
+        try:
+            ids = [int(item) for item in value]
+        except (TypeError, ValueError):
+            raise forms.ValidationError("Enter a list of ids.")
+        if self.max_length and len(ids) > self.max_length:
+            raise forms.ValidationError(f"Select at most {self.max_length} transactions at once.")
+        return ids
+
+
+class BulkActionForm(forms.Form):
+    """Delete or re-categorize the transactions ticked on the dashboard (or listed by an API client)"""
+    ACTIONS = [("recategorize", "Move to category"), ("delete", "Delete")]
+
+    action = forms.ChoiceField(choices=ACTIONS)
+    ids = IdListField(max_length=10000)
+    category = CategoryChoiceField(required=False)
+
+    def __init__(self, *args, user=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        # By name, which is how the JSON API refers to categories
+        self.fields["category"].set_categories(spending_categories(user), to_field="name")
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if cleaned_data.get("action") == "recategorize" and not cleaned_data.get("category"):
+            self.add_error("category", "This field is required.")
+        return cleaned_data
+
+
+class TransactionItemForm(OpenPeriodMixin, forms.Form):
+    """
+    One transaction posted through the JSON API, checked against the user's
+    preloaded ``wallets``, ``categories`` and archive cutoff
+    """
+    transaction_type = forms.ChoiceField(choices=Transaction.TRANSACTION_TYPE)
+    wallet = forms.IntegerField()
+    to_wallet = forms.IntegerField(required=False)
+    amount = forms.DecimalField(max_digits=12, decimal_places=2, min_value=Decimal("0.01"))
+    category = CategoryChoiceField(required=False)
+    description = forms.CharField(max_length=200, required=False)
+    date = forms.DateField()
+    idempotency_key = forms.CharField(max_length=64, required=False)
+
+    def __init__(self, *args, wallets, categories, archived_before=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.wallets = wallets
+        self.archived_before = archived_before
+        self.fields["category"].set_categories(categories, to_field="name")
+
+    def clean(self):
+        cleaned_data = super().clean()
+        wallet_id = cleaned_data.get("wallet")
+        if wallet_id is not None and wallet_id not in self.wallets:
+            self.add_error("wallet", "Unknown wallet.")
+
+        if cleaned_data.get("transaction_type") == "SWITCH":
+            to_wallet_id = cleaned_data.get("to_wallet")
+            if to_wallet_id is None:
+                self.add_error("to_wallet", "This field is required for a switch.")
+            elif to_wallet_id not in self.wallets:
+                self.add_error("to_wallet", "Unknown wallet.")
+            elif to_wallet_id == wallet_id:
+                raise forms.ValidationError("Choose two different wallets to switch between.")
+        elif cleaned_data.get("transaction_type") and "category" not in self.errors and not cleaned_data.get("category"):
+            self.add_error("category", "This field is required.")
+        return cleaned_data
@@ -0,0 +1,39 @@
+"""
+Idempotency keys for transaction posting.
+
+Forms and API clients send a key with each new transaction. The first
+request that carries it saves the row; any retry with the same key gets the
+stored transaction back instead of a duplicate, without re-running the
+balance and budget checks.
+"""
+from django.db import IntegrityError, transaction as db_transaction
+
+from .models import Transaction
+
+
+def find_original(user, key):
+    """The transaction already saved under ``key``, or None"""
+    if not key:
+        return None
+    return Transaction.objects.filter(user=user, idempotency_key=key).first()
+
+
+def save_once(transaction, on_saved=None):
+    """
+    Save ``transaction`` (and run ``on_saved`` with it) in one atomic block.
+
+    Returns ``(transaction, created)``. If a concurrent request already used
+    the same key, the unique index rejects this row and the original is
+    returned with ``created=False``.
+    """
+    try:
+        with db_transaction.atomic():
+            transaction.save()
+            if on_saved:
+                on_saved(transaction)
+        return transaction, True
+    except IntegrityError:
+        original = find_original(transaction.user, transaction.idempotency_key)
+        if original is None:
+            raise
+        return original, False
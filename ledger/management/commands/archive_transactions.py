@@ -0,0 +1,40 @@
+from datetime import date
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.models import User
+from ledger.archive import archive_cutoff, archive_user
+
+
+class Command(BaseCommand):
+    help = "Move transactions older than the archive horizon out of the live table (run monthly, e.g. from cron)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--months", type=int, default=settings.ARCHIVE_AFTER_MONTHS,
+            help="Keep this many whole months before the current one live (default ARCHIVE_AFTER_MONTHS)",
+        )
+        parser.add_argument("--user", help="Archive only this username")
+        parser.add_argument("--batch-size", type=int, default=2000, help="Rows copied and deleted per statement")
+
+    def handle(self, *args, **options):
+        # Survival and analytics compare against last month, which must stay live
+        if options["months"] < 1:
+            raise CommandError("--months must be at least 1")
+        before = archive_cutoff(date.today(), options["months"])
+
+        users = User.objects.order_by("pk")
+        if options["user"]:
+            users = users.filter(username=options["user"])
+            if not users.exists():
+                raise CommandError(f"No user named {options['user']!r}")
+
+        total = 0
+        for user in users.iterator():
+            moved = archive_user(user, before, options["batch_size"])
+            if moved:
+                self.stdout.write(f"{user.username}: archived {moved} transaction(s)")
+            total += moved
+
+        self.stdout.write(self.style.SUCCESS(f"Archived {total} transaction(s) dated before {before:%d %b %Y}"))
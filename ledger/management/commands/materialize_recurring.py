@@ -0,0 +1,32 @@
+from datetime import date
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from dashboard.jobs import enqueue_users
+from ledger.recurring import materialize_due
+
+
+class Command(BaseCommand):
+    help = "Save every due occurrence of the recurring rules as transactions (run daily, e.g. from cron)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--date", help="Materialize occurrences up to this day, YYYY-MM-DD (default today)")
+        parser.add_argument("--chunk-size", type=int, default=500, help="Users handled per database transaction")
+
+    def handle(self, *args, **options):
+        try:
+            today = date.fromisoformat(options["date"]) if options["date"] else date.today()
+        except ValueError:
+            raise CommandError("--date must be YYYY-MM-DD")
+        if options["chunk_size"] < 1:
+            raise CommandError("--chunk-size must be at least 1")
+
+        created, held, user_ids = materialize_due(today, chunk_size=options["chunk_size"])
+        if settings.PRECOMPUTE_SUMMARIES:
+            for start in range(0, len(user_ids), options["chunk_size"]):
+                enqueue_users(user_ids[start:start + options["chunk_size"]])
+
+        self.stdout.write(self.style.SUCCESS(f"Saved {created} transaction(s) for {len(user_ids)} user(s)"))
+        if held:
+            self.stdout.write(self.style.WARNING(f"Held {held} rule(s) back for an insufficient balance or a blocking budget"))
@@ -0,0 +1,19 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from ledger.receipts import prune_receipts
+
+
+class Command(BaseCommand):
+    help = "Delete stored receipts that no transaction uses any more (run daily, e.g. from cron)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--hours", type=int, default=24, help="Only prune receipts stored at least this many hours ago")
+
+    def handle(self, *args, **options):
+        if options["hours"] < 1:
+            raise CommandError("--hours must be at least 1")
+        pruned = prune_receipts(timezone.now() - timedelta(hours=options["hours"]))
+        self.stdout.write(self.style.SUCCESS(f"Deleted {pruned} unused receipt(s)"))
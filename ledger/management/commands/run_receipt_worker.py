@@ -0,0 +1,45 @@
+import multiprocessing
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from dashboard.worker import init_worker
+from ledger.receipts import claim_thumbnails, finish_thumbnail, requeue_stale_thumbnails
+from ledger.worker import render_thumbnail
+
+
+class Command(BaseCommand):
+    help = "Render thumbnails of newly attached receipts in a local process pool"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--processes", type=int, default=multiprocessing.cpu_count(), help="Number of worker processes")
+        parser.add_argument("--batch-size", type=int, default=50, help="Receipts claimed per polling round")
+        parser.add_argument("--poll-interval", type=float, default=5.0, help="Seconds to sleep when nothing is waiting")
+        parser.add_argument("--stale-after", type=int, default=600, help="Seconds after which a RUNNING thumbnail is considered abandoned")
+        parser.add_argument("--once", action="store_true", help="Drain the queue once and exit")
+
+    def handle(self, *args, **options):
+        # "spawn" keeps forked children from sharing the parent's open database connections
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=options["processes"], mp_context=context, initializer=init_worker) as pool:
+            while True:
+                requeue_stale_thumbnails(options["stale_after"])
+                receipts = claim_thumbnails(options["batch_size"])
+                if not receipts:
+                    if options["once"]:
+                        break
+                    time.sleep(options["poll_interval"])
+                    continue
+
+                futures = {receipt: pool.submit(render_thumbnail, receipt.file.name, receipt.sha256) for receipt in receipts}
+                for receipt, future in futures.items():
+                    try:
+                        name = future.result()
+                    except Exception:
+                        finish_thumbnail(receipt)
+                        self.stderr.write(f"Thumbnail failed for receipt {receipt.pk}:\n{traceback.format_exc()}")
+                    else:
+                        finish_thumbnail(receipt, name)
+                self.stdout.write(f"Rendered {len(receipts)} thumbnail(s)")
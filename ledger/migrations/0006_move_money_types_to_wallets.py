@@ -0,0 +1,49 @@
+from django.conf import settings
+from django.db import migrations
+
+# (name, kind, legacy money_type) for the two wallets every user had implicitly
+DEFAULT_WALLETS = (
+    ("Hand Cash", "CASH", "HAND CASH"),
+    ("UPI Cash", "UPI", "UPI CASH"),
+)
+
+
+def forwards(apps, schema_editor):
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split("."))
+    Wallet = apps.get_model("ledger", "Wallet")
+    Transaction = apps.get_model("ledger", "Transaction")
+
+    for user in User.objects.all().iterator():
+        wallets = {}
+        for name, kind, money_type in DEFAULT_WALLETS:
+            wallets[money_type], _ = Wallet.objects.get_or_create(user=user, name=name, defaults={"kind": kind})
+        hand, upi = wallets["HAND CASH"], wallets["UPI CASH"]
+
+        transactions = Transaction.objects.filter(user=user)
+        transactions.exclude(transaction_type="SWITCH").filter(money_type="UPI CASH").update(wallet=upi)
+        # Anything else (including rows left with a bogus money_type by 0002) was hand cash
+        transactions.exclude(transaction_type="SWITCH").exclude(money_type="UPI CASH").update(wallet=hand)
+        transactions.filter(transaction_type="SWITCH", switch_direction="UPI_TO_HAND").update(wallet=upi, to_wallet=hand)
+        transactions.filter(transaction_type="SWITCH", switch_direction="HAND_TO_UPI").update(wallet=hand, to_wallet=upi)
+        # A switch saved without a direction still needs a wallet before 0007 makes it required
+        transactions.filter(transaction_type="SWITCH", switch_direction__isnull=True).update(wallet=hand, to_wallet=upi)
+
+
+def backwards(apps, schema_editor):
+    Transaction = apps.get_model("ledger", "Transaction")
+
+    Transaction.objects.exclude(transaction_type="SWITCH").filter(wallet__kind="UPI").update(money_type="UPI CASH")
+    Transaction.objects.exclude(transaction_type="SWITCH").exclude(wallet__kind="UPI").update(money_type="HAND CASH")
+    Transaction.objects.filter(transaction_type="SWITCH", wallet__kind="UPI").update(switch_direction="UPI_TO_HAND")
+    Transaction.objects.filter(transaction_type="SWITCH").exclude(wallet__kind="UPI").update(switch_direction="HAND_TO_UPI")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ledger", "0005_wallet_transaction_wallet_transaction_to_wallet"),
+    ]
+
+    operations = [
+        migrations.RunPython(forwards, backwards),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ledger", "0006_move_money_types_to_wallets"),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name="transaction",
+            name="money_type",
+        ),
+        migrations.RemoveField(
+            model_name="transaction",
+            name="switch_direction",
+        ),
+        migrations.AlterField(
+            model_name="transaction",
+            name="wallet",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="transactions",
+                to="ledger.wallet",
+            ),
+        ),
+    ]
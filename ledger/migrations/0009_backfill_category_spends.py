@@ -0,0 +1,38 @@
+from django.db import migrations
+from django.db.models import Sum
+from django.db.models.functions import TruncMonth
+
+
+def forwards(apps, schema_editor):
+    Transaction = apps.get_model("ledger", "Transaction")
+    CategorySpend = apps.get_model("ledger", "CategorySpend")
+
+    totals = (
+        Transaction.objects.filter(transaction_type="EXPENSE")
+        .annotate(month=TruncMonth("date"))
+        .order_by()
+        .values("user_id", "category", "month")
+        .annotate(total=Sum("amount"))
+    )
+    CategorySpend.objects.bulk_create(
+        [
+            CategorySpend(user_id=row["user_id"], category=row["category"], month=row["month"], spent=row["total"])
+            for row in totals
+        ],
+        batch_size=1000,
+    )
+
+
+def backwards(apps, schema_editor):
+    apps.get_model("ledger", "CategorySpend").objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ledger", "0008_budget_categoryspend"),
+    ]
+
+    operations = [
+        migrations.RunPython(forwards, backwards),
+    ]
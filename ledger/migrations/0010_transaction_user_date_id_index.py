@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:37
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ledger", "0009_backfill_category_spends"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="transaction",
+            index=models.Index(
+                fields=["user", "date", "id"], name="ledger_txn_user_date_id_idx"
+            ),
+        ),
+    ]
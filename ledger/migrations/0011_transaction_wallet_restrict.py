@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ledger", "0010_transaction_user_date_id_index"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="transaction",
+            name="to_wallet",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.RESTRICT,
+                related_name="incoming_transfers",
+                to="ledger.wallet",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="transaction",
+            name="wallet",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.RESTRICT,
+                related_name="transactions",
+                to="ledger.wallet",
+            ),
+        ),
+    ]
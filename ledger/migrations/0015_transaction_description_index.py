@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:55
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ledger", "0014_transaction_seq_tombstone"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="transaction",
+            index=models.Index(
+                fields=["description"],
+                name="ledger_txn_description_idx",
+                opclasses=["varchar_pattern_ops"],
+            ),
+        ),
+    ]
@@ -0,0 +1,70 @@
+from django.db import migrations
+
+# The SQL is copied here rather than imported from ledger.search, so this
+# migration keeps working when the live definitions change
+
+SQLITE_FORWARDS = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS ledger_transaction_fts
+    USING fts5(description, category, tokenize = 'unicode61 remove_diacritics 2')
+    """,
+    """
+    INSERT INTO ledger_transaction_fts (rowid, description, category)
+    SELECT id, description, category FROM ledger_transaction
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS ledger_transaction_fts_insert AFTER INSERT ON ledger_transaction BEGIN
+        INSERT INTO ledger_transaction_fts (rowid, description, category)
+        VALUES (new.id, new.description, new.category);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS ledger_transaction_fts_update AFTER UPDATE OF description, category ON ledger_transaction BEGIN
+        UPDATE ledger_transaction_fts SET description = new.description, category = new.category
+        WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS ledger_transaction_fts_delete AFTER DELETE ON ledger_transaction BEGIN
+        DELETE FROM ledger_transaction_fts WHERE rowid = old.id;
+    END
+    """,
+]
+
+SQLITE_BACKWARDS = [
+    "DROP TRIGGER IF EXISTS ledger_transaction_fts_insert",
+    "DROP TRIGGER IF EXISTS ledger_transaction_fts_update",
+    "DROP TRIGGER IF EXISTS ledger_transaction_fts_delete",
+    "DROP TABLE IF EXISTS ledger_transaction_fts",
+]
+
+POSTGRES_FORWARDS = [
+    "CREATE INDEX IF NOT EXISTS ledger_txn_search_idx ON ledger_transaction USING GIN "
+    "(to_tsvector('simple', coalesce(description, '') || ' ' || coalesce(category, '')))",
+]
+
+POSTGRES_BACKWARDS = ["DROP INDEX IF EXISTS ledger_txn_search_idx"]
+
+
+def _run(schema_editor, statements):
+    for statement in statements.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(statement)
+
+
+def forwards(apps, schema_editor):
+    _run(schema_editor, {"sqlite": SQLITE_FORWARDS, "postgresql": POSTGRES_FORWARDS})
+
+
+def backwards(apps, schema_editor):
+    _run(schema_editor, {"sqlite": SQLITE_BACKWARDS, "postgresql": POSTGRES_BACKWARDS})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ledger", "0015_transaction_description_index"),
+    ]
+
+    operations = [
+        migrations.RunPython(forwards, backwards),
+    ]
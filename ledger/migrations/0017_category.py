@@ -0,0 +1,141 @@
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+# Unapplying this migration rebuilds ledger_transaction on SQLite, which
+# drops its triggers, so the ones from 0016 are put back at the end
+SQLITE_TEXT_TRIGGERS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS ledger_transaction_fts_insert AFTER INSERT ON ledger_transaction BEGIN
+        INSERT INTO ledger_transaction_fts (rowid, description, category)
+        VALUES (new.id, new.description, new.category);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS ledger_transaction_fts_update AFTER UPDATE OF description, category ON ledger_transaction BEGIN
+        UPDATE ledger_transaction_fts SET description = new.description, category = new.category
+        WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS ledger_transaction_fts_delete AFTER DELETE ON ledger_transaction BEGIN
+        DELETE FROM ledger_transaction_fts WHERE rowid = old.id;
+    END
+    """,
+]
+
+
+def restore_text_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor == "sqlite":
+        for statement in SQLITE_TEXT_TRIGGERS:
+            schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ledger", "0016_transaction_search"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, restore_text_triggers),
+        migrations.CreateModel(
+            name="Category",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=50)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "user",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="categories",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name_plural": "categories",
+                "constraints": [
+                    models.UniqueConstraint(
+                        condition=models.Q(("user__isnull", True)),
+                        fields=("name",),
+                        name="unique_global_category_name",
+                    ),
+                    models.UniqueConstraint(
+                        condition=models.Q(("user__isnull", False)),
+                        fields=("user", "name"),
+                        name="unique_category_name_per_user",
+                    ),
+                ],
+            },
+        ),
+        # Filled by 0018, then swapped in for the text columns by 0019
+        migrations.AddField(
+            model_name="transaction",
+            name="category_ref",
+            field=models.ForeignKey(
+                null=True,
+                on_delete=django.db.models.deletion.RESTRICT,
+                related_name="+",
+                to="ledger.category",
+            ),
+        ),
+        migrations.AddField(
+            model_name="budget",
+            name="category_ref",
+            field=models.ForeignKey(
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="+",
+                to="ledger.category",
+            ),
+        ),
+        migrations.AddField(
+            model_name="categoryspend",
+            name="category_ref",
+            field=models.ForeignKey(
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="+",
+                to="ledger.category",
+            ),
+        ),
+        # Until 0019 drops them, the old text columns get a default so that
+        # unapplying 0019 can add them back before 0018 refills them
+        migrations.AlterField(
+            model_name="transaction",
+            name="category",
+            field=models.CharField(default="", max_length=50),
+        ),
+        migrations.AlterField(
+            model_name="budget",
+            name="category",
+            field=models.CharField(default="", max_length=50),
+        ),
+        migrations.AlterField(
+            model_name="categoryspend",
+            name="category",
+            field=models.CharField(default="", max_length=50),
+        ),
+        # Re-added over the foreign keys by 0019
+        migrations.RemoveConstraint(
+            model_name="budget",
+            name="unique_budget_per_category",
+        ),
+        migrations.RemoveConstraint(
+            model_name="categoryspend",
+            name="unique_category_spend_per_month",
+        ),
+    ]
@@ -0,0 +1,68 @@
+from django.db import migrations
+
+# The categories the app shipped with, as of this migration
+DEFAULT_CATEGORIES = [
+    "Food",
+    "Snacks",
+    "Salary",
+    "Family",
+    "Friend",
+    "Rent",
+    "Travels",
+    "Home Things",
+    "Loan",
+    "Purchasing",
+    "Others",
+    "Money Transfer",
+]
+
+MODELS = ("Transaction", "Budget", "CategorySpend")
+
+
+def forwards(apps, schema_editor):
+    Category = apps.get_model("ledger", "Category")
+    Category.objects.bulk_create([Category(name=name) for name in DEFAULT_CATEGORIES])
+    global_ids = dict(Category.objects.filter(user__isnull=True).values_list("name", "id"))
+
+    # Any other name becomes a custom category of the user who used it
+    custom = set()
+    for model_name in MODELS:
+        rows = apps.get_model("ledger", model_name).objects.exclude(category__in=global_ids)
+        custom.update(rows.values_list("user_id", "category").distinct())
+    Category.objects.bulk_create(
+        [Category(user_id=user_id, name=name) for user_id, name in sorted(custom)],
+        batch_size=1000,
+    )
+    custom_ids = {
+        (user_id, name): category_id
+        for category_id, user_id, name in Category.objects.filter(user__isnull=False).values_list("id", "user_id", "name")
+    }
+
+    # One UPDATE per distinct name (and per user, for custom names)
+    for model_name in MODELS:
+        objects = apps.get_model("ledger", model_name).objects
+        for name, category_id in global_ids.items():
+            objects.filter(category=name).update(category_ref_id=category_id)
+        for (user_id, name), category_id in custom_ids.items():
+            objects.filter(user_id=user_id, category=name).update(category_ref_id=category_id)
+
+
+def backwards(apps, schema_editor):
+    for category in apps.get_model("ledger", "Category").objects.all():
+        for model_name in MODELS:
+            apps.get_model("ledger", model_name).objects.filter(category_ref_id=category.id).update(category=category.name)
+    # The rows are filled in again on the way forward, so they must not be left behind
+    for model_name in MODELS:
+        apps.get_model("ledger", model_name).objects.update(category_ref=None)
+    apps.get_model("ledger", "Category").objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ledger", "0017_category"),
+    ]
+
+    operations = [
+        migrations.RunPython(forwards, backwards),
+    ]
@@ -0,0 +1,190 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+# The search triggers read the text column, so they are dropped before it
+# goes and re-created against category_id afterwards. The SQL is copied here
+# rather than imported from ledger.search, like in 0016.
+
+SQLITE_DROP = [
+    "DROP TRIGGER IF EXISTS ledger_transaction_fts_insert",
+    "DROP TRIGGER IF EXISTS ledger_transaction_fts_update",
+    "DROP TRIGGER IF EXISTS ledger_transaction_fts_delete",
+    "DROP TRIGGER IF EXISTS ledger_category_fts_rename",
+]
+
+SQLITE_TEXT_TRIGGERS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS ledger_transaction_fts_insert AFTER INSERT ON ledger_transaction BEGIN
+        INSERT INTO ledger_transaction_fts (rowid, description, category)
+        VALUES (new.id, new.description, new.category);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS ledger_transaction_fts_update AFTER UPDATE OF description, category ON ledger_transaction BEGIN
+        UPDATE ledger_transaction_fts SET description = new.description, category = new.category
+        WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS ledger_transaction_fts_delete AFTER DELETE ON ledger_transaction BEGIN
+        DELETE FROM ledger_transaction_fts WHERE rowid = old.id;
+    END
+    """,
+]
+
+SQLITE_FOREIGN_KEY_TRIGGERS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS ledger_transaction_fts_insert AFTER INSERT ON ledger_transaction BEGIN
+        INSERT INTO ledger_transaction_fts (rowid, description, category)
+        VALUES (new.id, new.description, (SELECT name FROM ledger_category WHERE id = new.category_id));
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS ledger_transaction_fts_update AFTER UPDATE OF description, category_id ON ledger_transaction BEGIN
+        UPDATE ledger_transaction_fts
+        SET description = new.description, category = (SELECT name FROM ledger_category WHERE id = new.category_id)
+        WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS ledger_transaction_fts_delete AFTER DELETE ON ledger_transaction BEGIN
+        DELETE FROM ledger_transaction_fts WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS ledger_category_fts_rename AFTER UPDATE OF name ON ledger_category BEGIN
+        UPDATE ledger_transaction_fts SET category = new.name
+        WHERE rowid IN (SELECT id FROM ledger_transaction WHERE category_id = new.id);
+    END
+    """,
+]
+
+# Category names are matched through the category table from now on, so
+# the index only covers descriptions
+POSTGRES_DROP = ["DROP INDEX IF EXISTS ledger_txn_search_idx"]
+
+POSTGRES_TEXT_INDEX = [
+    "CREATE INDEX IF NOT EXISTS ledger_txn_search_idx ON ledger_transaction USING GIN "
+    "(to_tsvector('simple', coalesce(description, '') || ' ' || coalesce(category, '')))",
+]
+
+POSTGRES_FOREIGN_KEY_INDEX = [
+    "CREATE INDEX IF NOT EXISTS ledger_txn_search_idx ON ledger_transaction USING GIN "
+    "(to_tsvector('simple', coalesce(description, '')))",
+]
+
+
+def _run(schema_editor, statements):
+    for statement in statements.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(statement)
+
+
+def drop_text_search(apps, schema_editor):
+    _run(schema_editor, {"sqlite": SQLITE_DROP, "postgresql": POSTGRES_DROP})
+
+
+def create_text_search(apps, schema_editor):
+    _run(
+        schema_editor,
+        {"sqlite": SQLITE_TEXT_TRIGGERS, "postgresql": POSTGRES_TEXT_INDEX},
+    )
+
+
+def create_foreign_key_search(apps, schema_editor):
+    _run(
+        schema_editor,
+        {
+            "sqlite": SQLITE_FOREIGN_KEY_TRIGGERS,
+            "postgresql": POSTGRES_FOREIGN_KEY_INDEX,
+        },
+    )
+
+
+def drop_foreign_key_search(apps, schema_editor):
+    _run(schema_editor, {"sqlite": SQLITE_DROP, "postgresql": POSTGRES_DROP})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ledger", "0018_fill_categories"),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_text_search, create_text_search),
+        migrations.RemoveField(
+            model_name="transaction",
+            name="category",
+        ),
+        migrations.RemoveField(
+            model_name="budget",
+            name="category",
+        ),
+        migrations.RemoveField(
+            model_name="categoryspend",
+            name="category",
+        ),
+        migrations.RenameField(
+            model_name="transaction",
+            old_name="category_ref",
+            new_name="category",
+        ),
+        migrations.RenameField(
+            model_name="budget",
+            old_name="category_ref",
+            new_name="category",
+        ),
+        migrations.RenameField(
+            model_name="categoryspend",
+            old_name="category_ref",
+            new_name="category",
+        ),
+        migrations.AlterField(
+            model_name="transaction",
+            name="category",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.RESTRICT,
+                related_name="transactions",
+                to="ledger.category",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="budget",
+            name="category",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="budgets",
+                to="ledger.category",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="categoryspend",
+            name="category",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="spends",
+                to="ledger.category",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="budget",
+            constraint=models.UniqueConstraint(
+                fields=("user", "category"), name="unique_budget_per_category"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="categoryspend",
+            constraint=models.UniqueConstraint(
+                fields=("user", "category", "month"),
+                name="unique_category_spend_per_month",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="transaction",
+            index=models.Index(
+                fields=["user", "category", "date", "id"],
+                name="ledger_txn_user_cat_date_idx",
+            ),
+        ),
+        migrations.RunPython(create_foreign_key_search, drop_foreign_key_search),
+    ]
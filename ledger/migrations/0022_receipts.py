@@ -0,0 +1,97 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ledger", "0021_recurring_rules"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Receipt",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("sha256", models.CharField(max_length=64, unique=True)),
+                ("file", models.FileField(max_length=200, upload_to="")),
+                (
+                    "content_type",
+                    models.CharField(
+                        choices=[
+                            ("image/jpeg", "JPEG image"),
+                            ("image/png", "PNG image"),
+                            ("image/webp", "WebP image"),
+                            ("application/pdf", "PDF"),
+                        ],
+                        max_length=30,
+                    ),
+                ),
+                ("size", models.PositiveBigIntegerField()),
+                (
+                    "thumbnail",
+                    models.FileField(blank=True, max_length=200, upload_to=""),
+                ),
+                (
+                    "thumbnail_status",
+                    models.CharField(
+                        choices=[
+                            ("PENDING", "Pending"),
+                            ("RUNNING", "Running"),
+                            ("DONE", "Done"),
+                            ("NONE", "No thumbnail"),
+                            ("FAILED", "Failed"),
+                        ],
+                        default="PENDING",
+                        max_length=10,
+                    ),
+                ),
+                ("claimed_at", models.DateTimeField(blank=True, null=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        condition=models.Q(
+                            ("thumbnail_status__in", ["PENDING", "RUNNING"])
+                        ),
+                        fields=["thumbnail_status", "created_at"],
+                        name="ledger_receipt_pending_idx",
+                    )
+                ],
+            },
+        ),
+        migrations.AddField(
+            model_name="archivedtransaction",
+            name="receipt",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="archived_transactions",
+                to="ledger.receipt",
+            ),
+        ),
+        migrations.AddField(
+            model_name="transaction",
+            name="receipt",
+            field=models.ForeignKey(
+                blank=True,
+                editable=False,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="transactions",
+                to="ledger.receipt",
+            ),
+        ),
+    ]
@@ -0,0 +1,99 @@
+from django.db import migrations
+
+# Search results are narrowed to one user inside the FTS5 subquery, so the
+# table gets an unindexed user_id column. FTS5 tables can't be altered, so it
+# is rebuilt with its triggers. The SQL is copied here rather than imported
+# from ledger.search, like in 0016. The category rename trigger would block
+# later rebuilds of ledger_transaction in the same run, so it is left to
+# ensure_triggers, which puts it back after every migrate.
+
+SQLITE_DROP = [
+    "DROP TRIGGER IF EXISTS ledger_transaction_fts_insert",
+    "DROP TRIGGER IF EXISTS ledger_transaction_fts_update",
+    "DROP TRIGGER IF EXISTS ledger_transaction_fts_delete",
+    "DROP TRIGGER IF EXISTS ledger_category_fts_rename",
+    "DROP TABLE IF EXISTS ledger_transaction_fts",
+]
+
+SQLITE_FORWARDS = [
+    """
+    CREATE VIRTUAL TABLE ledger_transaction_fts
+    USING fts5(description, category, user_id UNINDEXED, tokenize = 'unicode61 remove_diacritics 2')
+    """,
+    """
+    INSERT INTO ledger_transaction_fts (rowid, description, category, user_id)
+    SELECT t.id, t.description, c.name, t.user_id FROM ledger_transaction t JOIN ledger_category c ON c.id = t.category_id
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS ledger_transaction_fts_insert AFTER INSERT ON ledger_transaction BEGIN
+        INSERT INTO ledger_transaction_fts (rowid, description, category, user_id)
+        VALUES (new.id, new.description, (SELECT name FROM ledger_category WHERE id = new.category_id), new.user_id);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS ledger_transaction_fts_update AFTER UPDATE OF description, category_id ON ledger_transaction BEGIN
+        UPDATE ledger_transaction_fts
+        SET description = new.description, category = (SELECT name FROM ledger_category WHERE id = new.category_id)
+        WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS ledger_transaction_fts_delete AFTER DELETE ON ledger_transaction BEGIN
+        DELETE FROM ledger_transaction_fts WHERE rowid = old.id;
+    END
+    """,
+]
+
+SQLITE_BACKWARDS = [
+    """
+    CREATE VIRTUAL TABLE ledger_transaction_fts
+    USING fts5(description, category, tokenize = 'unicode61 remove_diacritics 2')
+    """,
+    """
+    INSERT INTO ledger_transaction_fts (rowid, description, category)
+    SELECT t.id, t.description, c.name FROM ledger_transaction t JOIN ledger_category c ON c.id = t.category_id
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS ledger_transaction_fts_insert AFTER INSERT ON ledger_transaction BEGIN
+        INSERT INTO ledger_transaction_fts (rowid, description, category)
+        VALUES (new.id, new.description, (SELECT name FROM ledger_category WHERE id = new.category_id));
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS ledger_transaction_fts_update AFTER UPDATE OF description, category_id ON ledger_transaction BEGIN
+        UPDATE ledger_transaction_fts
+        SET description = new.description, category = (SELECT name FROM ledger_category WHERE id = new.category_id)
+        WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS ledger_transaction_fts_delete AFTER DELETE ON ledger_transaction BEGIN
+        DELETE FROM ledger_transaction_fts WHERE rowid = old.id;
+    END
+    """,
+]
+
+
+def _run(schema_editor, statements):
+    if schema_editor.connection.vendor == "sqlite":
+        for statement in statements:
+            schema_editor.execute(statement)
+
+
+def forwards(apps, schema_editor):
+    _run(schema_editor, SQLITE_DROP + SQLITE_FORWARDS)
+
+
+def backwards(apps, schema_editor):
+    _run(schema_editor, SQLITE_DROP + SQLITE_BACKWARDS)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ledger", "0022_receipts"),
+    ]
+
+    operations = [
+        migrations.RunPython(forwards, backwards),
+    ]
@@ -1,8 +1,144 @@
-from django.db import models
+from decimal import Decimal
 
-# Create your models here.
 from django.conf import settings
-from django.db import models
+from django.core.validators import MinValueValidator
+from django.db import models, transaction as db_transaction
+
+
+class WalletManager(models.Manager):
+    DEFAULT_WALLETS = (
+        ("Hand Cash", "CASH"),
+        ("UPI Cash", "UPI"),
+    )
+
+    def create_defaults(self, user):
+        """Give a new user the two wallets every account started with"""
+        return [
+            self.get_or_create(user=user, name=name, defaults={"kind": kind})[0]
+            for name, kind in self.DEFAULT_WALLETS
+        ]
+
+
+class Wallet(models.Model):
+    """
+    A place a user keeps money: cash in hand, a UPI app, a bank account or a card
+    """
+    KIND = (
+        ("CASH", "Cash"),
+        ("UPI", "UPI"),
+        ("BANK", "Bank Account"),
+        ("CARD", "Card"),
+    )
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="wallets"
+    )
+    name = models.CharField(max_length=50)
+    kind = models.CharField(max_length=10, choices=KIND, default="CASH")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = WalletManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "name"], name="unique_wallet_name_per_user"),
+        ]
+
+    def __str__(self):
+        return self.name
+
+
+class CategoryQuerySet(models.QuerySet):
+    def for_user(self, user):
+        """The global categories plus ``user``'s own"""
+        return self.filter(models.Q(user__isnull=True) | models.Q(user=user))
+
+
+class Category(models.Model):
+    """
+    A transaction category: a global default when ``user`` is empty, otherwise one a user added
+    """
+    # Global category that every switch is filed under
+    TRANSFER = "Money Transfer"
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="categories",
+        blank=True,
+        null=True
+    )
+    name = models.CharField(max_length=50)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = CategoryQuerySet.as_manager()
+
+    class Meta:
+        verbose_name_plural = "categories"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["name"],
+                condition=models.Q(user__isnull=True),
+                name="unique_global_category_name",
+            ),
+            models.UniqueConstraint(
+                fields=["user", "name"],
+                condition=models.Q(user__isnull=False),
+                name="unique_category_name_per_user",
+            ),
+        ]
+
+    def __str__(self):
+        return self.name
+
+
+class Receipt(models.Model):
+    """
+    A receipt image or PDF, stored once per distinct content.
+
+    Files are named by their SHA-256, so a receipt attached to several
+    transactions, or uploaded twice, is kept once. The thumbnail is made
+    outside the request by ``manage.py run_receipt_worker``; PDFs get none.
+    """
+    CONTENT_TYPE = (
+        ("image/jpeg", "JPEG image"),
+        ("image/png", "PNG image"),
+        ("image/webp", "WebP image"),
+        ("application/pdf", "PDF"),
+    )
+    THUMBNAIL_STATUS = (
+        ("PENDING", "Pending"),
+        ("RUNNING", "Running"),
+        ("DONE", "Done"),
+        ("NONE", "No thumbnail"),
+        ("FAILED", "Failed"),
+    )
+
+    sha256 = models.CharField(max_length=64, unique=True)
+    file = models.FileField(max_length=200)
+    content_type = models.CharField(max_length=30, choices=CONTENT_TYPE)
+    size = models.PositiveBigIntegerField()
+    thumbnail = models.FileField(max_length=200, blank=True)
+    thumbnail_status = models.CharField(max_length=10, choices=THUMBNAIL_STATUS, default="PENDING")
+    # When a worker claimed the thumbnail, so a claim left by a crashed worker can be retried
+    claimed_at = models.DateTimeField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # Receipts waiting for the thumbnail worker
+            models.Index(
+                fields=["thumbnail_status", "created_at"],
+                name="ledger_receipt_pending_idx",
+                condition=models.Q(thumbnail_status__in=["PENDING", "RUNNING"]),
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.get_content_type_display()} {self.sha256[:12]}"
+
 
 class Transaction(models.Model):
     TRANSACTION_TYPE = (
@@ -11,30 +147,335 @@ class Transaction(models.Model):
         ("SWITCH", "Switch"),
     )
 
-    MONEY_TYPE = (
-        ("HAND CASH", "Hand Cash"),
-        ("UPI CASH", "UPI Cash")
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="transactions"
     )
 
-    SWITCH_DIRECTION = (
-        ("UPI_TO_HAND", "UPI to Hand"),
-        ("HAND_TO_UPI", "Hand to UPI"),
+    transaction_type = models.CharField(max_length=10, choices=TRANSACTION_TYPE)
+    # Income/expense wallet, or the source wallet of a switch
+    wallet = models.ForeignKey(Wallet, on_delete=models.RESTRICT, related_name="transactions")
+    # Destination wallet, only set for switches
+    to_wallet = models.ForeignKey(
+        Wallet,
+        on_delete=models.RESTRICT,
+        related_name="incoming_transfers",
+        blank=True,
+        null=True
     )
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    category = models.ForeignKey(Category, on_delete=models.RESTRICT, related_name="transactions")
+    description = models.CharField(max_length=200, blank=True)
+    date = models.DateField()
+    # Client-supplied key that makes retried submissions save only once
+    idempotency_key = models.CharField(max_length=64, blank=True, null=True, editable=False)
+    # User's ledger version at the last write to this row; the sync feed reads changes by it
+    seq = models.PositiveBigIntegerField(default=0, editable=False)
+    # The rule this row was materialized from, if any
+    recurring_rule = models.ForeignKey(
+        "RecurringRule",
+        on_delete=models.SET_NULL,
+        related_name="transactions",
+        blank=True,
+        null=True,
+        editable=False
+    )
+    receipt = models.ForeignKey(
+        Receipt,
+        on_delete=models.SET_NULL,
+        related_name="transactions",
+        blank=True,
+        null=True,
+        editable=False
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # Ledger order used by the transaction list and running balances
+            models.Index(fields=["user", "date", "id"], name="ledger_txn_user_date_id_idx"),
+            models.Index(fields=["user", "seq", "id"], name="ledger_txn_user_seq_id_idx"),
+            # Category filter on the transaction list, in ledger order
+            models.Index(fields=["user", "category", "date", "id"], name="ledger_txn_user_cat_date_idx"),
+            # Prefix search in the admin; the operator class lets PostgreSQL use it for LIKE 'term%'
+            models.Index(fields=["description"], name="ledger_txn_description_idx", opclasses=["varchar_pattern_ops"]),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "idempotency_key"],
+                condition=models.Q(idempotency_key__isnull=False),
+                name="unique_txn_idempotency_key_per_user",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - ₹{self.amount}"
 
+    def save(self, *args, **kwargs):
+        # pre_save takes the next ledger version as ``seq``; doing that in the same
+        # database transaction as the write keeps seq order equal to commit order
+        with db_transaction.atomic():
+            super().save(*args, **kwargs)
+
+
+class Tombstone(models.Model):
+    """
+    Marker left behind by a deleted transaction so sync clients can drop their copy
+    """
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
-        related_name="transactions"
+        related_name="tombstones"
+    )
+    transaction_id = models.BigIntegerField()
+    seq = models.PositiveBigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "seq", "id"], name="ledger_tomb_user_seq_id_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - deleted #{self.transaction_id}"
+
+
+class Budget(models.Model):
+    """
+    Monthly spending limit for one expense category
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="budgets"
     )
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name="budgets")
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    # Block expenses that would go over the limit instead of only warning
+    hard_limit = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "category"], name="unique_budget_per_category"),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.category}: ₹{self.amount}"
+
 
+class CategorySpend(models.Model):
+    """
+    Running total of a user's expenses in one category for one month.
+
+    Updated in the same database transaction as every expense, so budget
+    checks and budget-vs-actual never have to scan the month's transactions.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="category_spends"
+    )
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name="spends")
+    # First day of the month
+    month = models.DateField()
+    spent = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "category", "month"], name="unique_category_spend_per_month"),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.category} {self.month:%b %Y}: ₹{self.spent}"
+
+
+class RecurringRule(models.Model):
+    """
+    A scheduled income or expense, such as salary, rent or a subscription.
+
+    ``manage.py materialize_recurring`` saves each occurrence as a
+    transaction once its date arrives. ``next_date`` is the first occurrence
+    not saved yet; it is empty once the rule has ended.
+    """
+    TRANSACTION_TYPE = (
+        ("INCOME", "Income"),
+        ("EXPENSE", "Expense"),
+    )
+    FREQUENCY = (
+        ("DAILY", "Daily"),
+        ("WEEKLY", "Weekly"),
+        ("MONTHLY", "Monthly"),
+        ("YEARLY", "Yearly"),
+    )
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="recurring_rules"
+    )
     transaction_type = models.CharField(max_length=10, choices=TRANSACTION_TYPE)
-    money_type = models.CharField(max_length=20, choices=MONEY_TYPE, default="HAND CASH")
-    switch_direction = models.CharField(max_length=20, choices=SWITCH_DIRECTION, blank=True, null=True)
+    wallet = models.ForeignKey(Wallet, on_delete=models.CASCADE, related_name="recurring_rules")
+    amount = models.DecimalField(max_digits=12, decimal_places=2, validators=[MinValueValidator(Decimal("0.01"))])
+    category = models.ForeignKey(Category, on_delete=models.RESTRICT, related_name="recurring_rules")
+    description = models.CharField(max_length=200, blank=True)
+    frequency = models.CharField(max_length=10, choices=FREQUENCY, default="MONTHLY")
+    # Every ``interval`` days, weeks, months or years
+    interval = models.PositiveSmallIntegerField(default=1, validators=[MinValueValidator(1)])
+    # Monthly and yearly rules fall on this day of the month, or the month's last day
+    start_date = models.DateField()
+    end_date = models.DateField(blank=True, null=True)
+    next_date = models.DateField(blank=True, null=True, editable=False)
+    active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # Due rules, for the materialization job
+            models.Index(fields=["next_date"], name="ledger_rule_next_date_idx", condition=models.Q(active=True)),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.get_frequency_display()} {self.transaction_type.lower()} ₹{self.amount}"
+
+
+class LedgerVersion(models.Model):
+    """
+    Per-user write counter, bumped whenever a transaction, wallet or budget changes.
+
+    Lets read-only views build cache validators without touching the ledger.
+    """
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="ledger_version"
+    )
+    version = models.PositiveBigIntegerField(default=0)
+    changed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.user.username} v{self.version}"
+
+
+class LedgerArchive(models.Model):
+    """
+    How far back a user's transactions have been moved to ``ArchivedTransaction``.
+
+    Every transaction dated before ``archived_before`` is archived, and that
+    period is closed to new or edited transactions.
+    """
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="ledger_archive"
+    )
+    # First day of the oldest month still in the live table
+    archived_before = models.DateField()
+    archived_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.user.username} archived before {self.archived_before:%b %Y}"
+
+
+class ArchivedTransaction(models.Model):
+    """
+    A transaction moved out of the live table by ``manage.py archive_transactions``.
+
+    Keeps the original id and fields, so archived rows can still be searched
+    and exported; balances and totals read ``MonthlySummary`` and
+    ``OpeningBalance`` instead.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="archived_transactions"
+    )
+    transaction_type = models.CharField(max_length=10, choices=Transaction.TRANSACTION_TYPE)
+    wallet = models.ForeignKey(Wallet, on_delete=models.RESTRICT, related_name="archived_transactions")
+    to_wallet = models.ForeignKey(
+        Wallet,
+        on_delete=models.RESTRICT,
+        related_name="archived_incoming_transfers",
+        blank=True,
+        null=True
+    )
     amount = models.DecimalField(max_digits=12, decimal_places=2)
-    category = models.CharField(max_length=50)
+    category = models.ForeignKey(Category, on_delete=models.RESTRICT, related_name="archived_transactions")
     description = models.CharField(max_length=200, blank=True)
     date = models.DateField()
-    created_at = models.DateTimeField(auto_now_add=True)
+    idempotency_key = models.CharField(max_length=64, blank=True, null=True)
+    seq = models.PositiveBigIntegerField(default=0)
+    receipt = models.ForeignKey(
+        Receipt,
+        on_delete=models.SET_NULL,
+        related_name="archived_transactions",
+        blank=True,
+        null=True
+    )
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "date", "id"], name="ledger_arch_user_date_id_idx"),
+        ]
 
     def __str__(self):
-        return f"{self.user.username} - ₹{self.amount}"
+        return f"{self.user.username} - ₹{self.amount} (archived)"
+
+
+class MonthlySummary(models.Model):
+    """
+    Total and count of a user's archived transactions in one month, per type, wallet and category.
+
+    Fields are named like ``Transaction``'s, so the same filters and
+    ``Sum("amount")`` aggregates work on either table.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="monthly_summaries"
+    )
+    # First day of the month
+    month = models.DateField()
+    transaction_type = models.CharField(max_length=10, choices=Transaction.TRANSACTION_TYPE)
+    wallet = models.ForeignKey(Wallet, on_delete=models.CASCADE, related_name="monthly_summaries")
+    to_wallet = models.ForeignKey(
+        Wallet,
+        on_delete=models.CASCADE,
+        related_name="incoming_monthly_summaries",
+        blank=True,
+        null=True
+    )
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name="monthly_summaries")
+    amount = models.DecimalField(max_digits=14, decimal_places=2)
+    count = models.PositiveIntegerField()
+
+    class Meta:
+        verbose_name_plural = "monthly summaries"
+        indexes = [
+            models.Index(fields=["user", "month"], name="ledger_summary_user_month_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.month:%b %Y} {self.transaction_type}: ₹{self.amount}"
+
+
+class OpeningBalance(models.Model):
+    """
+    A wallet's balance from its archived transactions, where its live history starts
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="opening_balances"
+    )
+    wallet = models.OneToOneField(Wallet, on_delete=models.CASCADE, related_name="opening_balance")
+    balance = models.DecimalField(max_digits=14, decimal_places=2)
+
+    def __str__(self):
+        return f"{self.user.username} - {self.wallet}: ₹{self.balance}"
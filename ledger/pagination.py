@@ -0,0 +1,38 @@
+"""
+Paginator for very large admin changelists.
+
+An exact ``COUNT(*)`` over millions of rows is the slowest query on a
+changelist page. On PostgreSQL the planner's row estimate is used instead
+once it passes ``EXACT_COUNT_LIMIT``; smaller results, and other databases,
+are still counted exactly.
+"""
+import json
+
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+EXACT_COUNT_LIMIT = 10000
+
+
+def estimated_count(queryset):
+    """The planner's estimate of how many rows ``queryset`` returns, or None if unavailable"""
+    connection = connections[queryset.db]
+    if connection.vendor != "postgresql":
+        return None
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+class EstimatedCountPaginator(Paginator):
+    @cached_property
+    def count(self):
+        estimate = estimated_count(self.object_list)
+        if estimate is not None and estimate > EXACT_COUNT_LIMIT:
+            return estimate
+        return super().count
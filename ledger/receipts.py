@@ -0,0 +1,189 @@
+"""
+Receipt files attached to transactions.
+
+Uploads never sit in memory whole: ``ReceiptUploadHandler`` streams the
+request body to a temporary file chunk by chunk and hashes it on the way.
+``store_receipt`` then moves that file into the store under its SHA-256,
+or drops it when the same content is already stored. Thumbnails are made
+later, in the process pool of ``manage.py run_receipt_worker``, so an
+upload costs one file move and one row whatever the image's size.
+"""
+import hashlib
+from datetime import timedelta
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadhandler import StopUpload, TemporaryFileUploadHandler
+from django.db import IntegrityError, transaction as db_transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from .models import ArchivedTransaction, Receipt, Transaction
+
+# Leading bytes of each accepted format; the client's content type isn't trusted
+SIGNATURES = (
+    (b"\xff\xd8\xff", "image/jpeg", "jpg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png", "png"),
+    (b"%PDF-", "application/pdf", "pdf"),
+)
+
+THUMBNAIL_SIZE = (160, 160)
+
+
+def sniff(head):
+    """``(content_type, extension)`` of a file from its first 16 bytes, or None if it isn't an accepted format"""
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp", "webp"
+    for signature, content_type, extension in SIGNATURES:
+        if head.startswith(signature):
+            return content_type, extension
+    return None
+
+
+class ReceiptUploadHandler(TemporaryFileUploadHandler):
+    """
+    Streams every uploaded file to a temporary file on disk and hashes it on the way.
+
+    Django's default handlers keep files under 2.5 MB in memory; this one
+    holds one chunk at a time. A file that grows past ``RECEIPT_MAX_BYTES``
+    stops the upload and sets ``too_large``.
+    """
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.too_large = False
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.sha256 = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        if start + len(raw_data) > settings.RECEIPT_MAX_BYTES:
+            self.too_large = True
+            # The parser closes, and so deletes, the partial file
+            raise StopUpload()
+        self.sha256.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        upload = super().file_complete(file_size)
+        upload.sha256 = self.sha256.hexdigest()
+        return upload
+
+
+def _hash(upload):
+    sha256 = hashlib.sha256()
+    for chunk in upload.chunks():
+        sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def store_receipt(upload):
+    """
+    The ``Receipt`` holding ``upload``'s content, moving the file into the store only if that content is new.
+
+    ``upload`` must already be checked with ``sniff``. A file streamed by
+    ``ReceiptUploadHandler`` carries its hash; anything else is hashed here.
+    """
+    upload.seek(0)
+    content_type, extension = sniff(upload.read(16))
+    digest = getattr(upload, "sha256", None) or _hash(upload)
+    receipt = Receipt.objects.filter(sha256=digest).first()
+    if receipt is not None:
+        return receipt
+
+    upload.seek(0)
+    # A temporary upload is moved into place rather than copied
+    name = default_storage.save(f"receipts/{digest[:2]}/{digest}.{extension}", upload)
+    try:
+        with db_transaction.atomic():
+            return Receipt.objects.create(
+                sha256=digest, file=name, content_type=content_type, size=upload.size,
+                thumbnail_status="NONE" if content_type == "application/pdf" else "PENDING",
+            )
+    except IntegrityError:
+        # A concurrent upload of the same file stored it first
+        default_storage.delete(name)
+        return Receipt.objects.get(sha256=digest)
+
+
+def owned_receipt(user, pk):
+    """Receipt ``pk`` if one of ``user``'s live or archived transactions has it, else None"""
+    return Receipt.objects.filter(
+        Q(Exists(Transaction.objects.filter(user=user, receipt=OuterRef("pk"))))
+        | Q(Exists(ArchivedTransaction.objects.filter(user=user, receipt=OuterRef("pk")))),
+        pk=pk,
+    ).first()
+
+
+def requeue_stale_thumbnails(timeout):
+    """Put receipts left RUNNING by a crashed worker back in the queue."""
+    cutoff = timezone.now() - timedelta(seconds=timeout)
+    return Receipt.objects.filter(thumbnail_status="RUNNING", claimed_at__lt=cutoff).update(thumbnail_status="PENDING")
+
+
+def claim_thumbnails(limit):
+    """
+    Claim up to ``limit`` receipts waiting for a thumbnail and return them.
+
+    As with summary jobs, each claim is a conditional UPDATE on the PENDING
+    status, so several workers never render the same receipt.
+    """
+    candidates = Receipt.objects.filter(thumbnail_status="PENDING").order_by("created_at").values_list("id", flat=True)[:limit]
+    claimed = []
+    for receipt_id in list(candidates):
+        if Receipt.objects.filter(pk=receipt_id, thumbnail_status="PENDING").update(thumbnail_status="RUNNING", claimed_at=timezone.now()):
+            claimed.append(Receipt.objects.get(pk=receipt_id))
+    return claimed
+
+
+def finish_thumbnail(receipt, name=None):
+    """Record a rendered thumbnail, or mark it failed when ``name`` is None"""
+    Receipt.objects.filter(pk=receipt.pk, thumbnail_status="RUNNING").update(
+        thumbnail=name or "",
+        thumbnail_status="DONE" if name else "FAILED",
+    )
+
+
+def render_thumbnail(file_name, sha256):
+    """
+    Store a small JPEG of receipt image ``file_name`` and return its name. Runs inside worker processes.
+
+    ``draft`` lets the JPEG decoder scale down while decoding, so a large
+    photo is never decoded at full size.
+    """
+    name = f"receipts/thumbnails/{sha256[:2]}/{sha256}.jpg"
+    if default_storage.exists(name):
+        return name
+    with default_storage.open(file_name, "rb") as source, Image.open(source) as image:
+        image.draft("RGB", THUMBNAIL_SIZE)
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail(THUMBNAIL_SIZE)
+        output = BytesIO()
+        image.convert("RGB").save(output, "JPEG", quality=80, optimize=True)
+    return default_storage.save(name, ContentFile(output.getvalue()))
+
+
+def prune_receipts(older_than):
+    """
+    Delete receipts, files and thumbnails no transaction has kept, and return how many went.
+
+    Only receipts stored before ``older_than`` are considered, so one that
+    is being attached right now isn't taken.
+    """
+    orphans = Receipt.objects.filter(created_at__lt=older_than).exclude(
+        Exists(Transaction.objects.filter(receipt=OuterRef("pk")))
+    ).exclude(
+        Exists(ArchivedTransaction.objects.filter(receipt=OuterRef("pk")))
+    )
+    pruned = 0
+    for receipt in orphans.iterator():
+        receipt.delete()
+        for name in (receipt.file.name, receipt.thumbnail.name):
+            if name:
+                default_storage.delete(name)
+        pruned += 1
+    return pruned
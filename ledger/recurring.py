@@ -0,0 +1,215 @@
+"""
+Recurring rules: scheduled incomes and expenses.
+
+A rule's occurrences are a pure function of its schedule, so any date range
+can be counted with arithmetic instead of listing every date. The survival
+forecast uses ``scheduled_totals`` to add the rest of the month's bills
+and salary. ``materialize_due`` saves the occurrences whose date has
+arrived, for many users at once. Each chunk of users is handled in one
+database transaction with one ``bulk_create``. Its due rules and their
+wallets stay locked, so two runs can't save an occurrence twice, and the
+usual balance and hard-budget checks apply. An occurrence that fails
+them is held and retried on the next run, together with the rest of its rule.
+"""
+import calendar
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction as db_transaction
+
+from dashboard.models import MonthlyStatement
+
+from .balances import ZERO, lock_wallets, wallet_totals
+from .budgets import add_spends, lock_spends, month_start
+from .models import Budget, LedgerArchive, OpeningBalance, RecurringRule, Transaction
+from .suggestions import add_transactions
+from .versions import bump_versions
+
+DAYS = {"DAILY": 1, "WEEKLY": 7}
+MONTHS = {"MONTHLY": 1, "YEARLY": 12}
+
+
+def _add_months(day, months, anchor):
+    index = day.year * 12 + day.month - 1 + months
+    year, month = divmod(index, 12)
+    month += 1
+    return day.replace(year=year, month=month, day=min(anchor, calendar.monthrange(year, month)[1]))
+
+
+def occurrence(rule, index):
+    """Date of the ``index``-th occurrence of ``rule``, counting ``start_date`` as 0"""
+    if rule.frequency in DAYS:
+        return rule.start_date + timedelta(days=DAYS[rule.frequency] * rule.interval * index)
+    return _add_months(rule.start_date, MONTHS[rule.frequency] * rule.interval * index, rule.start_date.day)
+
+
+def occurrence_index(rule, day):
+    """Index of the first occurrence of ``rule`` on or after ``day``, ignoring ``end_date``"""
+    if day <= rule.start_date:
+        return 0
+    if rule.frequency in DAYS:
+        step = DAYS[rule.frequency] * rule.interval
+        return -(-(day - rule.start_date).days // step)
+    step = MONTHS[rule.frequency] * rule.interval
+    months = (day.year - rule.start_date.year) * 12 + day.month - rule.start_date.month
+    index = -(-months // step)
+    # Same month as ``day`` but an earlier day of it
+    if occurrence(rule, index) < day:
+        index += 1
+    return index
+
+
+def count_between(rule, first, last):
+    """How many occurrences of ``rule`` fall from ``first`` to ``last``, both included"""
+    if rule.end_date is not None:
+        last = min(last, rule.end_date)
+    if first > last:
+        return 0
+    return occurrence_index(rule, last + timedelta(days=1)) - occurrence_index(rule, first)
+
+
+def next_after(rule, day):
+    """The first occurrence of ``rule`` after ``day``, or None once the rule has ended"""
+    following = occurrence(rule, occurrence_index(rule, day + timedelta(days=1)))
+    if rule.end_date is not None and following > rule.end_date:
+        return None
+    return following
+
+
+def first_occurrence(rule):
+    """The first occurrence of ``rule``, or None if it ends before it starts"""
+    return next_after(rule, rule.start_date - timedelta(days=1))
+
+
+def scheduled_totals(user, last):
+    """
+    ``(income, expense, upcoming)`` of the occurrences of ``user``'s active rules not saved yet, up to ``last``.
+
+    Each rule counts from its ``next_date``, so an occurrence that is due
+    but still waiting for the job counts too. This is one query and a little
+    arithmetic per rule, however many occurrences there are. ``upcoming``
+    lists the rules that fall in the range, soonest first.
+    """
+    income = expense = ZERO
+    upcoming = []
+    rules = RecurringRule.objects.filter(user=user, active=True, next_date__lte=last).select_related("category")
+    for rule in rules:
+        count = count_between(rule, rule.next_date, last)
+        total = rule.amount * count
+        if rule.transaction_type == "INCOME":
+            income += total
+        else:
+            expense += total
+        upcoming.append({
+            "description": rule.description or rule.category.name,
+            "transaction_type": rule.transaction_type,
+            "amount": float(rule.amount),
+            "count": count,
+            "next_date": rule.next_date.isoformat(),
+        })
+    upcoming.sort(key=lambda item: item["next_date"])
+    return income, expense, upcoming
+
+
+def _due_occurrences(rules, today, cutoffs):
+    occurrences = []
+    for rule in rules:
+        last = today if rule.end_date is None else min(today, rule.end_date)
+        day = rule.next_date
+        while day is not None and day <= last:
+            # The archived period is closed, so occurrences inside it are skipped
+            if cutoffs.get(rule.user_id) is None or day >= cutoffs[rule.user_id]:
+                occurrences.append((day, rule))
+            day = next_after(rule, day)
+    # Incomes first on each day, so a salary can pay that day's rent
+    occurrences.sort(key=lambda entry: (entry[1].user_id, entry[0], entry[1].transaction_type != "INCOME", entry[1].pk))
+    return occurrences
+
+
+def _materialize_chunk(user_ids, today):
+    rules = list(
+        RecurringRule.objects.select_for_update()
+        .filter(user_id__in=user_ids, active=True, next_date__lte=today)
+        .order_by("pk")
+    )
+    if not rules:
+        return [], 0
+    lock_wallets(rule.wallet_id for rule in rules)
+
+    cutoffs = dict(LedgerArchive.objects.filter(user_id__in=user_ids).values_list("user_id", "archived_before"))
+    occurrences = _due_occurrences(rules, today, cutoffs)
+    balances = defaultdict(lambda: ZERO, wallet_totals(
+        Transaction.objects.filter(user_id__in=user_ids), OpeningBalance.objects.filter(user_id__in=user_ids),
+    ))
+    budgets = {(budget.user_id, budget.category_id): budget for budget in Budget.objects.filter(user_id__in=user_ids)}
+    spends = lock_spends(
+        (rule.user_id, rule.category_id, month_start(day)) for day, rule in occurrences if rule.transaction_type == "EXPENSE"
+    )
+    spent = defaultdict(lambda: ZERO, {key: spend.spent for key, spend in spends.items()})
+
+    held = {}
+    new = []
+    spend_deltas = defaultdict(lambda: ZERO)
+    for day, rule in occurrences:
+        if rule.pk in held:
+            continue
+        if rule.transaction_type == "EXPENSE":
+            key = (rule.user_id, rule.category_id, month_start(day))
+            budget = budgets.get(key[:2])
+            over_budget = budget is not None and budget.hard_limit and spent[key] + rule.amount > budget.amount
+            if rule.amount > balances[rule.wallet_id] or over_budget:
+                held[rule.pk] = day
+                continue
+            spent[key] += rule.amount
+            spend_deltas[key] += rule.amount
+            balances[rule.wallet_id] -= rule.amount
+        else:
+            balances[rule.wallet_id] += rule.amount
+        new.append(Transaction(
+            user_id=rule.user_id, transaction_type=rule.transaction_type, wallet_id=rule.wallet_id,
+            amount=rule.amount, category_id=rule.category_id, description=rule.description, date=day,
+            recurring_rule=rule,
+        ))
+
+    # Every user here has rules that moved on. bulk_create skips pre_save, so
+    # each user's new rows share the one sequence number this takes
+    seqs = bump_versions(rule.user_id for rule in rules)
+    for transaction in new:
+        transaction.seq = seqs[transaction.user_id]
+    Transaction.objects.bulk_create(new, batch_size=1000)
+    add_spends(spends, spend_deltas)
+    # A held occurrence retried after month end is dated in a closed month
+    first_days = {}
+    for transaction in new:
+        first_days[transaction.user_id] = min(transaction.date, first_days.get(transaction.user_id, transaction.date))
+    for user_id, day in first_days.items():
+        MonthlyStatement.objects.invalidate(user_id, day)
+
+    for rule in rules:
+        rule.next_date = held[rule.pk] if rule.pk in held else next_after(rule, today)
+    RecurringRule.objects.bulk_update(rules, ["next_date"])
+    # bulk_create sends no post_save either
+    db_transaction.on_commit(lambda: add_transactions(new))
+    return new, len(held)
+
+
+def materialize_due(today, user_ids=None, chunk_size=500):
+    """
+    Save every occurrence dated up to ``today`` of the due rules, for all users or only ``user_ids``.
+
+    Returns ``(created, held, user_ids)``: the number of transactions saved,
+    the number of rules held back by a balance or hard budget, and the
+    users whose rules were due, whose ledgers and forecasts have changed.
+    """
+    due = RecurringRule.objects.filter(active=True, next_date__lte=today)
+    if user_ids is not None:
+        due = due.filter(user_id__in=user_ids)
+    pending = list(due.order_by("user_id").values_list("user_id", flat=True).distinct())
+
+    created = held = 0
+    for start in range(0, len(pending), chunk_size):
+        with db_transaction.atomic():
+            new, held_rules = _materialize_chunk(pending[start:start + chunk_size], today)
+        created += len(new)
+        held += held_rules
+    return created, held, pending
@@ -0,0 +1,110 @@
+"""
+Full-text search over transaction descriptions and categories.
+
+SQLite keeps an FTS5 table, ``ledger_transaction_fts``, with each row's
+description, category name and (unindexed) user id, filled by triggers on ``ledger_transaction``
+and ``ledger_category``. PostgreSQL uses a GIN index on the description's
+``tsvector``, which the database keeps up to date by itself, and matches
+category names against the small category table. Every word of the query
+must match, as a prefix, in the description or the category.
+"""
+import re
+
+from django.db import connections
+from django.db.models import BooleanField, Q
+from django.db.models.expressions import RawSQL
+
+from .models import Category
+
+MAX_WORDS = 8
+
+# Django rebuilds SQLite tables when a migration alters them, which drops
+# their triggers, so these are re-created after every migrate
+SQLITE_TRIGGERS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS ledger_transaction_fts_insert AFTER INSERT ON ledger_transaction BEGIN
+        INSERT INTO ledger_transaction_fts (rowid, description, category, user_id)
+        VALUES (new.id, new.description, (SELECT name FROM ledger_category WHERE id = new.category_id), new.user_id);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS ledger_transaction_fts_update AFTER UPDATE OF description, category_id ON ledger_transaction BEGIN
+        UPDATE ledger_transaction_fts
+        SET description = new.description, category = (SELECT name FROM ledger_category WHERE id = new.category_id)
+        WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS ledger_transaction_fts_delete AFTER DELETE ON ledger_transaction BEGIN
+        DELETE FROM ledger_transaction_fts WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS ledger_category_fts_rename AFTER UPDATE OF name ON ledger_category BEGIN
+        UPDATE ledger_transaction_fts SET category = new.name
+        WHERE rowid IN (SELECT id FROM ledger_transaction WHERE category_id = new.id);
+    END
+    """,
+]
+
+POSTGRES_VECTOR = "to_tsvector('simple', coalesce(\"ledger_transaction\".\"description\", ''))"
+
+
+# Reads ledger_transaction from a trigger on another table, so SQLite refuses
+# to rebuild ledger_transaction while it exists; dropped before every migrate
+SQLITE_CROSS_TABLE_TRIGGER = "ledger_category_fts_rename"
+
+
+def drop_cross_table_trigger(connection):
+    """Drop the trigger that would block rebuilding ``ledger_transaction``; ``ensure_triggers`` puts it back"""
+    if connection.vendor == "sqlite":
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP TRIGGER IF EXISTS {SQLITE_CROSS_TABLE_TRIGGER}")
+
+
+def ensure_triggers(connection):
+    """Put back SQLite triggers dropped by a table rebuild; a no-op elsewhere"""
+    if connection.vendor != "sqlite" or not {"ledger_transaction_fts", "ledger_category"} <= set(connection.introspection.table_names()):
+        return
+    with connection.cursor() as cursor:
+        for statement in SQLITE_TRIGGERS:
+            cursor.execute(statement)
+
+
+def search_words(query):
+    return re.findall(r"\w+", (query or "").lower())[:MAX_WORDS]
+
+
+def search_transactions(queryset, query, user):
+    """Narrow ``queryset``, some of ``user``'s transactions, to those whose description or category matches ``query``"""
+    words = search_words(query)
+    if not words:
+        return queryset
+
+    vendor = connections[queryset.db].vendor
+    if vendor == "sqlite":
+        match = " ".join(f'"{word}"*' for word in words)
+        # Scoped to the user inside the subquery, so other users' matches never reach the IN list
+        return queryset.filter(
+            pk__in=RawSQL(
+                "SELECT rowid FROM ledger_transaction_fts WHERE ledger_transaction_fts MATCH %s AND user_id = %s",
+                [match, user.pk],
+            )
+        )
+    if vendor == "postgresql":
+        condition = Q()
+        for word in words:
+            matches_word = RawSQL(POSTGRES_VECTOR + " @@ to_tsquery('simple', %s)", [f"{word}:*"], output_field=BooleanField())
+            condition &= Q(matches_word) | Q(category__in=_categories_matching(word))
+        return queryset.filter(condition)
+
+    # No full-text index on other databases
+    condition = Q()
+    for word in words:
+        condition &= Q(description__icontains=word) | Q(category__name__icontains=word)
+    return queryset.filter(condition)
+
+
+def _categories_matching(word):
+    # A few dozen rows at most, so a prefix scan is fine
+    return Category.objects.filter(name__iregex=rf"(^|\W){re.escape(word)}").values("pk")
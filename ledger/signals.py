@@ -0,0 +1,110 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connections, transaction as db_transaction
+from django.db.models.signals import post_delete, post_migrate, post_save, pre_migrate, pre_save
+from django.dispatch import receiver
+
+from dashboard.models import MonthlyStatement
+
+from . import suggestions
+from .categories import invalidate_categories
+from .models import Budget, Category, RecurringRule, Tombstone, Transaction, Wallet
+from .search import drop_cross_table_trigger, ensure_triggers
+from .versions import bump_version
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def create_default_wallets(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        Wallet.objects.create_defaults(instance)
+
+
+def _deleting_account(origin):
+    user_model = get_user_model()
+    return isinstance(origin, user_model) or getattr(origin, "model", None) is user_model
+
+
+@receiver(post_save, sender=Wallet)
+@receiver(post_save, sender=Budget)
+@receiver(post_save, sender=RecurringRule)
+@receiver(post_delete, sender=Wallet)
+@receiver(post_delete, sender=Budget)
+@receiver(post_delete, sender=RecurringRule)
+def ledger_changed(sender, instance, raw=False, origin=None, **kwargs):
+    # Nothing to invalidate when the whole account is being deleted
+    if raw or _deleting_account(origin):
+        return
+    bump_version(instance.user_id)
+
+
+@receiver(post_save, sender=Budget)
+@receiver(post_delete, sender=Budget)
+def invalidate_budget_statements(sender, instance, raw=False, origin=None, **kwargs):
+    if raw or _deleting_account(origin):
+        return
+    # Every statement's summary lists the budgets as they stand
+    MonthlyStatement.objects.filter(user_id=instance.user_id, stale=False).update(stale=True)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def category_changed(sender, instance, raw=False, origin=None, **kwargs):
+    if raw or _deleting_account(origin):
+        return
+    invalidate_categories(instance.user_id)
+    # Global categories aren't part of any one user's ledger
+    if instance.user_id:
+        bump_version(instance.user_id)
+
+
+@receiver(pre_save, sender=Transaction)
+def stamp_transaction_seq(sender, instance, raw=False, **kwargs):
+    if not raw:
+        instance.seq = bump_version(instance.user_id)
+
+
+# Saving only these leaves a statement's figures as they were
+STATEMENT_NEUTRAL_FIELDS = {"seq", "receipt"}
+
+
+@receiver(pre_save, sender=Transaction)
+def invalidate_statements(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields is not None and set(update_fields) <= STATEMENT_NEUTRAL_FIELDS):
+        return
+    day = instance.date
+    if instance.pk is not None:
+        # An edit can move a row out of a closed month, too
+        day = min([day, *Transaction.objects.filter(pk=instance.pk).values_list("date", flat=True)])
+    MonthlyStatement.objects.invalidate(instance.user_id, day)
+
+
+@receiver(post_delete, sender=Transaction)
+def leave_tombstone(sender, instance, origin=None, **kwargs):
+    if _deleting_account(origin):
+        return
+    Tombstone.objects.create(user_id=instance.user_id, transaction_id=instance.pk, seq=bump_version(instance.user_id))
+    MonthlyStatement.objects.invalidate(instance.user_id, instance.date)
+    db_transaction.on_commit(lambda: suggestions.forget(instance.user_id))
+
+
+@receiver(post_save, sender=Transaction)
+def update_suggestions(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        db_transaction.on_commit(lambda: suggestions.add_transactions([instance]))
+    else:
+        # An edit can take a use away from a description, so rebuild instead
+        db_transaction.on_commit(lambda: suggestions.forget(instance.user_id))
+
+
+@receiver(pre_migrate)
+def drop_search_triggers(sender, using, **kwargs):
+    if sender.name == "ledger":
+        drop_cross_table_trigger(connections[using])
+
+
+@receiver(post_migrate)
+def restore_search_triggers(sender, using, **kwargs):
+    if sender.name == "ledger":
+        ensure_triggers(connections[using])
@@ -0,0 +1,220 @@
+"""
+Description suggestions for the add-transaction form.
+
+Each user's past descriptions are held in process memory. Every prefix of
+every word maps to the descriptions containing it, ranked by how often each
+was used, so a lookup reads the head of one list. Building an index costs
+one grouped query over the user's history.
+After that, a keystroke is answered from memory. New transactions are added
+to the index as they are saved; edits and deletes drop it. The least
+recently used users are evicted past ``MAX_INDEXED_USERS``. An index
+remembers the user's ``LedgerVersion`` it was built at, which every write
+bumps, so other processes rebuild their copy after a write they didn't see.
+A lookup reads the version through ``cached_version``: from the shared
+cache with Redis, otherwise with one primary-key read.
+"""
+import re
+from collections import Counter, OrderedDict
+from threading import Lock
+
+from django.db.models import Count, Max
+
+from .models import Transaction
+from .versions import cached_version
+
+MAX_INDEXED_USERS = 256
+MAX_SUGGESTIONS = 8
+# Longer words are indexed by their first MAX_PREFIX letters only
+MAX_PREFIX = 12
+
+_indexes = OrderedDict()
+_lock = Lock()
+
+
+def _words(text):
+    return re.findall(r"\w+", text.lower())
+
+
+class _Entry:
+    """One distinct description and what it was usually filed as"""
+    __slots__ = ("description", "words", "count", "last_used", "types", "categories", "wallets", "amounts")
+
+    def __init__(self, description, words):
+        self.description = description
+        self.words = words
+        self.count = 0
+        self.last_used = None
+        self.types = Counter()
+        self.categories = Counter()
+        self.wallets = Counter()
+        self.amounts = Counter()
+
+    def add(self, description, transaction_type, category_id, wallet_id, amount, count, day):
+        self.count += count
+        if self.last_used is None or day >= self.last_used:
+            # Show the spelling used most recently
+            self.last_used = day
+            self.description = description
+        self.types[transaction_type] += count
+        self.categories[category_id] += count
+        self.wallets[wallet_id] += count
+        self.amounts[amount] += count
+
+    def rank(self):
+        return self.count, self.last_used
+
+    def prefixes(self):
+        return {word[:length] for word in self.words for length in range(1, min(len(word), MAX_PREFIX) + 1)}
+
+    def suggestion(self):
+        return {
+            "description": self.description,
+            "transaction_type": self.types.most_common(1)[0][0],
+            "category": self.categories.most_common(1)[0][0],
+            "wallet": self.wallets.most_common(1)[0][0],
+            "amount": f"{self.amounts.most_common(1)[0][0]:.2f}",
+            "count": self.count,
+        }
+
+
+def _promote(entries, entry):
+    """Move ``entry``, which just gained uses, up ``entries`` past those it now outranks"""
+    try:
+        position = entries.index(entry)
+    except ValueError:
+        entries.append(entry)
+        position = len(entries) - 1
+    rank = entry.rank()
+    while position and entries[position - 1].rank() < rank:
+        entries[position] = entries[position - 1]
+        position -= 1
+    entries[position] = entry
+
+
+class _UserIndex:
+    def __init__(self, stamp):
+        self.stamp = stamp
+        self.entries = {}
+        # Word prefix -> every entry with a word starting with it, best first
+        self.prefixes = {}
+
+    def add(self, description, transaction_type, category_id, wallet_id, amount, count, day, building=False):
+        description = " ".join(description.split())
+        key = description.lower()
+        entry = self.entries.get(key)
+        if entry is None:
+            entry = self.entries[key] = _Entry(description, tuple(set(_words(key))))
+        entry.add(description, transaction_type, category_id, wallet_id, amount, count, day)
+        if not building:
+            for prefix in entry.prefixes():
+                _promote(self.prefixes.setdefault(prefix, []), entry)
+
+    def finish_build(self):
+        for entry in self.entries.values():
+            for prefix in entry.prefixes():
+                self.prefixes.setdefault(prefix, []).append(entry)
+        for entries in self.prefixes.values():
+            entries.sort(key=_Entry.rank, reverse=True)
+
+    def search(self, query, limit):
+        words = _words(query)
+        if not words:
+            return []
+        # Walk the longest word's list in rank order until enough entries match every word
+        probe = max(words, key=len)
+        matches = []
+        for entry in self.prefixes.get(probe[:MAX_PREFIX], ()):
+            if all(any(word.startswith(typed) for word in entry.words) for typed in words):
+                matches.append(entry)
+                if len(matches) == limit:
+                    break
+        return matches
+
+
+def _build(user_id, stamp):
+    index = _UserIndex(stamp)
+    rows = (
+        Transaction.objects.filter(user_id=user_id)
+        .exclude(transaction_type="SWITCH")
+        .exclude(description="")
+        .values_list("description", "transaction_type", "category_id", "wallet_id", "amount")
+        .annotate(count=Count("id"), last_used=Max("date"))
+        .order_by()
+    )
+    for row in rows.iterator():
+        index.add(*row, building=True)
+    index.finish_build()
+    return index
+
+
+def suggest(user, query, limit=MAX_SUGGESTIONS):
+    """
+    ``user``'s most used descriptions matching every word of ``query`` as a prefix.
+
+    Each suggestion is a dict with the description and its usual
+    transaction type, category id, wallet id and amount.
+    """
+    stamp = cached_version(user.pk)
+    with _lock:
+        index = _indexes.get(user.pk)
+        if index is not None and index.stamp == stamp:
+            _indexes.move_to_end(user.pk)
+            return [entry.suggestion() for entry in index.search(query, limit)]
+
+    # Built outside the lock; the version was read first, so a write that
+    # lands during the build makes the next lookup rebuild again
+    index = _build(user.pk, stamp)
+    with _lock:
+        _indexes[user.pk] = index
+        _indexes.move_to_end(user.pk)
+        while len(_indexes) > MAX_INDEXED_USERS:
+            _indexes.popitem(last=False)
+        return [entry.suggestion() for entry in index.search(query, limit)]
+
+
+def add_transactions(transactions):
+    """
+    Add newly saved ``transactions`` to the indexes of their users.
+
+    Rows saved together share one ``seq``, the version their write bumped
+    the ledger to. They are only added to an index built at the version
+    just before it; after any other write the index is dropped instead.
+    """
+    by_user = {}
+    for transaction in transactions:
+        by_user.setdefault(transaction.user_id, []).append(transaction)
+
+    for user_id, saved in by_user.items():
+        seqs = {transaction.seq for transaction in saved}
+        with _lock:
+            index = _indexes.get(user_id)
+            if index is None:
+                continue
+            if len(seqs) != 1 or index.stamp != min(seqs) - 1:
+                # Another write happened since this index was built
+                del _indexes[user_id]
+                continue
+            for transaction in saved:
+                if transaction.transaction_type == "SWITCH" or not transaction.description.strip():
+                    continue
+                index.add(
+                    transaction.description, transaction.transaction_type, transaction.category_id,
+                    transaction.wallet_id, transaction.amount, 1, transaction.date,
+                )
+            index.stamp = min(seqs)
+
+
+def forget(user_id):
+    """
+    Drop ``user_id``'s index after an edit or delete.
+
+    The write bumped the ledger version too, so other processes drop
+    theirs on their next lookup.
+    """
+    with _lock:
+        _indexes.pop(user_id, None)
+
+
+def clear_suggestions():
+    with _lock:
+        _indexes.clear()
@@ -1,3 +1,825 @@
-from django.test import TestCase
+import os
+import re
+import shutil
+import tempfile
+import threading
+from collections import defaultdict
+from datetime import date, timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import skipUnless
 
-# Create your tests here.
+from django.contrib.admin.models import LogEntry
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.sql import emit_post_migrate_signal, emit_pre_migrate_signal
+from django.db import IntegrityError, close_old_connections, connection, transaction as db_transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.test import Client, TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from PIL import Image
+
+from accounts.models import User
+from dashboard.models import SummaryJob
+
+from .archive import archive_cutoff, archive_user, archived_before
+from .balances import attach_running_balances, lock_wallets, wallet_balance, wallet_balances
+from .categories import GENERATION_KEY, user_categories
+from .edits import LedgerError, delete_transactions, recategorize, update_transaction
+from .idempotency import find_original, save_once
+from .models import ArchivedTransaction, Budget, Category, CategorySpend, LedgerArchive, Receipt, RecurringRule, Tombstone, Transaction
+from .receipts import claim_thumbnails, finish_thumbnail, render_thumbnail
+from .recurring import count_between, first_occurrence, materialize_due, occurrence
+from .search import SQLITE_TRIGGERS, search_transactions
+from .suggestions import clear_suggestions, suggest
+from .versions import bump_version
+
+THREADS = 8
+
+
+def run_together(*targets):
+    """Run each target in its own thread, all released at once, and return their results"""
+    barrier = threading.Barrier(len(targets))
+    results = [None] * len(targets)
+
+    def run(index, target):
+        try:
+            barrier.wait()
+            results[index] = target()
+        except Exception as error:
+            results[index] = error
+        finally:
+            close_old_connections()
+            connection.close()
+
+    threads = [threading.Thread(target=run, args=(index, target)) for index, target in enumerate(targets)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=60)
+    return results
+
+
+class ConcurrentBalanceTests(TransactionTestCase):
+    # Keep the default categories that a migration created
+    serialized_rollback = True
+
+    def setUp(self):
+        cache.clear()
+        clear_suggestions()
+        self.categories = {category.name: category for category in Category.objects.filter(user__isnull=True)}
+        self.user = User.objects.create_user(username="alice", password="secret-pass-123")
+        self.cash, self.upi = self.user.wallets.order_by("id")
+        Transaction.objects.create(
+            user=self.user, transaction_type="INCOME", wallet=self.cash,
+            amount=Decimal("100"), category=self.categories["Salary"], date=date.today(),
+        )
+
+    def client_for(self, user):
+        client = Client()
+        client.force_login(user)
+        return client
+
+    def post_expense(self, client, wallet, amount):
+        return lambda: client.post("/ledger/add/", {
+            "transaction_type": "EXPENSE",
+            "wallet": wallet.pk,
+            "amount": amount,
+            "category": self.categories["Food"].pk,
+            "date": date.today().isoformat(),
+        }).status_code
+
+    def test_concurrent_expenses_cannot_overdraw(self):
+        clients = [self.client_for(self.user) for _ in range(THREADS)]
+        results = run_together(*(self.post_expense(client, self.cash, "30") for client in clients))
+
+        # Exactly three 30s fit in 100; every other request was refused, not failed
+        self.assertEqual(sorted(results), [200] * (THREADS - 3) + [302] * 3)
+        self.assertEqual(wallet_balance(self.cash), Decimal("10"))
+
+    def test_concurrent_switches_and_expenses_cannot_overdraw(self):
+        switcher, spender = self.client_for(self.user), self.client_for(self.user)
+        switches = [
+            lambda: switcher.post("/ledger/switch/", {
+                "wallet": self.cash.pk, "to_wallet": self.upi.pk, "amount": "40", "date": date.today().isoformat(),
+            }).status_code
+        ] * (THREADS // 2)
+        expenses = [self.post_expense(spender, self.cash, "40")] * (THREADS // 2)
+        run_together(*switches, *expenses)
+
+        self.assertEqual(wallet_balance(self.cash), Decimal("20"))
+        self.assertEqual(Transaction.objects.filter(user=self.user).exclude(transaction_type="INCOME").count(), 2)
+
+    def test_concurrent_expenses_from_different_wallets_respect_hard_budget(self):
+        Transaction.objects.create(
+            user=self.user, transaction_type="INCOME", wallet=self.upi,
+            amount=Decimal("100"), category=self.categories["Salary"], date=date.today(),
+        )
+        Budget.objects.create(user=self.user, category=self.categories["Food"], amount=Decimal("50"), hard_limit=True)
+        clients = [self.client_for(self.user) for _ in range(THREADS)]
+        # The wallet locks don't overlap, so only the budget lock keeps these apart
+        results = run_together(*(
+            self.post_expense(client, self.cash if index % 2 else self.upi, "30") for index, client in enumerate(clients)
+        ))
+
+        self.assertEqual(sorted(results), [200] * (THREADS - 1) + [302])
+        self.assertEqual(CategorySpend.objects.get(user=self.user).spent, Decimal("30"))
+
+    def test_concurrent_retries_with_one_key_save_once(self):
+        clients = [self.client_for(self.user) for _ in range(THREADS)]
+        posts = [
+            lambda client=client: client.post("/ledger/add/", {
+                "transaction_type": "EXPENSE", "wallet": self.cash.pk, "amount": "30",
+                "category": self.categories["Food"].pk, "date": date.today().isoformat(), "idempotency_key": "retry-1",
+            }).status_code
+            for client in clients
+        ]
+
+        # Every retry is answered with the one stored row, whichever request saved it
+        self.assertEqual(run_together(*posts), [302] * THREADS)
+        self.assertEqual(Transaction.objects.filter(user=self.user, idempotency_key="retry-1").count(), 1)
+        self.assertEqual(wallet_balance(self.cash), Decimal("70"))
+
+    @skipUnlessDBFeature("has_select_for_update")
+    def test_locked_wallet_does_not_block_other_wallets_or_users(self):
+        # SQLite has a single writer, so this only holds on databases with row locks
+        other = User.objects.create_user(username="bob", password="secret-pass-123")
+        other_cash = other.wallets.order_by("id").first()
+        Transaction.objects.create(
+            user=other, transaction_type="INCOME", wallet=other_cash,
+            amount=Decimal("100"), category=self.categories["Salary"], date=date.today(),
+        )
+        Transaction.objects.create(
+            user=self.user, transaction_type="INCOME", wallet=self.upi,
+            amount=Decimal("100"), category=self.categories["Salary"], date=date.today(),
+        )
+        locked, released = threading.Event(), threading.Event()
+
+        def hold_lock():
+            with db_transaction.atomic():
+                lock_wallets([self.cash.pk])
+                locked.set()
+                released.wait(timeout=30)
+            return "held"
+
+        def post_while_locked(client, wallet):
+            post = self.post_expense(client, wallet, "10")
+
+            def run():
+                locked.wait(timeout=30)
+                return post()
+            return run
+
+        holder = threading.Thread(target=lambda: run_together(hold_lock))
+        holder.start()
+        try:
+            # These finish while alice's cash wallet is still locked
+            results = run_together(
+                post_while_locked(self.client_for(other), other_cash),
+                post_while_locked(self.client_for(self.user), self.upi),
+            )
+            self.assertFalse(released.is_set())
+        finally:
+            released.set()
+            holder.join(timeout=60)
+
+        self.assertEqual(results, [302, 302])
+        self.assertEqual(wallet_balance(other_cash), Decimal("90"))
+        self.assertEqual(wallet_balance(self.upi), Decimal("90"))
+
+
+class AddTransactionTests(TestCase):
+    def setUp(self):
+        self.categories = {category.name: category for category in Category.objects.filter(user__isnull=True)}
+        self.user = User.objects.create_user(username="alice", password="secret-pass-123")
+        self.cash, self.upi = self.user.wallets.order_by("id")
+        Transaction.objects.create(
+            user=self.user, transaction_type="INCOME", wallet=self.cash,
+            amount=Decimal("100"), category=self.categories["Salary"], date=date.today(),
+        )
+        self.client.force_login(self.user)
+
+    def test_transfers_cannot_be_posted_as_plain_transactions(self):
+        response = self.client.post("/ledger/add/", {
+            "transaction_type": "SWITCH",
+            "wallet": self.cash.pk,
+            "amount": "590",
+            "category": self.categories["Food"].pk,
+            "date": date.today().isoformat(),
+        })
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("transaction_type", response.context["form"].errors)
+        self.assertFalse(Transaction.objects.filter(transaction_type="SWITCH").exists())
+        self.assertEqual(wallet_balance(self.cash), Decimal("100"))
+
+
+class RunningBalanceTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        clear_suggestions()
+        categories = {category.name: category for category in Category.objects.filter(user__isnull=True)}
+        self.user = User.objects.create_user(username="alice", password="secret-pass-123")
+        self.cash, self.upi = self.user.wallets.order_by("id")
+        self.client.force_login(self.user)
+        # The first of last month, which the rows straddle
+        self.boundary = (date.today().replace(day=1) - timedelta(days=1)).replace(day=1)
+        start = self.boundary - timedelta(days=3)
+        # (days after start, type, wallet, to_wallet, amount); several rows share a day
+        for offset, kind, wallet, to_wallet, amount in [
+            (0, "INCOME", self.cash, None, "500"),
+            (0, "EXPENSE", self.cash, None, "20"),
+            (2, "SWITCH", self.cash, self.upi, "200"),
+            (2, "EXPENSE", self.upi, None, "35"),
+            (5, "INCOME", self.upi, None, "90"),
+            (5, "EXPENSE", self.cash, None, "15"),
+            (9, "EXPENSE", self.upi, None, "60"),
+            (9, "EXPENSE", self.cash, None, "5"),
+        ] * 2:
+            Transaction.objects.create(
+                user=self.user, transaction_type=kind, wallet=wallet, to_wallet=to_wallet, amount=Decimal(amount),
+                category=categories[Category.TRANSFER if kind == "SWITCH" else "Salary" if kind == "INCOME" else "Food"],
+                date=start + timedelta(days=offset),
+            )
+
+    def replayed(self):
+        """``{id: (balance, wallet balance, to_wallet balance)}`` by walking the ledger in (date, id) order"""
+        wallets = defaultdict(lambda: Decimal("0"))
+        expected = {}
+        for t in Transaction.objects.filter(user=self.user).order_by("date", "id"):
+            wallets[t.wallet_id] += t.amount if t.transaction_type == "INCOME" else -t.amount
+            if t.to_wallet_id:
+                wallets[t.to_wallet_id] += t.amount
+            expected[t.id] = (sum(wallets.values()), wallets[t.wallet_id], wallets[t.to_wallet_id] if t.to_wallet_id else None)
+        return expected
+
+    def test_filtered_pages_show_balances_over_the_whole_history(self):
+        expected = self.replayed()
+        for params in [{}, {"page": "2"}, {"transaction_type": "EXPENSE"}, {"wallet": str(self.upi.pk), "page": "2"}]:
+            page = self.client.get("/", params).context["transactions"]
+            self.assertTrue(page.object_list)
+            for t in page:
+                self.assertEqual((t.running_balance, t.wallet_balance, t.to_wallet_balance), expected[t.id], params)
+
+    def test_archived_history_counts_through_opening_balances(self):
+        expected = self.replayed()
+        self.assertEqual(archive_user(self.user, self.boundary), 8)
+        rows = attach_running_balances(self.user, Transaction.objects.filter(user=self.user, transaction_type="EXPENSE"))
+
+        self.assertTrue(rows)
+        for t in rows:
+            self.assertEqual((t.running_balance, t.wallet_balance, t.to_wallet_balance), expected[t.id])
+
+
+class TransactionAdminTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        clear_suggestions()
+        self.categories = {category.name: category for category in Category.objects.filter(user__isnull=True)}
+        self.user = User.objects.create_user(username="alice", password="secret-pass-123")
+        self.cash = self.user.wallets.order_by("id").first()
+        self.income = Transaction.objects.create(
+            user=self.user, transaction_type="INCOME", wallet=self.cash, amount=Decimal("100"),
+            category=self.categories["Salary"], date=date.today() - timedelta(days=3),
+        )
+        Transaction.objects.create(
+            user=self.user, transaction_type="EXPENSE", wallet=self.cash, amount=Decimal("80"),
+            category=self.categories["Food"], date=date.today(),
+        )
+        self.client.force_login(User.objects.create_superuser(username="admin", password="secret-pass-123"))
+
+    def change_income(self, amount):
+        return self.client.post(f"/admin/ledger/transaction/{self.income.pk}/change/", {
+            "user": self.user.pk, "transaction_type": "INCOME", "wallet": self.cash.pk, "to_wallet": "",
+            "amount": amount, "category": self.categories["Salary"].pk, "description": "",
+            "date": self.income.date.isoformat(),
+        })
+
+    def test_change_form_rejects_an_edit_that_overdraws_later_rows(self):
+        response = self.change_income("50")
+
+        # Sent back to the change form with the error, and nothing saved or logged
+        self.assertRedirects(response, f"/admin/ledger/transaction/{self.income.pk}/change/")
+        self.assertIn("Insufficient", " ".join(str(message) for message in get_messages(response.wsgi_request)))
+        self.assertEqual(wallet_balance(self.cash), Decimal("20"))
+        self.assertFalse(LogEntry.objects.exists())
+
+        self.assertEqual(self.change_income("90").status_code, 302)
+        self.assertEqual(wallet_balance(self.cash), Decimal("10"))
+
+    def test_add_form_rejects_an_overdrawing_expense(self):
+        response = self.client.post("/admin/ledger/transaction/add/", {
+            "user": self.user.pk, "transaction_type": "EXPENSE", "wallet": self.cash.pk, "to_wallet": "",
+            "amount": "500", "category": self.categories["Food"].pk, "description": "",
+            "date": date.today().isoformat(),
+        })
+
+        self.assertRedirects(response, "/admin/ledger/transaction/add/")
+        self.assertEqual(Transaction.objects.filter(user=self.user).count(), 2)
+        self.assertFalse(LogEntry.objects.exists())
+
+
+class IdempotencyTests(TestCase):
+    def setUp(self):
+        self.food = Category.objects.get(user__isnull=True, name="Food")
+        self.user = User.objects.create_user(username="alice", password="secret-pass-123")
+        self.cash = self.user.wallets.order_by("id").first()
+
+    def expense(self, key):
+        return Transaction(
+            user=self.user, transaction_type="EXPENSE", wallet=self.cash, amount=Decimal("10"),
+            category=self.food, date=date.today(), idempotency_key=key,
+        )
+
+    def test_replayed_key_returns_stored_row(self):
+        self.assertIsNone(find_original(self.user, "key-1"))
+        first, created = save_once(self.expense("key-1"))
+        self.assertTrue(created)
+
+        self.assertEqual(find_original(self.user, "key-1"), first)
+        self.assertIsNone(find_original(self.user, ""))
+        # Keys are per user
+        self.assertIsNone(find_original(User.objects.create_user(username="bob"), "key-1"))
+
+    def test_losing_a_race_returns_the_winner_without_side_effects(self):
+        first, _ = save_once(self.expense("key-1"))
+        saved = []
+
+        # As if both requests passed find_original before either saved
+        original, created = save_once(self.expense("key-1"), saved.append)
+
+        self.assertEqual((original, created), (first, False))
+        self.assertEqual(saved, [])
+        self.assertEqual(Transaction.objects.filter(user=self.user).count(), 1)
+
+    def test_other_integrity_errors_still_raise(self):
+        broken = self.expense("key-1")
+        broken.transaction_type = None
+
+        with self.assertRaises(IntegrityError):
+            save_once(broken)
+
+
+class EditTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        clear_suggestions()
+        self.categories = {category.name: category for category in Category.objects.filter(user__isnull=True)}
+        self.user = User.objects.create_user(username="alice", password="secret-pass-123")
+        self.cash = self.user.wallets.order_by("id").first()
+        # All in last month, so every expense lands in one budget month
+        self.month = (date.today().replace(day=1) - timedelta(days=1)).replace(day=1)
+        self.income = self.add("INCOME", "100", "Salary", day=1)
+        self.expense = self.add("EXPENSE", "80", "Food", day=5)
+
+    def add(self, kind, amount, category, day):
+        transaction = Transaction(
+            user=self.user, transaction_type=kind, wallet=self.cash, amount=Decimal(amount),
+            category=self.categories[category], date=self.month.replace(day=day),
+        )
+        update_transaction(None, transaction)
+        return transaction
+
+    def spent(self, category):
+        spend = CategorySpend.objects.filter(user=self.user, category=self.categories[category]).first()
+        return spend.spent if spend else Decimal("0")
+
+    def test_lowering_an_old_income_cannot_overdraw_a_later_expense(self):
+        edited = Transaction.objects.get(pk=self.income.pk)
+        edited.amount = Decimal("50")
+        # Today's balance would still be fine if the expense were checked alone
+        self.add("INCOME", "100", "Salary", day=20)
+
+        with self.assertRaises(LedgerError):
+            update_transaction(Transaction.objects.get(pk=self.income.pk), edited)
+        self.assertEqual(Transaction.objects.get(pk=self.income.pk).amount, Decimal("100"))
+
+        edited.amount = Decimal("80")
+        update_transaction(Transaction.objects.get(pk=self.income.pk), edited)
+        self.assertEqual(wallet_balance(self.cash), Decimal("100"))
+
+    def test_deleting_an_income_that_later_expenses_relied_on(self):
+        with self.assertRaises(LedgerError):
+            delete_transactions(self.user, [self.income])
+        self.assertTrue(Transaction.objects.filter(pk=self.income.pk).exists())
+
+        self.assertEqual(delete_transactions(self.user, [self.income, self.expense]), 2)
+        self.assertEqual(wallet_balance(self.cash), Decimal("0"))
+        self.assertEqual(self.spent("Food"), Decimal("0"))
+
+    def test_editing_an_expense_moves_its_budget_total(self):
+        edited = Transaction.objects.get(pk=self.expense.pk)
+        edited.amount, edited.category = Decimal("60"), self.categories["Snacks"]
+        update_transaction(Transaction.objects.get(pk=self.expense.pk), edited)
+
+        self.assertEqual((self.spent("Food"), self.spent("Snacks")), (Decimal("0"), Decimal("60")))
+
+    def test_recategorize_moves_budget_totals(self):
+        second = self.add("EXPENSE", "15", "Food", day=10)
+        budget = Budget.objects.create(user=self.user, category=self.categories["Snacks"], amount=Decimal("90"), hard_limit=True)
+
+        with self.assertRaises(LedgerError):
+            recategorize(self.user, [self.expense.pk, second.pk], self.categories["Snacks"])
+        self.assertEqual(self.spent("Food"), Decimal("95"))
+
+        budget.hard_limit = False
+        budget.save()
+        count, warnings = recategorize(self.user, [self.expense.pk, second.pk, self.income.pk], self.categories["Snacks"])
+
+        self.assertEqual(count, 3)
+        self.assertEqual(len(warnings), 1)
+        self.assertEqual((self.spent("Food"), self.spent("Snacks")), (Decimal("0"), Decimal("95")))
+
+
+class SuggestionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        clear_suggestions()
+        self.categories = {category.name: category for category in Category.objects.filter(user__isnull=True)}
+        self.user = User.objects.create_user(username="alice", password="secret-pass-123")
+        self.cash = self.user.wallets.order_by("id").first()
+        for description, amount, times in [("Coffee at Blue Tokai", "180", 3), ("Coffee beans", "650", 1), ("Cab to office", "240", 2)]:
+            for _ in range(times):
+                self.add(description, amount)
+
+    def add(self, description, amount="10"):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Transaction.objects.create(
+                user=self.user, transaction_type="EXPENSE", wallet=self.cash, amount=Decimal(amount),
+                category=self.categories["Food"], description=description, date=date.today(),
+            )
+
+    def descriptions(self, query):
+        return [suggestion["description"] for suggestion in suggest(self.user, query)]
+
+    def test_every_word_matches_by_prefix_most_used_first(self):
+        self.assertEqual(self.descriptions("c"), ["Coffee at Blue Tokai", "Cab to office", "Coffee beans"])
+        self.assertEqual(self.descriptions("co"), ["Coffee at Blue Tokai", "Coffee beans"])
+        self.assertEqual(self.descriptions("cof bl"), ["Coffee at Blue Tokai"])
+        self.assertEqual(self.descriptions("TOK"), ["Coffee at Blue Tokai"])
+        self.assertEqual(self.descriptions("offee"), [])
+        self.assertEqual(suggest(self.user, "beans")[0]["amount"], "650.00")
+
+    @override_settings(REDIS_URL=None)
+    def test_new_rows_are_added_without_a_rebuild(self):
+        self.descriptions("co")
+        self.add("Cold coffee")
+        self.add("Cold coffee")
+
+        # Only the ledger version is read
+        with self.assertNumQueries(1):
+            self.assertEqual(self.descriptions("col"), ["Cold coffee"])
+
+    @override_settings(REDIS_URL="redis://cache")
+    def test_warm_index_with_shared_cache_needs_no_query(self):
+        self.descriptions("co")
+        self.add("Cold coffee")
+
+        # The write dropped the cached version, so it is read once more
+        with self.assertNumQueries(1):
+            self.assertEqual(self.descriptions("col"), ["Cold coffee"])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.descriptions("cold cof"), ["Cold coffee"])
+
+    @override_settings(REDIS_URL="redis://cache")
+    def test_writes_the_index_did_not_see_rebuild_it(self):
+        self.descriptions("co")
+        # As if another process renamed them: its write only shows up as a new ledger version
+        Transaction.objects.filter(user=self.user, description="Coffee beans").update(description="Tea leaves")
+        with self.captureOnCommitCallbacks(execute=True):
+            bump_version(self.user.pk)
+
+        self.assertEqual(self.descriptions("tea"), ["Tea leaves"])
+        self.assertEqual(self.descriptions("bea"), [])
+
+
+class MigrationTests(TransactionTestCase):
+    serialized_rollback = True
+
+    def migrate(self, app, name):
+        """Move ``app``'s schema to migration ``name`` and return the models as they were there"""
+        # Through the command, so the search triggers are dropped and restored around it
+        call_command("migrate", app, name, verbosity=0)
+        return MigrationExecutor(connection).loader.project_state((app, name)).apps
+
+    def tearDown(self):
+        call_command("migrate", verbosity=0)
+
+    def test_money_types_become_wallets_including_legacy_switches(self):
+        apps = self.migrate("ledger", "0005_wallet_transaction_wallet_transaction_to_wallet")
+        user = apps.get_model("accounts", "User").objects.create(username="alice")
+        Transaction = apps.get_model("ledger", "Transaction")
+        rows = {
+            name: Transaction.objects.create(
+                user=user, amount=Decimal("10"), category="Food", date=date(2026, 1, 1), **fields,
+            ).pk
+            for name, fields in {
+                "upi_income": {"transaction_type": "INCOME", "money_type": "UPI CASH"},
+                "hand_expense": {"transaction_type": "EXPENSE", "money_type": "HAND CASH"},
+                "upi_to_hand": {"transaction_type": "SWITCH", "switch_direction": "UPI_TO_HAND"},
+                "no_direction": {"transaction_type": "SWITCH", "switch_direction": None},
+            }.items()
+        }
+
+        apps = self.migrate("ledger", "0007_remove_transaction_money_type_and_more")
+        Transaction = apps.get_model("ledger", "Transaction")
+        wallets = {
+            name: (row.wallet.kind, row.to_wallet.kind if row.to_wallet_id else None)
+            for name, row in ((name, Transaction.objects.get(pk=pk)) for name, pk in rows.items())
+        }
+        self.assertEqual(wallets, {
+            "upi_income": ("UPI", None),
+            "hand_expense": ("CASH", None),
+            "upi_to_hand": ("UPI", "CASH"),
+            "no_direction": ("CASH", "UPI"),
+        })
+
+    def test_category_names_become_rows(self):
+        apps = self.migrate("ledger", "0017_category")
+        user = apps.get_model("accounts", "User").objects.create(username="alice")
+        wallet = apps.get_model("ledger", "Wallet").objects.create(user=user, name="Hand Cash", kind="CASH")
+        Transaction = apps.get_model("ledger", "Transaction")
+        for category in ("Food", "Gym", "Gym"):
+            Transaction.objects.create(
+                user=user, transaction_type="EXPENSE", wallet=wallet, amount=Decimal("10"),
+                category=category, date=date(2026, 1, 1),
+            )
+        Transaction.objects.create(
+            user=user, transaction_type="SWITCH", wallet=wallet, to_wallet=wallet, amount=Decimal("5"),
+            category="Money Transfer", date=date(2026, 1, 2),
+        )
+
+        apps = self.migrate("ledger", "0019_category_foreign_keys")
+        Category = apps.get_model("ledger", "Category")
+        rows = apps.get_model("ledger", "Transaction").objects.order_by("id").values_list("category__name", "category__user_id")
+        self.assertEqual(list(rows), [("Food", None), ("Gym", user.pk), ("Gym", user.pk), ("Money Transfer", None)])
+        self.assertEqual(Category.objects.filter(user_id=user.pk).count(), 1)
+
+
+@skipUnless(connection.vendor == "sqlite", "The FTS5 index and its triggers only exist on SQLite")
+class SqliteSearchTests(TestCase):
+    def setUp(self):
+        self.categories = {category.name: category for category in Category.objects.filter(user__isnull=True)}
+        self.user = User.objects.create_user(username="alice", password="secret-pass-123")
+        self.cash = self.user.wallets.order_by("id").first()
+
+    def found(self, query):
+        return list(search_transactions(Transaction.objects.filter(user=self.user), query, self.user).values_list("description", flat=True))
+
+    def trigger_names(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'ledger_%%_fts_%%'")
+            return {name for (name,) in cursor.fetchall()}
+
+    def test_index_follows_inserts_edits_and_deletes(self):
+        coffee = Transaction.objects.create(
+            user=self.user, transaction_type="INCOME", wallet=self.cash, amount=Decimal("5"),
+            category=self.categories["Snacks"], description="Morning coffee", date=date.today(),
+        )
+        self.assertEqual(self.found("coff"), ["Morning coffee"])
+        self.assertEqual(self.found("snack"), ["Morning coffee"])
+
+        coffee.description = "Evening tea"
+        coffee.category = self.categories["Family"]
+        coffee.save()
+        self.assertEqual((self.found("coffee"), self.found("snacks")), ([], []))
+        self.assertEqual((self.found("tea"), self.found("family")), (["Evening tea"], ["Evening tea"]))
+
+        # Renaming a category re-indexes the rows that use it
+        Category.objects.filter(pk=self.categories["Family"].pk).update(name="Relatives")
+        self.assertEqual(self.found("relatives"), ["Evening tea"])
+
+        coffee.delete()
+        self.assertEqual(self.found("tea"), [])
+
+    def test_matches_are_scoped_to_the_user_inside_the_index(self):
+        bob = User.objects.create_user(username="bob", password="secret-pass-123")
+        for user, description in [(self.user, "Morning coffee"), (bob, "Coffee with Bob")]:
+            Transaction.objects.create(
+                user=user, transaction_type="INCOME", wallet=user.wallets.order_by("id").first(), amount=Decimal("5"),
+                category=self.categories["Snacks"], description=description, date=date.today(),
+            )
+
+        # Even over every user's rows, only alice's come back
+        found = search_transactions(Transaction.objects.all(), "coffee", self.user)
+        self.assertEqual(list(found.values_list("description", flat=True)), ["Morning coffee"])
+
+    def test_triggers_are_back_after_migrate(self):
+        expected = {name for statement in SQLITE_TRIGGERS for name in re.findall(r"EXISTS (\w+)", statement)}
+        self.assertEqual(self.trigger_names(), expected)
+
+        emit_pre_migrate_signal(verbosity=0, interactive=False, db=connection.alias)
+        self.assertNotIn("ledger_category_fts_rename", self.trigger_names())
+        emit_post_migrate_signal(verbosity=0, interactive=False, db=connection.alias)
+        self.assertEqual(self.trigger_names(), expected)
+
+
+class CategoryCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="alice", password="secret-pass-123")
+
+    def names(self):
+        return [category.name for category in user_categories(self.user)]
+
+    @override_settings(REDIS_URL="redis://cache")
+    def test_shared_cache_list_is_dropped_on_change(self):
+        self.names()
+        with self.assertNumQueries(0):
+            self.names()
+
+        Category.objects.create(user=self.user, name="Gym")
+        self.assertIn("Gym", self.names())
+        Category.objects.filter(user__isnull=True, name="Loan").get().delete()
+        self.assertNotIn("Loan", self.names())
+
+    @override_settings(REDIS_URL=None)
+    def test_without_shared_cache_list_is_read_each_time(self):
+        self.names()
+        with self.assertNumQueries(1):
+            self.names()
+        self.assertFalse(cache.get(GENERATION_KEY))
+
+
+class ArchiveTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        clear_suggestions()
+        categories = {category.name: category for category in Category.objects.filter(user__isnull=True)}
+        self.user = User.objects.create_user(username="alice", password="secret-pass-123")
+        self.cash, self.upi = self.user.wallets.order_by("id")
+        self.client.force_login(self.user)
+        self.cutoff = archive_cutoff(date.today(), 3)
+        old, recent = self.cutoff - timedelta(days=40), self.cutoff + timedelta(days=5)
+        for day, kind, wallet, amount, category in [
+            (old, "INCOME", self.cash, "500", "Salary"),
+            (old, "EXPENSE", self.cash, "120", "Food"),
+            (old - timedelta(days=30), "EXPENSE", self.cash, "30", "Food"),
+            (recent, "EXPENSE", self.upi, "25", "Food"),
+        ]:
+            Transaction.objects.create(
+                user=self.user, transaction_type=kind, wallet=wallet, amount=Decimal(amount),
+                category=categories[category], date=day, description=f"{category} {amount}",
+            )
+        Transaction.objects.create(
+            user=self.user, transaction_type="SWITCH", wallet=self.cash, to_wallet=self.upi,
+            amount=Decimal("200"), category=categories[Category.TRANSFER], date=old,
+        )
+
+    def totals(self, **params):
+        cache.clear()
+        context = self.client.get("/", params).context
+        return context["total_income"], context["total_expense"], context["balance"]
+
+    def test_archiving_keeps_balances_and_totals(self):
+        part_month = {"start_date": (self.cutoff - timedelta(days=25)).isoformat()}
+        before = wallet_balances(self.user), self.totals(), self.totals(**part_month), self.totals(q="food")
+
+        self.assertEqual(archive_user(self.user, self.cutoff), 4)
+
+        self.assertEqual((wallet_balances(self.user), self.totals(), self.totals(**part_month), self.totals(q="food")), before)
+        self.assertEqual(Transaction.objects.filter(user=self.user).count(), 1)
+        self.assertEqual(ArchivedTransaction.objects.filter(user=self.user).count(), 4)
+        self.assertFalse(Tombstone.objects.exists())
+        self.assertEqual(archive_user(self.user, self.cutoff), 0)
+
+    def test_archived_period_is_closed_and_searchable(self):
+        archive_user(self.user, self.cutoff)
+        response = self.client.post("/ledger/add/", {
+            "transaction_type": "EXPENSE", "wallet": self.cash.pk, "amount": "1",
+            "category": Category.objects.get(name="Food", user__isnull=True).pk,
+            "date": (self.cutoff - timedelta(days=1)).isoformat(),
+        })
+        self.assertIn("date", response.context["form"].errors)
+
+        response = self.client.get("/ledger/archive/", {"q": "food", "export": "csv"})
+        self.assertEqual(len(b"".join(response.streaming_content).decode().splitlines()), 3)
+
+    def test_cutoff_follows_the_archive_row(self):
+        self.assertIsNone(archived_before(self.user))
+        archive_user(self.user, self.cutoff)
+        self.assertEqual(archived_before(self.user), self.cutoff)
+
+        # Another worker's archive run only changes the row, so nothing cached may hide it
+        later = archive_cutoff(date.today(), 1)
+        LedgerArchive.objects.filter(user=self.user).update(archived_before=later)
+        self.assertEqual(archived_before(self.user), later)
+
+
+class RecurringRuleTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        clear_suggestions()
+        self.categories = {category.name: category for category in Category.objects.filter(user__isnull=True)}
+        self.user = User.objects.create_user(username="alice", password="secret-pass-123")
+        self.cash = self.user.wallets.order_by("id").first()
+
+    def rule(self, transaction_type, amount, category, start_date, **schedule):
+        rule = RecurringRule(
+            user=self.user, transaction_type=transaction_type, wallet=self.cash, amount=Decimal(amount),
+            category=self.categories[category], start_date=start_date, **schedule,
+        )
+        rule.next_date = first_occurrence(rule)
+        rule.save()
+        return rule
+
+    def test_counting_matches_listing_occurrences(self):
+        for frequency, interval, start in [("MONTHLY", 1, date(2024, 1, 31)), ("WEEKLY", 2, date(2024, 2, 29)), ("YEARLY", 1, date(2024, 2, 29))]:
+            rule = RecurringRule(frequency=frequency, interval=interval, start_date=start, end_date=date(2027, 3, 1))
+            listed = [occurrence(rule, index) for index in range(200)]
+            listed = [day for day in listed if day <= rule.end_date]
+            for first, last in [(date(2024, 2, 1), date(2024, 3, 30)), (date(2023, 1, 1), date(2030, 1, 1)), (date(2025, 2, 28), date(2025, 2, 28))]:
+                self.assertEqual(count_between(rule, first, last), sum(first <= day <= last for day in listed))
+        self.assertEqual(occurrence(RecurringRule(frequency="MONTHLY", interval=1, start_date=date(2024, 1, 31)), 1), date(2024, 2, 29))
+
+    def test_due_occurrences_are_saved_once_and_unaffordable_ones_held(self):
+        start = date.today().replace(day=1) - timedelta(days=40)
+        salary = self.rule("INCOME", "1000", "Salary", start)
+        rent = self.rule("EXPENSE", "1000", "Food", start)
+        extra = self.rule("EXPENSE", "1", "Food", start)
+
+        created, held, user_ids = materialize_due(date.today())
+
+        # Salary lands before rent on the same day, which leaves nothing for the extra expense
+        self.assertEqual((created, held, user_ids), (4, 1, [self.user.pk]))
+        self.assertEqual(wallet_balance(self.cash), Decimal("0"))
+        self.assertEqual(salary.transactions.count(), 2)
+        self.assertEqual(rent.transactions.count(), 2)
+        extra.refresh_from_db()
+        self.assertEqual(extra.next_date, start)
+        self.assertEqual(materialize_due(date.today())[:2], (0, 1))
+
+    def test_command_only_queues_summaries_when_they_are_precomputed(self):
+        self.rule("INCOME", "1000", "Salary", date.today() - timedelta(days=3))
+        with override_settings(PRECOMPUTE_SUMMARIES=False):
+            call_command("materialize_recurring", stdout=StringIO())
+        self.assertFalse(SummaryJob.objects.exists())
+        self.assertEqual(Transaction.objects.filter(user=self.user).count(), 1)
+
+        self.rule("INCOME", "5", "Salary", date.today())
+        with override_settings(PRECOMPUTE_SUMMARIES=True):
+            call_command("materialize_recurring", stdout=StringIO())
+        self.assertEqual(list(SummaryJob.objects.values_list("user_id", "status")), [(self.user.pk, "PENDING")])
+
+
+def receipt_upload(content, name="receipt.jpg"):
+    upload = BytesIO(content)
+    upload.name = name
+    return upload
+
+
+class ReceiptTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        media = override_settings(MEDIA_ROOT=self.media)
+        media.enable()
+        self.addCleanup(media.disable)
+
+        categories = {category.name: category for category in Category.objects.filter(user__isnull=True)}
+        self.user = User.objects.create_user(username="alice", password="secret-pass-123")
+        cash = self.user.wallets.order_by("id").first()
+        self.transactions = [
+            Transaction.objects.create(
+                user=self.user, transaction_type="INCOME", wallet=cash, amount=Decimal(amount),
+                category=categories["Salary"], date=date.today(),
+            )
+            for amount in ("100", "200")
+        ]
+        self.client.force_login(self.user)
+        photo = BytesIO()
+        Image.new("RGB", (1200, 800), "white").save(photo, "JPEG")
+        self.photo = photo.getvalue()
+
+    def test_same_receipt_is_stored_once_and_only_shown_to_its_owner(self):
+        for transaction in self.transactions:
+            self.client.post(f"/ledger/{transaction.pk}/receipt/", {"receipt": receipt_upload(self.photo)})
+        self.client.post(f"/ledger/{self.transactions[0].pk}/receipt/", {"receipt": receipt_upload(b"MZ\x90\x00", "receipt.jpg")})
+
+        receipt = Receipt.objects.get()
+        self.assertEqual(set(Transaction.objects.values_list("receipt", flat=True)), {receipt.pk})
+        self.assertEqual(receipt.thumbnail_status, "PENDING")
+        response = self.client.get(f"/ledger/receipts/{receipt.pk}/")
+        self.assertEqual(b"".join(response.streaming_content), self.photo)
+
+        self.client.force_login(User.objects.create_user(username="bob", password="secret-pass-123"))
+        self.assertEqual(self.client.get(f"/ledger/receipts/{receipt.pk}/").status_code, 404)
+
+    def test_oversized_upload_is_cut_off(self):
+        with override_settings(RECEIPT_MAX_BYTES=1024):
+            self.client.post(f"/ledger/{self.transactions[0].pk}/receipt/", {"receipt": receipt_upload(self.photo)})
+        self.assertFalse(Receipt.objects.exists())
+        self.assertEqual(os.listdir(self.media), [])
+
+    def test_thumbnail_is_served_once_rendered(self):
+        transaction = self.transactions[0]
+        self.client.post(f"/ledger/{transaction.pk}/receipt/", {"receipt": receipt_upload(self.photo)})
+        thumbnail_url = f"/ledger/receipts/{Receipt.objects.get().pk}/thumbnail/"
+        self.assertEqual(self.client.get(thumbnail_url).status_code, 302)
+
+        receipt, = claim_thumbnails(10)
+        finish_thumbnail(receipt, render_thumbnail(receipt.file.name, receipt.sha256))
+
+        response = self.client.get(thumbnail_url)
+        self.assertEqual(Image.open(BytesIO(b"".join(response.streaming_content))).size, (160, 107))
+        self.assertIn("immutable", response["Cache-Control"])
@@ -1,7 +1,19 @@
 from django.urls import path
-from .views import add_transaction, switch_money
+from .views import add_transaction, switch_money, wallets, budgets, edit_transaction, delete_transaction, bulk_transactions, categories, transaction_suggestions, archive, recurring, transaction_receipt, receipt_file, receipt_thumbnail
 
 urlpatterns = [
     path("add/", add_transaction, name="add_transaction"),
+    path("suggestions/", transaction_suggestions, name="transaction_suggestions"),
     path("switch/", switch_money, name="switch_money"),
+    path("<int:pk>/edit/", edit_transaction, name="edit_transaction"),
+    path("<int:pk>/delete/", delete_transaction, name="delete_transaction"),
+    path("<int:pk>/receipt/", transaction_receipt, name="transaction_receipt"),
+    path("receipts/<int:pk>/", receipt_file, name="receipt_file"),
+    path("receipts/<int:pk>/thumbnail/", receipt_thumbnail, name="receipt_thumbnail"),
+    path("bulk/", bulk_transactions, name="bulk_transactions"),
+    path("wallets/", wallets, name="wallets"),
+    path("budgets/", budgets, name="budgets"),
+    path("recurring/", recurring, name="recurring"),
+    path("categories/", categories, name="categories"),
+    path("archive/", archive, name="archive"),
 ]
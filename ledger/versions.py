@@ -0,0 +1,91 @@
+"""
+Per-user ledger versions used as cheap cache validators.
+
+Every write to a user's transactions, wallets or budgets bumps
+``LedgerVersion.version`` and stamps ``changed_at``, so a view can tell
+whether anything changed with a single primary-key read.
+
+With a shared cache (``REDIS_URL``) ``cached_version`` answers from the
+cache instead: each bump drops the user's entry once it commits, and the
+next read takes the number from the database again. A per-process cache
+would miss other processes' writes, so without Redis it reads the row.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction as db_transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import LedgerVersion
+
+# Also bounds how long a number can outlive a lost invalidation
+CACHE_SECONDS = 60
+
+
+def _key(user_id):
+    return f"ledger-version:{user_id}"
+
+
+def _forget_cached(user_ids):
+    if settings.REDIS_URL:
+        # Only once committed, so a reader can't cache the number from before the write
+        db_transaction.on_commit(lambda: cache.delete_many([_key(user_id) for user_id in user_ids]))
+
+
+def bump_version(user_id):
+    """
+    Record a write to ``user_id``'s ledger and return the new version.
+
+    Call inside the write's ``atomic()`` block: the row lock taken by the
+    UPDATE is held until commit, so concurrent writers for one user get
+    versions in commit order.
+    """
+    _forget_cached([user_id])
+    now = timezone.now()
+    versions = LedgerVersion.objects.filter(user_id=user_id)
+    if not versions.update(version=F("version") + 1, changed_at=now):
+        try:
+            with db_transaction.atomic():
+                LedgerVersion.objects.create(user_id=user_id, version=1, changed_at=now)
+            return 1
+        except IntegrityError:
+            # Another request created the row first
+            versions.update(version=F("version") + 1, changed_at=now)
+    return versions.values_list("version", flat=True).get()
+
+
+def bump_versions(user_ids):
+    """
+    Bulk form of ``bump_version``: record a write for each of ``user_ids`` and return ``{user_id: version}``.
+
+    Costs one UPDATE and one SELECT however many users there are. Call
+    inside the write's ``atomic()`` block, as for ``bump_version``.
+    """
+    user_ids = sorted(set(user_ids))
+    if not user_ids:
+        return {}
+    _forget_cached(user_ids)
+    now = timezone.now()
+    versions = LedgerVersion.objects.filter(user_id__in=user_ids)
+    versions.update(version=F("version") + 1, changed_at=now)
+    bumped = dict(versions.values_list("user_id", "version"))
+    for user_id in user_ids:
+        if user_id not in bumped:
+            bumped[user_id] = bump_version(user_id)
+    return bumped
+
+
+def get_version(user):
+    """``user``'s ledger version; an unsaved version 0 if they have never written"""
+    return LedgerVersion.objects.filter(user=user).first() or LedgerVersion(user=user)
+
+
+def cached_version(user_id):
+    """``user_id``'s version number, from the shared cache when there is one (at most one query)"""
+    if not settings.REDIS_URL:
+        return LedgerVersion.objects.filter(user_id=user_id).values_list("version", flat=True).first() or 0
+    version = cache.get(_key(user_id))
+    if version is None:
+        version = LedgerVersion.objects.filter(user_id=user_id).values_list("version", flat=True).first() or 0
+        cache.set(_key(user_id), version, CACHE_SECONDS)
+    return version
@@ -1,91 +1,398 @@
-from django.shortcuts import render, redirect
+import copy
+import csv
+from datetime import date, timedelta
+from django.conf import settings
+from django.db import transaction as db_transaction
+from django.db.models import RestrictedError
+from django.core.paginator import Paginator
+from django.http import FileResponse, Http404, JsonResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404, render, redirect
+from django.template.defaultfilters import filesizeformat
+from django.templatetags.static import static
+from django.utils.cache import patch_cache_control
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Sum
-from .forms import TransactionForm, SwitchForm
-from .models import Transaction
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+from django.views.decorators.http import require_GET, require_POST
+from .archive import archived_before, search_archived
+from .balances import lock_wallets, wallet_balance, wallets_with_balances
+from .budgets import apply_spend, budget_for, budgets_for_month
+from .edits import LedgerError, delete_transactions, recategorize, update_transaction
+from .categories import transfer_category, user_categories
+from .forms import TransactionForm, SwitchForm, WalletForm, BudgetForm, BulkActionForm, CategoryForm, RecurringRuleForm, ReceiptForm
+from .idempotency import find_original, save_once
+from .models import ArchivedTransaction, Budget, Category, RecurringRule, Transaction
+from .receipts import ReceiptUploadHandler, owned_receipt, store_receipt
+from .recurring import first_occurrence, materialize_due, next_after
+from .suggestions import suggest
+from dashboard.jobs import enqueue_summary_refresh
 
 @login_required
 def add_transaction(request):
     if request.method == "POST":
-        form = TransactionForm(request.POST)
+        # A retried submission returns the original result without re-validating
+        if find_original(request.user, request.POST.get("idempotency_key")):
+            return redirect("dashboard")
+
+        form = TransactionForm(request.POST, user=request.user)
         if form.is_valid():
             transaction = form.save(commit=False)
             transaction.user = request.user
-            
-            # Validate sufficient balance for expenses
-            if transaction.transaction_type == "EXPENSE":
-                all_transactions = Transaction.objects.filter(user=request.user)
-                
-                if transaction.money_type == "UPI CASH":
-                    upi_income = all_transactions.filter(transaction_type="INCOME", money_type="UPI CASH").aggregate(total=Sum("amount"))["total"] or 0
-                    upi_expense = all_transactions.filter(transaction_type="EXPENSE", money_type="UPI CASH").aggregate(total=Sum("amount"))["total"] or 0
-                    upi_from_switch = all_transactions.filter(transaction_type="SWITCH", switch_direction="HAND_TO_UPI").aggregate(total=Sum("amount"))["total"] or 0
-                    upi_to_switch = all_transactions.filter(transaction_type="SWITCH", switch_direction="UPI_TO_HAND").aggregate(total=Sum("amount"))["total"] or 0
-                    upi_balance = upi_income - upi_expense + upi_from_switch - upi_to_switch
-                    
-                    if transaction.amount > upi_balance:
-                        messages.error(request, f"⚠️ Insufficient UPI Cash balance! Available: ₹{upi_balance:.2f}, Required: ₹{transaction.amount}")
-                        return render(request, "ledger/add_transaction.html", {"form": form})
-                
-                elif transaction.money_type == "HAND CASH":
-                    hand_income = all_transactions.filter(transaction_type="INCOME", money_type="HAND CASH").aggregate(total=Sum("amount"))["total"] or 0
-                    hand_expense = all_transactions.filter(transaction_type="EXPENSE", money_type="HAND CASH").aggregate(total=Sum("amount"))["total"] or 0
-                    hand_from_switch = all_transactions.filter(transaction_type="SWITCH", switch_direction="UPI_TO_HAND").aggregate(total=Sum("amount"))["total"] or 0
-                    hand_to_switch = all_transactions.filter(transaction_type="SWITCH", switch_direction="HAND_TO_UPI").aggregate(total=Sum("amount"))["total"] or 0
-                    hand_balance = hand_income - hand_expense + hand_from_switch - hand_to_switch
-                    
-                    if transaction.amount > hand_balance:
-                        messages.error(request, f"⚠️ Insufficient Hand Cash balance! Available: ₹{hand_balance:.2f}, Required: ₹{transaction.amount}")
+            transaction.idempotency_key = form.cleaned_data["idempotency_key"] or None
+
+            def record_spend(saved):
+                if saved.transaction_type == "EXPENSE":
+                    apply_spend(request.user, saved.category_id, saved.date, saved.amount)
+
+            # The wallet stays locked from the balance check until the row is saved,
+            # so two expenses posted at once can't both spend the same money
+            with db_transaction.atomic():
+                # Validate sufficient balance for anything that takes money out
+                if transaction.transaction_type != "INCOME":
+                    lock_wallets([transaction.wallet_id])
+                    available = wallet_balance(transaction.wallet)
+
+                    if transaction.amount > available:
+                        messages.error(request, f"⚠️ Insufficient {transaction.wallet.name} balance! Available: ₹{available:.2f}, Required: ₹{transaction.amount}")
                         return render(request, "ledger/add_transaction.html", {"form": form})
-            
-            transaction.save()
+
+                if transaction.transaction_type == "EXPENSE":
+                    # Budget check is a single-row read of the month's running total
+                    budget = budget_for(request.user, transaction.category, transaction.date)
+                    if budget and budget.spent + transaction.amount > budget.amount:
+                        over_message = f"🎯 {transaction.category} budget exceeded! Budget: ₹{budget.amount:.2f}, Spent this month: ₹{budget.spent:.2f}, This expense: ₹{transaction.amount}"
+                        if budget.hard_limit:
+                            messages.error(request, over_message)
+                            return render(request, "ledger/add_transaction.html", {"form": form})
+                        messages.warning(request, over_message)
+
+                _, created = save_once(transaction, record_spend)
+            if created:
+                enqueue_summary_refresh(request.user)
             return redirect("dashboard")
     else:
-        form = TransactionForm()
+        form = TransactionForm(user=request.user)
 
     return render(request, "ledger/add_transaction.html", {"form": form})
 
+@login_required
+@require_GET
+def transaction_suggestions(request):
+    # Answered from the in-memory index; with Redis a warm index needs no database query
+    return JsonResponse({"suggestions": suggest(request.user, request.GET.get("q", ""))})
+
 @login_required
 def switch_money(request):
     if request.method == "POST":
-        form = SwitchForm(request.POST)
+        if find_original(request.user, request.POST.get("idempotency_key")):
+            return redirect("dashboard")
+
+        form = SwitchForm(request.POST, user=request.user)
         if form.is_valid():
             transaction = form.save(commit=False)
             transaction.user = request.user
+            transaction.idempotency_key = form.cleaned_data["idempotency_key"] or None
             transaction.transaction_type = "SWITCH"
-            transaction.category = "Money Transfer"
-            
-            # Validate sufficient balance for switch
-            all_transactions = Transaction.objects.filter(user=request.user)
-            
-            if transaction.switch_direction == "UPI_TO_HAND":
-                upi_income = all_transactions.filter(transaction_type="INCOME", money_type="UPI CASH").aggregate(total=Sum("amount"))["total"] or 0
-                upi_expense = all_transactions.filter(transaction_type="EXPENSE", money_type="UPI CASH").aggregate(total=Sum("amount"))["total"] or 0
-                upi_from_switch = all_transactions.filter(transaction_type="SWITCH", switch_direction="HAND_TO_UPI").aggregate(total=Sum("amount"))["total"] or 0
-                upi_to_switch = all_transactions.filter(transaction_type="SWITCH", switch_direction="UPI_TO_HAND").aggregate(total=Sum("amount"))["total"] or 0
-                upi_balance = upi_income - upi_expense + upi_from_switch - upi_to_switch
-                
-                if transaction.amount > upi_balance:
-                    messages.error(request, f"⚠️ Insufficient UPI Cash balance! Available: ₹{upi_balance:.2f}, Required: ₹{transaction.amount}")
-                    return render(request, "ledger/switch_money.html", {"form": form})
-            
-            elif transaction.switch_direction == "HAND_TO_UPI":
-                hand_income = all_transactions.filter(transaction_type="INCOME", money_type="HAND CASH").aggregate(total=Sum("amount"))["total"] or 0
-                hand_expense = all_transactions.filter(transaction_type="EXPENSE", money_type="HAND CASH").aggregate(total=Sum("amount"))["total"] or 0
-                hand_from_switch = all_transactions.filter(transaction_type="SWITCH", switch_direction="UPI_TO_HAND").aggregate(total=Sum("amount"))["total"] or 0
-                hand_to_switch = all_transactions.filter(transaction_type="SWITCH", switch_direction="HAND_TO_UPI").aggregate(total=Sum("amount"))["total"] or 0
-                hand_balance = hand_income - hand_expense + hand_from_switch - hand_to_switch
-                
-                if transaction.amount > hand_balance:
-                    messages.error(request, f"⚠️ Insufficient Hand Cash balance! Available: ₹{hand_balance:.2f}, Required: ₹{transaction.amount}")
-                    return render(request, "ledger/switch_money.html", {"form": form})
-            
+            transaction.category = transfer_category(request.user)
+
             if not transaction.description:
-                transaction.description = f"Switched from {dict(transaction.SWITCH_DIRECTION)[transaction.switch_direction]}"
-            transaction.save()
+                transaction.description = f"Switched from {transaction.wallet.name} to {transaction.to_wallet.name}"
+
+            with db_transaction.atomic():
+                # Validate sufficient balance in the source wallet, locked until the switch is saved
+                lock_wallets([transaction.wallet_id, transaction.to_wallet_id])
+                available = wallet_balance(transaction.wallet)
+
+                if transaction.amount > available:
+                    messages.error(request, f"⚠️ Insufficient {transaction.wallet.name} balance! Available: ₹{available:.2f}, Required: ₹{transaction.amount}")
+                    return render(request, "ledger/switch_money.html", {"form": form})
+
+                _, created = save_once(transaction)
+            if created:
+                enqueue_summary_refresh(request.user)
             return redirect("dashboard")
     else:
-        form = SwitchForm()
-    
+        form = SwitchForm(user=request.user)
+
     return render(request, "ledger/switch_money.html", {"form": form})
+
+@login_required
+def edit_transaction(request, pk):
+    transaction = get_object_or_404(Transaction.objects.select_related("wallet", "to_wallet", "receipt"), pk=pk, user=request.user)
+    # The form writes into the instance, so keep the stored state for the checks
+    original = copy.copy(transaction)
+    if transaction.transaction_type == "SWITCH":
+        form_class, template = SwitchForm, "ledger/switch_money.html"
+    else:
+        form_class, template = TransactionForm, "ledger/add_transaction.html"
+
+    if request.method == "POST":
+        form = form_class(request.POST, instance=transaction, user=request.user)
+        if form.is_valid():
+            transaction = form.save(commit=False)
+            if transaction.transaction_type == "SWITCH" and not transaction.description:
+                transaction.description = f"Switched from {transaction.wallet.name} to {transaction.to_wallet.name}"
+            try:
+                warnings = update_transaction(original, transaction)
+            except LedgerError as error:
+                messages.error(request, str(error))
+                return render(request, template, {"form": form, "transaction": original})
+
+            for warning in warnings:
+                messages.warning(request, warning)
+            enqueue_summary_refresh(request.user)
+            return redirect("dashboard")
+    else:
+        form = form_class(instance=transaction, user=request.user)
+
+    return render(request, template, {"form": form, "transaction": original})
+
+@login_required
+@require_POST
+def delete_transaction(request, pk):
+    transaction = get_object_or_404(Transaction, pk=pk, user=request.user)
+    try:
+        delete_transactions(request.user, [transaction])
+    except LedgerError as error:
+        messages.error(request, str(error))
+        return redirect("edit_transaction", pk=pk)
+
+    enqueue_summary_refresh(request.user)
+    messages.success(request, "Transaction deleted.")
+    return redirect("dashboard")
+
+@csrf_exempt
+@login_required
+@require_POST
+def transaction_receipt(request, pk):
+    # Upload handlers must be swapped before anything reads the body, and the
+    # CSRF check does, so it runs inside instead
+    request.upload_handlers = [ReceiptUploadHandler(request)]
+    return _transaction_receipt(request, pk)
+
+@csrf_protect
+def _transaction_receipt(request, pk):
+    transaction = get_object_or_404(Transaction, pk=pk, user=request.user)
+    if request.POST.get("action") == "remove":
+        transaction.receipt = None
+        message = "Receipt removed."
+    else:
+        form = ReceiptForm(request.POST, request.FILES)
+        if request.upload_handlers[0].too_large:
+            messages.error(request, f"Receipts can be at most {filesizeformat(settings.RECEIPT_MAX_BYTES)}.")
+            return redirect("edit_transaction", pk=pk)
+        if not form.is_valid():
+            messages.error(request, form.errors["receipt"][0])
+            return redirect("edit_transaction", pk=pk)
+        transaction.receipt = store_receipt(form.cleaned_data["receipt"])
+        message = "Receipt attached."
+
+    # seq is stamped on save, so sync clients see the change
+    transaction.save(update_fields=["receipt", "seq"])
+    messages.success(request, message)
+    return redirect("edit_transaction", pk=pk)
+
+def _receipt_response(file, content_type):
+    response = FileResponse(file.open("rb"), content_type=content_type)
+    # Receipts are stored by content and never change, so the browser can keep them
+    patch_cache_control(response, private=True, max_age=365 * 24 * 60 * 60, immutable=True)
+    return response
+
+@login_required
+@require_GET
+def receipt_file(request, pk):
+    receipt = owned_receipt(request.user, pk)
+    if receipt is None:
+        raise Http404
+    return _receipt_response(receipt.file, receipt.content_type)
+
+@login_required
+@require_GET
+def receipt_thumbnail(request, pk):
+    receipt = owned_receipt(request.user, pk)
+    if receipt is None:
+        raise Http404
+    if receipt.thumbnail_status == "DONE":
+        return _receipt_response(receipt.thumbnail, "image/jpeg")
+    response = redirect(static("img/receipt.svg"))
+    # Until the worker has rendered it; PDFs keep the icon for good
+    if receipt.thumbnail_status == "NONE":
+        patch_cache_control(response, private=True, max_age=365 * 24 * 60 * 60, immutable=True)
+    else:
+        patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+@login_required
+@require_POST
+def bulk_transactions(request):
+    form = BulkActionForm(request.POST, user=request.user)
+    if not form.is_valid():
+        messages.error(request, "⚠️ Select some transactions and an action.")
+        return redirect("dashboard")
+
+    ids = form.cleaned_data["ids"]
+    try:
+        if form.cleaned_data["action"] == "delete":
+            count = delete_transactions(request.user, Transaction.objects.filter(user=request.user, pk__in=ids))
+            messages.success(request, f"Deleted {count} transaction(s).")
+        else:
+            count, warnings = recategorize(request.user, ids, form.cleaned_data["category"])
+            for warning in warnings:
+                messages.warning(request, warning)
+            messages.success(request, f"Moved {count} transaction(s) to {form.cleaned_data['category']}.")
+    except LedgerError as error:
+        messages.error(request, str(error))
+        return redirect("dashboard")
+
+    if count:
+        enqueue_summary_refresh(request.user)
+    return redirect("dashboard")
+
+@login_required
+def wallets(request):
+    if request.method == "POST":
+        form = WalletForm(request.POST, user=request.user)
+        if form.is_valid():
+            wallet = form.save(commit=False)
+            wallet.user = request.user
+            wallet.save()
+            messages.success(request, f"Wallet '{wallet.name}' added.")
+            return redirect("wallets")
+    else:
+        form = WalletForm(user=request.user)
+
+    return render(request, "ledger/wallets.html", {"form": form, "wallets": wallets_with_balances(request.user)})
+
+@login_required
+def budgets(request):
+    if request.method == "POST":
+        if request.POST.get("delete", "").isdigit():
+            Budget.objects.filter(user=request.user, pk=request.POST["delete"]).delete()
+            return redirect("budgets")
+
+        form = BudgetForm(request.POST, user=request.user)
+        if form.is_valid():
+            budget, _ = Budget.objects.update_or_create(
+                user=request.user,
+                category=form.cleaned_data["category"],
+                defaults={"amount": form.cleaned_data["amount"], "hard_limit": form.cleaned_data["hard_limit"]},
+            )
+            messages.success(request, f"Budget for {budget.category} set to ₹{budget.amount}.")
+            return redirect("budgets")
+    else:
+        form = BudgetForm(user=request.user)
+
+    return render(request, "ledger/budgets.html", {"form": form, "budgets": budgets_for_month(request.user, date.today())})
+
+def _materialize_now(request, saved_message):
+    # Occurrences already due are saved straight away instead of waiting for the daily job
+    created, held, _ = materialize_due(date.today(), user_ids=[request.user.pk])
+    if created:
+        saved_message += f" {created} due transaction(s) added."
+    messages.success(request, saved_message)
+    if held:
+        messages.error(request, "⚠️ A due expense was held back: its wallet balance is too low or its budget blocks it. It will be added once it fits.")
+    enqueue_summary_refresh(request.user)
+
+@login_required
+def recurring(request):
+    if request.method == "POST":
+        if request.POST.get("delete", "").isdigit():
+            RecurringRule.objects.filter(user=request.user, pk=request.POST["delete"]).delete()
+            enqueue_summary_refresh(request.user)
+            return redirect("recurring")
+
+        if request.POST.get("toggle", "").isdigit():
+            rule = get_object_or_404(RecurringRule, user=request.user, pk=request.POST["toggle"])
+            rule.active = not rule.active
+            if rule.active and rule.next_date and rule.next_date < date.today():
+                # Occurrences that fell while the rule was paused are skipped
+                rule.next_date = next_after(rule, date.today() - timedelta(days=1))
+            rule.save(update_fields=["active", "next_date"])
+            _materialize_now(request, f"Rule {'resumed' if rule.active else 'paused'}.")
+            return redirect("recurring")
+
+        form = RecurringRuleForm(request.POST, user=request.user)
+        if form.is_valid():
+            rule = form.save(commit=False)
+            rule.user = request.user
+            rule.next_date = first_occurrence(rule)
+            rule.save()
+            _materialize_now(request, "Recurring rule saved.")
+            return redirect("recurring")
+    else:
+        form = RecurringRuleForm(user=request.user, initial={"start_date": date.today()})
+
+    rules = RecurringRule.objects.filter(user=request.user).select_related("wallet", "category").order_by("-active", "next_date", "pk")
+    return render(request, "ledger/recurring.html", {"form": form, "rules": rules})
+
+@login_required
+def categories(request):
+    if request.method == "POST":
+        if request.POST.get("delete", "").isdigit():
+            category = get_object_or_404(Category, user=request.user, pk=request.POST["delete"])
+            try:
+                category.delete()
+                messages.success(request, f"Category '{category.name}' removed.")
+            except RestrictedError:
+                messages.error(request, f"⚠️ '{category.name}' is used by transactions; move them to another category first.")
+            return redirect("categories")
+
+        form = CategoryForm(request.POST, user=request.user)
+        if form.is_valid():
+            category = form.save(commit=False)
+            category.user = request.user
+            category.save()
+            messages.success(request, f"Category '{category.name}' added.")
+            return redirect("categories")
+    else:
+        form = CategoryForm(user=request.user)
+
+    return render(request, "ledger/categories.html", {"form": form, "categories": user_categories(request.user)})
+
+class _Echo:
+    """File-like object for csv.writer that hands each line back instead of storing it"""
+    def write(self, value):
+        return value
+
+def _archive_csv(rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(["id", "date", "type", "wallet", "to_wallet", "category", "amount", "description"])
+    for t in rows.iterator(chunk_size=2000):
+        yield writer.writerow([
+            t.id, t.date.isoformat(), t.transaction_type, t.wallet.name,
+            t.to_wallet.name if t.to_wallet_id else "", t.category.name, t.amount, t.description,
+        ])
+
+@login_required
+@require_GET
+def archive(request):
+    query = request.GET.get("q", "").strip()
+    start_date = request.GET.get("start_date", "")
+    end_date = request.GET.get("end_date", "")
+
+    rows = search_archived(
+        ArchivedTransaction.objects.filter(user=request.user).select_related("wallet", "to_wallet", "category"),
+        query,
+    ).order_by("-date", "-id")
+    try:
+        if start_date:
+            rows = rows.filter(date__gte=date.fromisoformat(start_date))
+        if end_date:
+            rows = rows.filter(date__lte=date.fromisoformat(end_date))
+    except ValueError:
+        pass
+
+    if request.GET.get("export") == "csv":
+        # Streamed, so exporting years of history doesn't build the whole file in memory
+        response = StreamingHttpResponse(_archive_csv(rows), content_type="text/csv")
+        response["Content-Disposition"] = 'attachment; filename="archived-transactions.csv"'
+        return response
+
+    return render(request, "ledger/archive.html", {
+        "page": Paginator(rows, 50).get_page(request.GET.get("page")),
+        "query": query,
+        "start_date": start_date,
+        "end_date": end_date,
+        "archived_before": archived_before(request.user),
+    })
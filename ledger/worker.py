@@ -0,0 +1,12 @@
+"""
+Entry points run inside the receipt worker's child processes.
+
+As in ``dashboard.worker``, spawned children unpickle these before Django is
+configured, so this module must not import models at import time.
+"""
+
+
+def render_thumbnail(file_name, sha256):
+    from .receipts import render_thumbnail
+
+    return render_thumbnail(file_name, sha256)
@@ -46,6 +46,12 @@ ENABLE_ENCRYPTION = os.getenv("ENABLE_ENCRYPTION", "false").lower() == "true"
 
 PRODUCTION_MODE = os.getenv("PRODUCTION_MODE", "false").lower() == "true"
 
+# Serve survival/analytics summaries from snapshots refreshed by `manage.py run_summary_worker`
+PRECOMPUTE_SUMMARIES = os.getenv("PRECOMPUTE_SUMMARIES", "false").lower() == "true"
+
+# Whole months kept in the live transaction table by `manage.py archive_transactions`
+ARCHIVE_AFTER_MONTHS = int(os.getenv("ARCHIVE_AFTER_MONTHS", "24"))
+
 if not ENABLE_ENCRYPTION:
     if SECRET_KEY is None:
         raise Exception("ENABLE_ENCRYPTION is True but SECRET_KEY is not set")
@@ -67,15 +73,18 @@ INSTALLED_APPS = [
     "django.contrib.contenttypes",
     "django.contrib.sessions",
     "django.contrib.messages",
+    "whitenoise.runserver_nostatic",
     "django.contrib.staticfiles",
     "django.contrib.humanize",
     "accounts",
     "dashboard",
     "ledger",
+    "api",
 ]
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "whitenoise.middleware.WhiteNoiseMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -107,6 +116,20 @@ WSGI_APPLICATION = "money_log.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Postgres connection pool for PRODUCTION_MODE (needs psycopg 3 with psycopg_pool).
+# Each process keeps up to max_size connections open and hands them to requests,
+# so the TLS handshake is paid when the pool grows, not on every request
+DB_POOL = os.getenv("DB_POOL", "true").lower() == "true"
+DB_POOL_OPTIONS = {
+    "min_size": int(os.getenv("DB_POOL_MIN_SIZE", "2")),
+    "max_size": int(os.getenv("DB_POOL_MAX_SIZE", "10")),
+    # Seconds a request waits for a free connection before failing
+    "timeout": float(os.getenv("DB_POOL_TIMEOUT", "10")),
+    # Idle connections above min_size are closed after this many seconds
+    "max_idle": float(os.getenv("DB_POOL_MAX_IDLE", "300")),
+    # Connections are replaced after this many seconds
+    "max_lifetime": float(os.getenv("DB_POOL_MAX_LIFETIME", "1800")),
+}
 
 if PRODUCTION_MODE:
     import os
@@ -132,20 +155,76 @@ if PRODUCTION_MODE:
     DATABASES = {
     "default": dj_database_url.config(
         default=default,
-        conn_max_age=600,
+        # Django refuses persistent connections on top of a pool
+        conn_max_age=0 if DB_POOL else 600,
+        # Check a persistent connection before reusing it; the pool checks its own on checkout
+        conn_health_checks=not DB_POOL,
         ssl_require=True
         )
     }
 
+    if DB_POOL:
+        DATABASES["default"]["OPTIONS"]["pool"] = DB_POOL_OPTIONS
+
 
 else:
     DATABASES = {
         "default": {
             "ENGINE": "django.db.backends.sqlite3",
             "NAME": BASE_DIR / "db.sqlite3",
+            "OPTIONS": {
+                # SQLite has no row locks: take the write lock when a transaction
+                # starts, so a balance check and its insert can't interleave with
+                # another writer, and wait for it rather than failing at once
+                "transaction_mode": "IMMEDIATE",
+                "timeout": 20,
+            },
+            # A file rather than the shared in-memory database, whose table
+            # locks fail at once instead of waiting; the concurrency tests
+            # post from several threads
+            "TEST": {"NAME": BASE_DIR / "test_db.sqlite3"},
+        }
+    }
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Rendered dashboard pages are cached per user; set REDIS_URL to share them across processes
+
+REDIS_URL = os.getenv("REDIS_URL")
+
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
         }
     }
 
+PAGE_CACHE_SECONDS = int(os.getenv("PAGE_CACHE_SECONDS", "300"))
+
+# A logout or password change only reaches other processes through a shared
+# cache, so sessions and request.user are only cached when REDIS_URL is set.
+# "cached_db" reads sessions from the cache and falls back to the database;
+# "signed_cookies" keeps them entirely client-side
+SESSION_ENGINE = "django.contrib.sessions.backends." + os.getenv("SESSION_BACKEND", "cached_db" if REDIS_URL else "db")
+
+AUTHENTICATION_BACKENDS = [
+    # Sessions created before the cached backend was added still name this one
+    "django.contrib.auth.backends.ModelBackend",
+]
+if REDIS_URL:
+    AUTHENTICATION_BACKENDS.insert(0, "accounts.backends.CachedModelBackend")
+
+# request.user is served from a per-process cache for this many seconds (0 disables it)
+USER_CACHE_SECONDS = int(os.getenv("USER_CACHE_SECONDS", "60"))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -182,10 +261,28 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/5.2/howto/static-files/
 
 STATIC_URL = "static/"
+STATIC_ROOT = BASE_DIR / "staticfiles"
+STATICFILES_DIRS = [BASE_DIR / "static"]
+
+# collectstatic writes content-hashed copies plus .gz/.br variants; WhiteNoise serves
+# the hashed names with far-future immutable cache headers
+STORAGES = {
+    "default": {
+        "BACKEND": "django.core.files.storage.FileSystemStorage",
+    },
+    "staticfiles": {
+        "BACKEND": "whitenoise.storage.CompressedManifestStaticFilesStorage"
+        if PRODUCTION_MODE
+        else "django.contrib.staticfiles.storage.StaticFilesStorage",
+    },
+}
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Largest receipt accepted; uploads are streamed to disk and cut off past this size
+RECEIPT_MAX_BYTES = int(os.getenv("RECEIPT_MAX_BYTES", str(10 * 1024 * 1024)))
+
 
 
 # Default primary key field type
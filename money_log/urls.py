@@ -31,6 +31,7 @@ urlpatterns = [
 
     path("", include("dashboard.urls")),
     path("ledger/", include("ledger.urls")),
+    path("api/", include("api.urls")),
 ]
 
 if settings.DEBUG:
@@ -0,0 +1,121 @@
+document.addEventListener('DOMContentLoaded', function() {
+    const form = document.querySelector('form[data-suggest-url]');
+    if (!form) {
+        return;
+    }
+    const description = form.querySelector('[name="description"]');
+    const list = document.createElement('ul');
+    list.className = 'suggestion-list';
+    list.hidden = true;
+    description.after(list);
+
+    let suggestions = [];
+    let active = -1;
+    let pending = null;
+
+    function optionText(select, value) {
+        const option = select && select.querySelector(`option[value="${value}"]`);
+        return option ? option.textContent : '';
+    }
+
+    function hide() {
+        list.hidden = true;
+        active = -1;
+    }
+
+    function render(items) {
+        suggestions = items;
+        active = -1;
+        list.innerHTML = '';
+        items.forEach(function(item, index) {
+            const li = document.createElement('li');
+            li.className = 'suggestion-item';
+            li.dataset.index = index;
+
+            const text = document.createElement('span');
+            text.textContent = item.description;
+            const meta = document.createElement('small');
+            const category = optionText(form.querySelector('[name="category"]'), item.category);
+            meta.textContent = [category, `₹${item.amount}`].filter(Boolean).join(' · ');
+
+            li.append(text, meta);
+            list.appendChild(li);
+        });
+        list.hidden = items.length === 0;
+    }
+
+    function highlight(index) {
+        active = index;
+        list.querySelectorAll('.suggestion-item').forEach(function(li, i) {
+            li.classList.toggle('active', i === index);
+        });
+    }
+
+    // Fill in the description and what it is usually filed as
+    function apply(item) {
+        description.value = item.description;
+        const type = form.querySelector(`[name="transaction_type"][value="${item.transaction_type}"]`);
+        if (type) {
+            type.checked = true;
+        }
+        ['category', 'wallet'].forEach(function(name) {
+            const select = form.querySelector(`[name="${name}"]`);
+            if (select && optionText(select, item[name])) {
+                select.value = item[name];
+            }
+        });
+        const amount = form.querySelector('[name="amount"]');
+        if (amount && !amount.value) {
+            amount.value = item.amount;
+        }
+        hide();
+    }
+
+    description.addEventListener('input', function() {
+        const query = description.value.trim();
+        if (pending) {
+            pending.abort();
+        }
+        if (!query) {
+            hide();
+            return;
+        }
+        pending = new AbortController();
+        fetch(`${form.dataset.suggestUrl}?q=${encodeURIComponent(query)}`, {
+            signal: pending.signal,
+            headers: { 'x-requested-with': 'XMLHttpRequest' }
+        })
+        .then(response => response.json())
+        .then(data => render(data.suggestions))
+        .catch(() => {});
+    });
+
+    description.addEventListener('keydown', function(e) {
+        if (list.hidden) {
+            return;
+        }
+        if (e.key === 'ArrowDown') {
+            e.preventDefault();
+            highlight((active + 1) % suggestions.length);
+        } else if (e.key === 'ArrowUp') {
+            e.preventDefault();
+            highlight((active - 1 + suggestions.length) % suggestions.length);
+        } else if (e.key === 'Enter' && active >= 0) {
+            e.preventDefault();
+            apply(suggestions[active]);
+        } else if (e.key === 'Escape') {
+            hide();
+        }
+    });
+
+    // mousedown fires before the textarea loses focus
+    list.addEventListener('mousedown', function(e) {
+        const li = e.target.closest('.suggestion-item');
+        if (li) {
+            e.preventDefault();
+            apply(suggestions[li.dataset.index]);
+        }
+    });
+
+    description.addEventListener('blur', hide);
+});
@@ -0,0 +1,18 @@
+'use strict';
+{
+    const $ = django.jQuery;
+
+    // Reload the changelist filtered to the user picked in the sidebar autocomplete
+    $(function() {
+        $('#changelist-filter .user-filter select').on('change', function() {
+            const url = new URL(window.location.href);
+            url.searchParams.delete('p');
+            if (this.value) {
+                url.searchParams.set('user', this.value);
+            } else {
+                url.searchParams.delete('user');
+            }
+            window.location.href = url.toString();
+        });
+    });
+}
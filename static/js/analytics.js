@@ -0,0 +1,207 @@
+let expenseChart, incomeChart;
+let expenseCategories = [], expenseData = [], incomeCategories = [], incomeData = [];
+
+function drawCharts(data) {
+    // Daily Chart
+    const dailyCtx = document.getElementById('dailyChart').getContext('2d');
+    new Chart(dailyCtx, {
+        type: 'line',
+        data: {
+            labels: data.daily_labels,
+            datasets: [{
+                label: 'Income',
+                data: data.daily_income,
+                borderColor: '#2ecc71',
+                backgroundColor: 'rgba(46, 204, 113, 0.1)',
+                tension: 0.4,
+                fill: true
+            }, {
+                label: 'Expense',
+                data: data.daily_expense,
+                borderColor: '#e74c3c',
+                backgroundColor: 'rgba(231, 76, 60, 0.1)',
+                tension: 0.4,
+                fill: true
+            }]
+        },
+        options: {
+            responsive: true,
+            maintainAspectRatio: false,
+            plugins: { legend: { position: 'top' } },
+            scales: {
+                x: { title: { display: true, text: 'Day' } },
+                y: { title: { display: true, text: 'Amount (₹)' }, beginAtZero: true }
+            }
+        }
+    });
+
+    // Yearly Monthly Chart
+    const yearlyCtx = document.getElementById('yearlyChart').getContext('2d');
+    new Chart(yearlyCtx, {
+        type: 'bar',
+        data: {
+            labels: data.month_labels,
+            datasets: [{
+                label: 'Income',
+                data: data.yearly_income,
+                backgroundColor: '#2ecc71',
+                borderRadius: 4
+            }, {
+                label: 'Expense',
+                data: data.yearly_expense,
+                backgroundColor: '#e74c3c',
+                borderRadius: 4
+            }]
+        },
+        options: {
+            responsive: true,
+            maintainAspectRatio: false,
+            plugins: { legend: { position: 'top' } },
+            scales: {
+                x: { title: { display: true, text: 'Month' } },
+                y: { title: { display: true, text: 'Amount (₹)' }, beginAtZero: true }
+            }
+        }
+    });
+
+    // Expense Pie Chart
+    const expenseCtx = document.getElementById('expensePieChart').getContext('2d');
+    expenseCategories = data.category_expense.map(c => c.category);
+    expenseData = data.category_expense.map(c => c.total);
+
+    expenseChart = new Chart(expenseCtx, {
+        type: 'doughnut',
+        data: {
+            labels: expenseCategories,
+            datasets: [{
+                data: expenseData,
+                backgroundColor: ['#e74c3c', '#f39c12', '#9b59b6', '#3498db', '#1abc9c', '#34495e', '#e67e22', '#95a5a6']
+            }]
+        },
+        options: {
+            responsive: true,
+            maintainAspectRatio: false,
+            plugins: { 
+                legend: { position: 'bottom' },
+                tooltip: {
+                    callbacks: {
+                        label: function(context) {
+                            return context.label + ': ₹' + context.parsed.toLocaleString();
+                        }
+                    }
+                }
+            },
+            onClick: (event, elements) => {
+                if (elements.length > 0) {
+                    const index = elements[0].index;
+                    const category = expenseCategories[index];
+                    toggleCategory('expense', category);
+                }
+            }
+        }
+    });
+
+    // Income Pie Chart
+    const incomeCtx = document.getElementById('incomePieChart').getContext('2d');
+    incomeCategories = data.category_income.map(c => c.category);
+    incomeData = data.category_income.map(c => c.total);
+
+    incomeChart = new Chart(incomeCtx, {
+        type: 'doughnut',
+        data: {
+            labels: incomeCategories,
+            datasets: [{
+                data: incomeData,
+                backgroundColor: ['#2ecc71', '#27ae60', '#16a085', '#1abc9c', '#3498db', '#2980b9', '#9b59b6', '#8e44ad']
+            }]
+        },
+        options: {
+            responsive: true,
+            maintainAspectRatio: false,
+            plugins: { 
+                legend: { position: 'bottom' },
+                tooltip: {
+                    callbacks: {
+                        label: function(context) {
+                            return context.label + ': ₹' + context.parsed.toLocaleString();
+                        }
+                    }
+                }
+            },
+            onClick: (event, elements) => {
+                if (elements.length > 0) {
+                    const index = elements[0].index;
+                    const category = incomeCategories[index];
+                    toggleCategory('income', category);
+                }
+            }
+        }
+    });
+}
+
+// Chart series come from the JSON endpoint, which answers 304 while the ledger is unchanged
+fetch(document.getElementById('analytics').dataset.chartUrl, { headers: { 'Accept': 'application/json' } })
+    .then(response => response.json())
+    .then(drawCharts);
+
+// Category toggle functionality
+let hiddenCategories = { expense: new Set(), income: new Set() };
+
+function toggleCategory(type, category) {
+    const isHidden = hiddenCategories[type].has(category);
+
+    if (isHidden) {
+        hiddenCategories[type].delete(category);
+    } else {
+        hiddenCategories[type].add(category);
+    }
+
+    updateChart(type);
+    updateTable(type);
+}
+
+function updateChart(type) {
+    const chart = type === 'expense' ? expenseChart : incomeChart;
+    const categories = type === 'expense' ? expenseCategories : incomeCategories;
+    const data = type === 'expense' ? expenseData : incomeData;
+
+    const filteredData = data.map((value, index) => 
+        hiddenCategories[type].has(categories[index]) ? 0 : value
+    );
+
+    chart.data.datasets[0].data = filteredData;
+    chart.update();
+}
+
+function updateTable(type) {
+    const tableId = type === 'expense' ? 'expenseTable' : 'incomeTable';
+    const totalId = type === 'expense' ? 'expenseTotal' : 'incomeTotal';
+    const rows = document.querySelectorAll(`#${tableId} .category-row`);
+
+    let total = 0;
+    rows.forEach(row => {
+        const category = row.dataset.category;
+        const amount = parseFloat(row.dataset.amount);
+
+        if (hiddenCategories[type].has(category)) {
+            row.style.opacity = '0.3';
+            row.style.textDecoration = 'line-through';
+        } else {
+            row.style.opacity = '1';
+            row.style.textDecoration = 'none';
+            total += amount;
+        }
+    });
+
+    document.getElementById(totalId).textContent = total.toLocaleString();
+}
+
+// Add click handlers to table rows
+document.querySelectorAll('.category-row').forEach(row => {
+    row.addEventListener('click', function() {
+        const category = this.dataset.category;
+        const table = this.closest('table');
+        const type = table.id === 'expenseTable' ? 'expense' : 'income';
+        toggleCategory(type, category);
+    });
+});
@@ -0,0 +1,133 @@
+document.addEventListener('DOMContentLoaded', function() {
+    const container = document.getElementById('transactions-container');
+    let excludedRows = new Set();
+    let originalTotals = {
+        income: parseFloat(container.dataset.income),
+        expense: parseFloat(container.dataset.expense),
+        balance: parseFloat(container.dataset.balance)
+    };
+
+    // Handle pagination clicks
+    container.addEventListener('click', function(e) {
+        if (e.target.classList.contains('page-link')) {
+            e.preventDefault();
+            const url = new URL(e.target.getAttribute('href'), window.location.origin);
+
+            // Preserve current filter parameters
+            const currentParams = new URLSearchParams(window.location.search);
+            currentParams.forEach((value, key) => {
+                if (key !== 'page') {
+                    url.searchParams.set(key, value);
+                }
+            });
+
+            fetch(url.toString(), {
+                headers: { 'x-requested-with': 'XMLHttpRequest' }
+            })
+            .then(response => response.json())
+            .then(data => {
+                container.innerHTML = data.html;
+                excludedRows.clear();
+                window.scrollTo({ top: container.offsetTop - 20, behavior: 'smooth' });
+            });
+        }
+    });
+
+    // Handle transaction row clicks
+    container.addEventListener('click', function(e) {
+        // Checkboxes and edit links keep their own behaviour
+        if (e.target.closest('a, input')) {
+            return;
+        }
+        const row = e.target.closest('.transaction-row');
+        if (row) {
+            const rowId = Array.from(row.parentNode.children).indexOf(row);
+
+            if (excludedRows.has(rowId)) {
+                // Re-include the row
+                excludedRows.delete(rowId);
+                row.style.opacity = '1';
+                row.style.backgroundColor = '';
+                row.style.textDecoration = '';
+            } else {
+                // Exclude the row
+                excludedRows.add(rowId);
+                row.style.opacity = '0.5';
+                row.style.backgroundColor = '#f8f9fa';
+                row.style.textDecoration = 'line-through';
+            }
+
+            recalculateTotals();
+        }
+    });
+
+    // Select or clear every row on the current page
+    container.addEventListener('change', function(e) {
+        if (e.target.id === 'select-all') {
+            container.querySelectorAll('.row-select').forEach(box => {
+                box.checked = e.target.checked;
+            });
+        }
+    });
+
+    const bulkForm = document.getElementById('bulk-form');
+    if (bulkForm) {
+        bulkForm.addEventListener('submit', function(e) {
+            const selected = document.querySelectorAll('.row-select:checked').length;
+            if (!selected) {
+                e.preventDefault();
+                alert('Select some transactions first.');
+            } else if (bulkForm.elements.action.value === 'delete' && !confirm(`Delete ${selected} transaction(s)?`)) {
+                e.preventDefault();
+            }
+        });
+    }
+
+    function recalculateTotals() {
+        const totalsDisplay = document.getElementById('totals-display');
+        const rows = document.querySelectorAll('.transaction-row');
+
+        let newIncome = originalTotals.income;
+        let newExpense = originalTotals.expense;
+
+        rows.forEach((row, index) => {
+            if (excludedRows.has(index)) {
+                const amount = parseFloat(row.dataset.amount);
+                const type = row.dataset.type;
+
+                // Only subtract if it's INCOME or EXPENSE, not SWITCH
+                if (type === 'INCOME') {
+                    newIncome -= amount;
+                } else if (type === 'EXPENSE') {
+                    newExpense -= amount;
+                }
+            }
+        });
+
+        const newBalance = newIncome - newExpense;
+
+        // Update display
+        document.getElementById('new-income').textContent = '₹' + newIncome.toLocaleString('en-IN');
+        document.getElementById('new-expense').textContent = '₹' + newExpense.toLocaleString('en-IN');
+        document.getElementById('new-balance').textContent = '₹' + newBalance.toLocaleString('en-IN');
+
+        // Show/hide totals display
+        if (excludedRows.size > 0) {
+            totalsDisplay.style.display = 'block';
+        } else {
+            totalsDisplay.style.display = 'none';
+        }
+    }
+
+    // Make resetTotals function global
+    window.resetTotals = function() {
+        excludedRows.clear();
+        const rows = document.querySelectorAll('.transaction-row');
+        rows.forEach(row => {
+            row.style.opacity = '1';
+            row.style.backgroundColor = '';
+            row.style.textDecoration = '';
+        });
+        document.getElementById('totals-display').style.display = 'none';
+    };
+});
@@ -0,0 +1,45 @@
+const SHADES = {
+    expense: ['#ebedf0', '#fadbd8', '#f1948a', '#e74c3c', '#922b21'],
+    income: ['#ebedf0', '#d5f5e3', '#82e0aa', '#2ecc71', '#1d8348'],
+};
+
+function shadeIndex(value, max) {
+    if (!value) return 0;
+    return Math.min(4, Math.ceil((value / max) * 4));
+}
+
+function renderHeatmap(elementId, totalsId, start, values, shades) {
+    const grid = document.getElementById(elementId);
+    const max = Math.max(...values, 0);
+    const fragment = document.createDocumentFragment();
+
+    // Pad the first column so rows line up with weekdays (Sunday first)
+    for (let i = 0; i < start.getUTCDay(); i++) {
+        const pad = document.createElement('div');
+        pad.className = 'cell empty';
+        fragment.appendChild(pad);
+    }
+
+    values.forEach((value, offset) => {
+        const day = new Date(start.getTime() + offset * 86400000);
+        const cell = document.createElement('div');
+        cell.className = 'cell';
+        cell.style.background = shades[shadeIndex(value, max)];
+        cell.title = `${day.toISOString().slice(0, 10)}: ₹${value.toLocaleString('en-IN')}`;
+        fragment.appendChild(cell);
+    });
+    grid.appendChild(fragment);
+
+    const total = values.reduce((sum, value) => sum + value, 0);
+    const activeDays = values.filter(value => value > 0).length;
+    document.getElementById(totalsId).textContent =
+        `Total ₹${total.toLocaleString('en-IN', { maximumFractionDigits: 0 })} across ${activeDays} days`;
+}
+
+fetch(document.getElementById('heatmap').dataset.url, { headers: { 'Accept': 'application/json' } })
+    .then(response => response.json())
+    .then(data => {
+        const start = new Date(data.start + 'T00:00:00Z');
+        renderHeatmap('expenseHeatmap', 'expenseTotals', start, data.expense, SHADES.expense);
+        renderHeatmap('incomeHeatmap', 'incomeTotals', start, data.income, SHADES.income);
+    });
@@ -0,0 +1,28 @@
+const memberColors = ['#e74c3c', '#3498db', '#2ecc71', '#f39c12', '#9b59b6', '#1abc9c', '#e67e22', '#34495e'];
+
+function drawMemberChart(data) {
+    new Chart(document.getElementById('memberChart').getContext('2d'), {
+        type: 'bar',
+        data: {
+            labels: data.labels,
+            datasets: data.members.map((member, index) => ({
+                label: member.name,
+                data: member.expense,
+                backgroundColor: memberColors[index % memberColors.length],
+            }))
+        },
+        options: {
+            responsive: true,
+            maintainAspectRatio: false,
+            plugins: { legend: { position: 'top' } },
+            scales: {
+                x: { stacked: true },
+                y: { stacked: true, beginAtZero: true, ticks: { callback: value => '₹' + value.toLocaleString() } }
+            }
+        }
+    });
+}
+
+fetch(document.getElementById('household').dataset.chartUrl, { headers: { 'Accept': 'application/json' } })
+    .then(response => response.json())
+    .then(drawMemberChart);